@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+
+"""
+Gestor del ciclo de vida de los trabajos de batch, sin intervención manual.
+
+- Divide las tareas en fragmentos (shards) que respetan los límites por batch del
+  proveedor (número de peticiones y tamaño del archivo) y envía cada uno como un batch.
+- Registra el estado de cada batch en un manifiesto local (`data/batch_jobs/manifest.json`),
+  de modo que una ejecución posterior (ej. programada) retoma los batches en curso.
+- Consulta el estado con espera creciente (backoff) y, al terminar cada batch, descarga
+  su salida en `data/batch_output_procesados/` con el nombre que espera `process_batch_output.py`.
+- Reenvía sólo las peticiones que fallaron o quedaron sin procesar (batch expirado o
+  cancelado), hasta `MAX_ATTEMPTS` intentos.
+
+El cliente puede ser `openai.OpenAI()` o el cliente falso de `fake_batch_api.py`; sólo se
+usan `files.create`, `files.content`, `batches.create` y `batches.retrieve`.
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+MANIFEST_PATH = PROJECT_ROOT / 'data' / 'batch_jobs' / 'manifest.json'
+BATCH_INPUT_DIR = PROJECT_ROOT / 'data' / 'batch_json_generados'
+BATCH_OUTPUT_DIR = PROJECT_ROOT / 'data' / 'batch_output_procesados'
+
+ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+
+# Límites de la API de batch de OpenAI: 50.000 peticiones y 200 MB por archivo de entrada.
+# El tamaño se deja con margen.
+MAX_REQUESTS_PER_BATCH = 50_000
+MAX_BATCH_FILE_BYTES = 190 * 1024 * 1024
+
+# Reintentos de las peticiones que fallan (contando el envío original)
+MAX_ATTEMPTS = 3
+
+# Espera entre consultas de estado: empieza en POLL_INTERVAL y se duplica mientras ningún
+# batch cambie de estado, hasta MAX_POLL_INTERVAL (segundos).
+POLL_INTERVAL = 30.0
+MAX_POLL_INTERVAL = 600.0
+
+# Estados del batch en el proveedor
+TERMINAL_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+
+def shard_tasks(tasks: list, max_requests: int = MAX_REQUESTS_PER_BATCH,
+                max_bytes: int = MAX_BATCH_FILE_BYTES) -> list:
+    """
+    Divide las tareas en fragmentos de a lo más `max_requests` peticiones y `max_bytes`
+    bytes en JSONL. Devuelve una lista de fragmentos, cada uno una lista de líneas JSONL.
+    """
+    shards, current, current_bytes = [], [], 0
+    for task in tasks:
+        line = json.dumps(task, ensure_ascii=False) + '\n'
+        size = len(line.encode('utf-8'))
+        if size > max_bytes:
+            raise ValueError(f"La tarea {task.get('custom_id')} ocupa {size:,} bytes, más que el límite por batch.")
+        if current and (len(current) >= max_requests or current_bytes + size > max_bytes):
+            shards.append(current)
+            current, current_bytes = [], 0
+        current.append(line)
+        current_bytes += size
+    if current:
+        shards.append(current)
+    return shards
+
+
+def _read_file_content(response) -> bytes:
+    """Contenido de `client.files.content(...)` como bytes (objeto de openai o bytes)."""
+    if isinstance(response, (bytes, bytearray)):
+        return bytes(response)
+    return response.read()
+
+
+def _succeeded_ids(output_path: Path) -> set:
+    """custom_id de las peticiones que terminaron con código 200 en un archivo de salida."""
+    succeeded = set()
+    with open(output_path, 'rb') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not record.get('error') and (record.get('response') or {}).get('status_code') == 200:
+                succeeded.add(record.get('custom_id'))
+    return succeeded
+
+
+class BatchManager:
+    """
+    Envía fragmentos de tareas como batches y sigue su ciclo de vida a través del manifiesto.
+
+    Con `cache` (ResultCache), cada envío registra el batch de sus tareas, para que
+    `process_batch_output.py` guarde en caché sólo las respuestas del batch vigente.
+    """
+
+    def __init__(self, client, manifest_path: Path = MANIFEST_PATH, input_dir: Path = BATCH_INPUT_DIR,
+                 output_dir: Path = BATCH_OUTPUT_DIR, cache=None, max_requests: int = MAX_REQUESTS_PER_BATCH,
+                 max_bytes: int = MAX_BATCH_FILE_BYTES, max_attempts: int = MAX_ATTEMPTS):
+        self.client = client
+        self.manifest_path = Path(manifest_path)
+        self.input_dir = Path(input_dir)
+        self.output_dir = Path(output_dir)
+        self.cache = cache
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.max_attempts = max_attempts
+        self.jobs = self._load_manifest()
+
+    # --- Manifiesto ---
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)['jobs']
+        except FileNotFoundError:
+            return {}
+
+    def _save_manifest(self):
+        """Escritura atómica (archivo temporal + rename) para no corromper el manifiesto."""
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'jobs': self.jobs}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def in_flight(self) -> list:
+        """Ids de los batches enviados que aún no terminan (o cuya salida no se ha descargado)."""
+        return [batch_id for batch_id, job in self.jobs.items() if not job['handled']]
+
+    # --- Envío ---
+    def submit(self, tasks: list, attempt: int = 1) -> list:
+        """
+        Divide `tasks` en fragmentos, envía cada uno como un batch y devuelve sus ids. Con
+        `cache`, las tareas registradas en un batch que sigue en curso no se vuelven a enviar:
+        reasignarlas haría que la caché rechace la salida de ese batch al llegar.
+        """
+        if self.cache is not None:
+            live = set(self.in_flight())
+            busy = {task['custom_id'] for task in tasks
+                    if (self.cache.registered(task['custom_id']) or (None, None))[1] in live}
+            if busy:
+                print(f"⏭️ Se omiten {len(busy)} peticiones que ya están en un batch en curso.")
+                tasks = [task for task in tasks if task['custom_id'] not in busy]
+        self.input_dir.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        batch_ids = []
+        for lines in shard_tasks(tasks, self.max_requests, self.max_bytes):
+            input_path = self.input_dir / f"batch_input_{timestamp}_{len(self.jobs) + 1:04d}.jsonl"
+            with open(input_path, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            batch_ids.append(self._submit_file(input_path, [json.loads(line)['custom_id'] for line in lines], attempt))
+        return batch_ids
+
+    def _submit_file(self, input_path: Path, custom_ids: list, attempt: int) -> str:
+        with open(input_path, 'rb') as f:
+            file_object = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(input_file_id=file_object.id, endpoint=ENDPOINT,
+                                           completion_window=COMPLETION_WINDOW)
+        self.jobs[batch.id] = {
+            'input_path': str(input_path),
+            'input_file_id': file_object.id,
+            'custom_ids': custom_ids,
+            'attempt': attempt,
+            'status': batch.status,
+            'handled': False,
+            'output_path': None,
+            'failed_ids': [],
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        self._save_manifest()
+        if self.cache is not None:
+            self.cache.assign_batch(custom_ids, batch.id)
+        print(f"🚀 Batch {batch.id} enviado: {len(custom_ids)} peticiones (intento {attempt}).")
+        return batch.id
+
+    # --- Seguimiento ---
+    def poll(self) -> int:
+        """
+        Consulta una vez el estado de los batches en curso y procesa los que terminaron.
+        Devuelve cuántos batches cambiaron de estado.
+        """
+        changed = 0
+        for batch_id in self.in_flight():
+            job = self.jobs[batch_id]
+            try:
+                batch = self.client.batches.retrieve(batch_id)
+            except Exception as e:  # error transitorio de red/API: se reintenta en la próxima consulta
+                print(f"⚠️ No se pudo consultar el batch {batch_id}: {e}")
+                continue
+            if batch.status != job['status']:
+                changed += 1
+                job['status'] = batch.status
+                print(f"🔄 Batch {batch_id}: {batch.status}")
+            if batch.status in TERMINAL_STATUSES:
+                self._finish(batch_id, batch)
+            self._save_manifest()
+        return changed
+
+    def _finish(self, batch_id: str, batch):
+        """Descarga la salida de un batch terminado y reenvía las peticiones que fallaron."""
+        job = self.jobs[batch_id]
+        succeeded = set()
+        # Un batch expirado o cancelado puede traer una salida parcial
+        if getattr(batch, 'output_file_id', None):
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            output_path = self.output_dir / f"{batch_id}_output.jsonl"
+            tmp_path = output_path.with_suffix('.tmp')
+            tmp_path.write_bytes(_read_file_content(self.client.files.content(batch.output_file_id)))
+            os.replace(tmp_path, output_path)
+            job['output_path'] = str(output_path)
+            succeeded = _succeeded_ids(output_path)
+            print(f"📥 Salida del batch {batch_id} descargada en: {output_path}")
+
+        failed_ids = [custom_id for custom_id in job['custom_ids'] if custom_id not in succeeded]
+        job['failed_ids'] = failed_ids
+        job['handled'] = True
+        self._save_manifest()
+        if not failed_ids:
+            return
+
+        if job['attempt'] >= self.max_attempts:
+            print(f"❌ {len(failed_ids)} peticiones del batch {batch_id} fallaron tras {job['attempt']} intentos.")
+            return
+        print(f"🔁 Reenviando {len(failed_ids)} peticiones del batch {batch_id} ({batch.status}).")
+        failed = set(failed_ids)
+        with open(job['input_path'], 'r', encoding='utf-8') as f:
+            tasks = [task for task in map(json.loads, f) if task['custom_id'] in failed]
+        self.submit(tasks, attempt=job['attempt'] + 1)
+
+    def wait(self, poll_interval: float = POLL_INTERVAL, max_interval: float = MAX_POLL_INTERVAL,
+             timeout: float = None, sleep=time.sleep) -> bool:
+        """
+        Consulta hasta que no queden batches en curso (incluidos los reenvíos). La espera se
+        duplica mientras nada cambia y vuelve a `poll_interval` cuando algo cambia.
+        Devuelve False si se alcanzó `timeout` (segundos) con batches todavía en curso.
+        """
+        interval = poll_interval
+        start = time.monotonic()
+        while True:
+            changed = self.poll()
+            pending = self.in_flight()
+            if not pending:
+                return True
+            if timeout is not None and time.monotonic() - start + interval > timeout:
+                print(f"⏳ Quedan {len(pending)} batches en curso; se retomarán en la próxima ejecución.")
+                return False
+            interval = poll_interval if changed else min(interval * 2, max_interval)
+            sleep(interval)
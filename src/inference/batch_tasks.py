@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+"""
+Generación de las tareas (peticiones) del batch a partir de los textos de `reports/txt_prompts`.
+
+Cada texto se reduce a las secciones relevantes, se divide en trozos por tokens y cada
+trozo se convierte en una petición `/v1/chat/completions` con `custom_id` 'PATENTE-N'.
+Con una `ResultCache` sólo se generan las peticiones cuya respuesta no está en caché ni
+está esperando en un batch en curso, y los vehículos cuyos campos resuelven por completo las
+reglas (`rule_extractor.py`) no generan peticiones.
+"""
+
+from pathlib import Path
+
+from chunker import available_budget, chunk_text
+from document_slimmer import slim_document
+from result_cache import cache_key
+from rule_extractor import extract_fields, is_complete, reference_date
+from tokens import count_tokens
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+# Ruta al archivo que contiene el prompt del sistema.
+prompt_file_path = PROJECT_ROOT / 'prompts' / 'prompt.txt'
+
+# Carpeta de entrada para los archivos .txt de patentes.
+input_folder_path = PROJECT_ROOT / 'reports' / 'txt_prompts'
+
+# --- Configuración del Proceso ---
+MODEL = "gpt-4.1-mini"
+TEMPERATURE = 0.1
+MAX_OUTPUT_TOKENS = 4000
+# Presupuesto máximo de tokens por trozo de texto. Con None se usa todo el contexto disponible
+# del modelo, de modo que cada vehículo que quepa genera una sola petición.
+CHUNK_TOKEN_BUDGET = None
+# Conserva sólo las secciones del CAV y del Listado que necesita el prompt (ver document_slimmer.py).
+SLIM_DOCUMENTS = True
+# No envía al modelo los vehículos cuyos campos resuelven por completo las reglas (ver rule_extractor.py).
+RULE_FAST_PATH = True
+
+
+def load_prompt_from_file(filename: Path) -> str:
+    """Carga el prompt desde una ruta específica."""
+    try:
+        with open(filename, 'r', encoding='utf-8') as file:
+            return file.read()
+    except FileNotFoundError:
+        print(f"Error CRÍTICO: El archivo de prompt '{filename}' no se encontró.")
+        raise
+    except Exception as e:
+        print(f"Error CRÍTICO al leer el archivo de prompt '{filename}': {e}")
+        raise
+
+
+def read_text_file(txt_file: Path):
+    """Lee un .txt en UTF-8 (o cp1252, común en Windows). Devuelve None si no se puede leer."""
+    try:
+        return txt_file.read_text(encoding='utf-8')
+    except UnicodeDecodeError:
+        try:
+            return txt_file.read_text(encoding='cp1252')
+        except Exception as e:
+            print(f"Error al leer el archivo {txt_file.name}: {e}. Saltando archivo.")
+    except Exception as e:
+        print(f"Error inesperado con el archivo {txt_file.name}: {e}. Saltando archivo.")
+    return None
+
+
+def build_task(custom_id: str, chunk: str, system_prompt: str) -> dict:
+    """Petición del batch para un trozo de texto."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": MODEL,
+            "temperature": TEMPERATURE,
+            "max_tokens": MAX_OUTPUT_TOKENS,
+            "response_format": {"type": "json_object"},  # Para asegurar salida en JSON
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": chunk}
+            ],
+        }
+    }
+
+
+def vehicle_chunks(texto: str, placa: str, chunk_token_budget: int) -> list:
+    """Reduce (si corresponde) y divide el texto de un vehículo en trozos no vacíos."""
+    if SLIM_DOCUMENTS:
+        texto = slim_document(texto, placa)
+    # Divide el texto en chunks (por secciones completas) sólo si excede el presupuesto de tokens.
+    return [chunk for chunk in chunk_text(texto, chunk_token_budget, MODEL) if chunk.strip()]
+
+
+def generate_tasks(system_prompt: str, txt_files: list, cache=None, use_rules: bool = RULE_FAST_PATH,
+                   register: bool = True, in_flight=()) -> tuple:
+    """
+    Genera las peticiones del batch para `txt_files`. Con `cache` registra las tareas
+    actuales de cada vehículo (salvo con `register=False`, ej. en una simulación) y omite
+    los trozos que ya tienen respuesta en caché, y también los que se enviaron con el mismo
+    texto en uno de los batches `in_flight` (ids de los batches en curso del manifiesto): su
+    respuesta todavía puede llegar y reenviarlos la pagaría dos veces. Con
+    `use_rules` omite los vehículos que las reglas resuelven por completo.
+
+    Devuelve (lista de tareas, estadísticas {'trozos', 'en_cache', 'en_curso', 'por_reglas',
+    'tokens_antes', 'tokens_despues'}); 'por_reglas' cuenta los vehículos resueltos sin el modelo.
+    """
+    chunk_token_budget = CHUNK_TOKEN_BUDGET or available_budget(system_prompt, MODEL, MAX_OUTPUT_TOKENS)
+    today = reference_date(system_prompt) if use_rules else None
+    tasks = []
+    in_flight = set(in_flight)
+    stats = {'trozos': 0, 'en_cache': 0, 'en_curso': 0, 'por_reglas': 0, 'tokens_antes': 0, 'tokens_despues': 0}
+
+    for txt_file in txt_files:
+        texto = read_text_file(txt_file)
+        if texto is None:
+            continue
+        placa = txt_file.stem
+
+        if use_rules and is_complete(extract_fields(texto, placa, today)):
+            # El vehículo no tiene tareas actuales: sus respuestas en caché ya no se combinan
+            stats['por_reglas'] += 1
+            if cache is not None and register:
+                cache.sync_vehicle(placa, [])
+            continue
+
+        chunks = vehicle_chunks(texto, placa, chunk_token_budget)
+        if SLIM_DOCUMENTS:
+            stats['tokens_antes'] += count_tokens(texto)
+            stats['tokens_despues'] += sum(count_tokens(chunk) for chunk in chunks)
+
+        # El custom_id es la patente (nombre del archivo sin extensión) y el número de trozo.
+        entries = [(f"{placa}-{idx + 1}", chunk) for idx, chunk in enumerate(chunks)]
+        keys = [cache_key(MODEL, TEMPERATURE, system_prompt, chunk) for _, chunk in entries]
+        if cache is not None and register:
+            cache.sync_vehicle(placa, [(custom_id, key) for (custom_id, _), key in zip(entries, keys)])
+
+        for (custom_id, chunk), key in zip(entries, keys):
+            stats['trozos'] += 1
+            if cache is not None and cache.get(key) is not None:
+                stats['en_cache'] += 1
+                continue
+            registered = cache.registered(custom_id) if cache is not None and in_flight else None
+            if registered is not None and registered[0] == key and registered[1] in in_flight:
+                stats['en_curso'] += 1
+                continue
+            tasks.append(build_task(custom_id, chunk, system_prompt))
+
+    return tasks, stats
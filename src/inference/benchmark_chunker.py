@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark de estrategias de división en trozos sobre el corpus de `reports/txt_prompts`.
+
+Compara el número total de peticiones y de tokens de prompt (prompt del sistema repetido
+en cada petición + texto del trozo) entre:
+- El corte fijo anterior cada 5000 caracteres.
+- El chunker por tokens y secciones (`chunker.py`), con y sin la reducción de documentos.
+
+Uso:
+    python src/inference/benchmark_chunker.py [--budget 8000]
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from chunker import available_budget, chunk_text
+from document_slimmer import slim_document
+from tokens import DEFAULT_MODEL, count_tokens, get_encoding
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+prompt_file_path = PROJECT_ROOT / 'prompts' / 'prompt.txt'
+input_folder_path = PROJECT_ROOT / 'reports' / 'txt_prompts'
+LEGACY_CHUNK_SIZE = 5000
+MAX_OUTPUT_TOKENS = 4000
+
+
+def legacy_chunks(texto: str, tamano_chunk: int = LEGACY_CHUNK_SIZE) -> list:
+    """Estrategia anterior (`split_text_in_chunks`): un corte cada `tamano_chunk` caracteres."""
+    chunks = [texto[i:i + tamano_chunk] for i in range(0, len(texto), tamano_chunk)]
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def measure(name, texts, strategy, system_prompt_tokens):
+    """Aplica `strategy` a cada texto y devuelve (nombre, peticiones, tokens de prompt, vehículos en 1 petición, s)."""
+    start = time.perf_counter()
+    requests = prompt_tokens = single_request = 0
+    for placa, texto in texts:
+        chunks = strategy(placa, texto)
+        requests += len(chunks)
+        single_request += len(chunks) == 1
+        prompt_tokens += sum(system_prompt_tokens + count_tokens(chunk) for chunk in chunks)
+    return name, requests, prompt_tokens, single_request, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara estrategias de chunking para el batch.")
+    parser.add_argument('--budget', type=int, default=None,
+                        help="Presupuesto de tokens por trozo (por defecto, todo el contexto del modelo).")
+    args = parser.parse_args()
+
+    system_prompt = prompt_file_path.read_text(encoding='utf-8')
+    system_prompt_tokens = count_tokens(system_prompt)
+    budget = args.budget or available_budget(system_prompt, DEFAULT_MODEL, MAX_OUTPUT_TOKENS)
+    texts = [(path.stem, path.read_text(encoding='utf-8')) for path in sorted(input_folder_path.glob('*.txt'))]
+
+    tokenizer = 'tiktoken' if get_encoding() is not None else 'aproximación por caracteres'
+    print(f"{len(texts)} vehículos, prompt del sistema de {system_prompt_tokens:,} tokens, "
+          f"presupuesto {budget:,} tokens por trozo (conteo: {tokenizer}).\n")
+
+    results = [
+        measure(f"corte fijo {LEGACY_CHUNK_SIZE} caracteres", texts,
+                lambda placa, texto: legacy_chunks(texto), system_prompt_tokens),
+        measure("chunker por tokens", texts,
+                lambda placa, texto: chunk_text(texto, budget), system_prompt_tokens),
+        measure("reducción + chunker por tokens", texts,
+                lambda placa, texto: chunk_text(slim_document(texto, placa), budget), system_prompt_tokens),
+    ]
+
+    print(f"{'estrategia':<34} {'peticiones':>11} {'tokens prompt':>14} {'1 petición':>11} {'segundos':>9}")
+    for name, requests, prompt_tokens, single_request, elapsed in results:
+        print(f"{name:<34} {requests:>11,} {prompt_tokens:>14,} {single_request:>11} {elapsed:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark de la extracción en línea (`online_inference.py`) contra el servidor local de
+`stub_chat_server.py`, a distintos niveles de concurrencia.
+
+Genera las peticiones de todos los textos de `reports/txt_prompts` (sin el atajo de las
+reglas, para que cada vehículo genere al menos una petición; `--copies` replica el corpus)
+y las envía con cada nivel de `--concurrency`, informando vehículos/min, latencia por
+petición (p50/p95, incluidas las esperas de los reintentos) y reintentos. El servidor
+simula la duración de la generación (`--latency` ± `--jitter`) y una fracción de errores
+500 y 429 (`--fail-rate`, `--rate-limit-rate`); `--tpm` aplica el límite de tokens por minuto.
+
+Uso:
+    python src/inference/benchmark_online.py [--concurrency 1 4 16 64] [--latency 0.5] [--copies 1] [--tpm 0]
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+from pathlib import Path
+
+from batch_tasks import generate_tasks, input_folder_path, load_prompt_from_file, prompt_file_path
+from online_inference import OnlineRunner, create_async_client, run_online
+from stub_chat_server import serve_chat_stub
+
+
+def replicate(tasks: list, copies: int) -> list:
+    """Replica las tareas con patentes distintas ('BSWT31c2-1', ...) para generar más carga."""
+    replicated = list(tasks)
+    for copy in range(2, copies + 1):
+        for task in tasks:
+            placa, _, chunk = task['custom_id'].rpartition('-')
+            replicated.append({**task, 'custom_id': f"{placa}c{copy}-{chunk}"})
+    return replicated
+
+
+def percentile(values: list, fraction: float) -> float:
+    return statistics.quantiles(values, n=100)[int(fraction * 100) - 1] if len(values) > 1 else values[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput de la extracción en línea por nivel de concurrencia.")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64],
+                        help="Niveles de concurrencia a medir.")
+    parser.add_argument('--latency', type=float, default=0.5, help="Segundos por respuesta del servidor simulado.")
+    parser.add_argument('--jitter', type=float, default=0.2, help="Variación (±s) de la latencia simulada.")
+    parser.add_argument('--fail-rate', type=float, default=0.02, help="Fracción de respuestas 500 simuladas.")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.02, help="Fracción de respuestas 429 simuladas.")
+    parser.add_argument('--tpm', type=float, default=0, help="Límite de tokens por minuto (0 = sin límite).")
+    parser.add_argument('--copies', type=int, default=1, help="Veces que se replica el corpus de vehículos.")
+    args = parser.parse_args()
+
+    tasks, _ = generate_tasks(load_prompt_from_file(prompt_file_path), sorted(input_folder_path.glob('*.txt')),
+                              use_rules=False)
+    tasks = replicate(tasks, args.copies)
+    vehicles = len({task['custom_id'].rpartition('-')[0] for task in tasks})
+    print(f"{vehicles} vehículos, {len(tasks)} peticiones; servidor simulado con {args.latency:.2f} ± {args.jitter:.2f} s "
+          f"por respuesta, {args.fail_rate:.0%} de 500 y {args.rate_limit_rate:.0%} de 429"
+          f"{f', límite de {args.tpm:,.0f} tokens/min' if args.tpm else ''}.\n")
+
+    print(f"{'concurrencia':>12} {'segundos':>9} {'vehículos/min':>14} {'p50 (s)':>8} {'p95 (s)':>8} "
+          f"{'reintentos':>11} {'fallidas':>9}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for concurrency in args.concurrency:
+            server, base_url = serve_chat_stub(args.latency, args.jitter, args.fail_rate, args.rate_limit_rate)
+            runner = OnlineRunner(create_async_client(base_url, api_key='stub'), concurrency, args.tpm)
+            stats = asyncio.run(run_online(runner, tasks,Path(tmp_dir) / f"online_c{concurrency}_output.jsonl"))
+            server.shutdown()
+            latencies = stats['latencias']
+            print(f"{concurrency:>12} {stats['segundos']:>9.1f} {vehicles / stats['segundos'] * 60:>14.0f} "
+                  f"{percentile(latencies, 0.5):>8.2f} {percentile(latencies, 0.95):>8.2f} "
+                  f"{stats['reintentos']:>11} {stats['fallidas']:>9}")
+
+
+if __name__ == '__main__':
+    main()
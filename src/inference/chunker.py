@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+"""
+División de los textos de cada vehículo en trozos (chunks) medidos en tokens.
+
+Reemplaza el corte fijo cada 5000 caracteres de `split_text_in_chunks`, que partía las
+tablas del CAV y las filas del Listado a la mitad y generaba una petición (con el prompt
+del sistema completo) por cada trozo. Aquí:
+- Las unidades mínimas son las secciones `--- INICIO … ---` / `--- FIN … ---`; sólo si una
+  sección no cabe sola en el presupuesto se divide, y siempre por líneas completas.
+- Las unidades se empaquetan de forma voraz hasta el presupuesto de tokens, por lo que un
+  documento que cabe en el contexto del modelo produce una sola petición.
+"""
+
+from document_slimmer import SECTION_PATTERN
+from tokens import DEFAULT_MODEL, count_tokens
+
+# Ventana de contexto (tokens) de los modelos usados para la extracción
+MODEL_CONTEXT_TOKENS = {
+    "gpt-4.1-mini": 1_047_576,
+    "gpt-4.1": 1_047_576,
+    "gpt-4o-mini": 128_000,
+}
+DEFAULT_CONTEXT_TOKENS = 128_000
+# Margen para el formato de los mensajes y las diferencias entre tokenizadores
+SAFETY_MARGIN = 0.05
+
+
+def available_budget(system_prompt: str, model: str = DEFAULT_MODEL, max_output_tokens: int = 4000) -> int:
+    """Tokens disponibles para el texto del usuario en una petición, descontando prompt y respuesta."""
+    context = MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+    usable = int(context * (1 - SAFETY_MARGIN))
+    return max(1, usable - count_tokens(system_prompt, model) - max_output_tokens)
+
+
+def split_units(text: str) -> list:
+    """Divide el texto en secciones completas (con sus marcadores); sin marcadores, es una sola unidad."""
+    units = []
+    last_end = 0
+    for match in SECTION_PATTERN.finditer(text):
+        if text[last_end:match.start()].strip():
+            units.append(text[last_end:match.start()].strip('\n'))
+        units.append(match.group(0))
+        last_end = match.end()
+    if text[last_end:].strip():
+        units.append(text[last_end:].strip('\n'))
+    return units
+
+
+def _split_oversized(unit: str, max_tokens: int, model: str) -> list:
+    """Divide una unidad demasiado grande por líneas completas (o por caracteres si una línea no cabe)."""
+    pieces = []
+    current, current_tokens = [], 0
+    for line in unit.split('\n'):
+        line_tokens = count_tokens(line + '\n', model)
+        if line_tokens > max_tokens:
+            # Línea patológica: cortarla en trozos de tamaño proporcional al presupuesto
+            step = max(1, len(line) * max_tokens // line_tokens)
+            sublines = [line[i:i + step] for i in range(0, len(line), step)]
+        else:
+            sublines = [line]
+        for subline in sublines:
+            subline_tokens = count_tokens(subline + '\n', model) if len(sublines) > 1 else line_tokens
+            if current and current_tokens + subline_tokens > max_tokens:
+                pieces.append('\n'.join(current))
+                current, current_tokens = [], 0
+            current.append(subline)
+            current_tokens += subline_tokens
+    if current:
+        pieces.append('\n'.join(current))
+    return pieces
+
+
+def chunk_text(text: str, max_tokens: int, model: str = DEFAULT_MODEL) -> list:
+    """
+    Empaqueta las secciones del texto en trozos de a lo más `max_tokens` tokens,
+    sin cortar secciones salvo que una sola no quepa en el presupuesto.
+    """
+    separator = '\n\n'
+    separator_tokens = count_tokens(separator, model)
+    chunks = []
+    current, current_tokens = [], 0
+
+    for unit in split_units(text):
+        unit_tokens = count_tokens(unit, model)
+        pieces = [(unit, unit_tokens)] if unit_tokens <= max_tokens else [
+            (piece, count_tokens(piece, model)) for piece in _split_oversized(unit, max_tokens, model)]
+        for piece, piece_tokens in pieces:
+            extra = piece_tokens + (separator_tokens if current else 0)
+            if current and current_tokens + extra > max_tokens:
+                chunks.append(separator.join(current))
+                current, current_tokens = [], 0
+                extra = piece_tokens
+            current.append(piece)
+            current_tokens += extra
+
+    if current:
+        chunks.append(separator.join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
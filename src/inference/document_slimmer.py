@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+"""
+Reducción de los textos consolidados antes de enviarlos al modelo.
+
+El prompt (`prompts/prompt.txt`) sólo necesita el "Certificado de Anotaciones Vigentes (CAV)"
+y el "Listado Vehículo – Constancias", pero cada archivo de `reports/txt_prompts` incluye
+además las Bases Generales, el Procedimiento y, a veces, el Informe Autofact. Este módulo:
+1.  Separa el texto en secciones usando los marcadores `--- INICIO … ---` / `--- FIN … ---`
+    que escribe `prepare_inference_texts.py`, y conserva sólo las secciones relevantes.
+2.  Del Listado (que trae todos los lotes del remate) conserva la cabecera de columnas y la
+    fila del vehículo, si su patente aparece; si no, conserva el listado completo.
+3.  Elimina las repeticiones de encabezados y pies de página, y colapsa los espacios.
+
+Ejecutado como script, informa los tokens antes y después para cada vehículo.
+"""
+
+import argparse
+import re
+from pathlib import Path
+
+from tokens import count_tokens
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+input_folder_path = PROJECT_ROOT / 'reports' / 'txt_prompts'
+
+# Prefijos (en mayúsculas) de las secciones que necesita el prompt
+RELEVANT_SECTIONS = ('CERTIFICADO DE ANOTACIONES VIGENTES', 'LISTADO VEHÍCULO')
+LISTADO_SECTION = 'LISTADO VEHÍCULO'
+# Las primeras líneas de cada sección son su encabezado; sus repeticiones posteriores se descartan
+HEADER_LINES = 12
+# Las líneas largas que se repiten dentro de una sección son pies de página o avisos legales
+REPEATED_LINE_MIN_LENGTH = 30
+
+SECTION_PATTERN = re.compile(r'^--- INICIO (?P<name>.+?) ---\n(?P<body>.*?)\n--- FIN (?P=name) ---$',
+                             re.MULTILINE | re.DOTALL)
+WHITESPACE_PATTERN = re.compile(r'[ \t ]+')
+LOT_NUMBER_PATTERN = re.compile(r'^\d+$')
+
+
+def split_sections(text: str) -> list:
+    """Devuelve [(nombre_sección, cuerpo), ...] en el orden en que aparecen en el texto."""
+    return [(match.group('name'), match.group('body')) for match in SECTION_PATTERN.finditer(text)]
+
+
+def is_relevant_section(name: str) -> bool:
+    return name.upper().startswith(RELEVANT_SECTIONS)
+
+
+def clean_lines(body: str) -> list:
+    """
+    Colapsa espacios, descarta líneas vacías y elimina las repeticiones de encabezados
+    (líneas del inicio de la sección) y de pies de página (líneas largas repetidas),
+    conservando siempre su primera aparición.
+    """
+    lines = [WHITESPACE_PATTERN.sub(' ', line).strip() for line in body.splitlines()]
+    lines = [line for line in lines if line]
+
+    header = set(lines[:HEADER_LINES])
+    seen = set()
+    kept = []
+    for line in lines:
+        if line in seen and (line in header or len(line) >= REPEATED_LINE_MIN_LENGTH):
+            continue
+        seen.add(line)
+        kept.append(line)
+    return kept
+
+
+def extract_listado_row(lines: list, placa: str) -> list:
+    """
+    Del listado de todos los lotes, conserva la cabecera de columnas y la fila del vehículo.
+    Cada fila empieza con el número de lote, seguido de marca, modelo y patente.
+    Si la patente no aparece, se devuelve el listado completo.
+    """
+    placa = placa.strip().upper()
+    try:
+        placa_idx = next(i for i, line in enumerate(lines) if line.upper() == placa)
+    except StopIteration:
+        return lines
+
+    # Inicio de la fila: número de lote, hasta 3 líneas antes de la patente (lote, marca, modelo)
+    start = next((i for i in range(placa_idx - 1, max(placa_idx - 4, -1), -1)
+                  if LOT_NUMBER_PATTERN.match(lines[i])), None)
+    # Cabecera de columnas: todo lo anterior al primer lote
+    first_lot = next((i for i, line in enumerate(lines) if line == '1'), None)
+    if start is None or first_lot is None:
+        return lines
+
+    # Fin de la fila: el siguiente número de lote
+    next_lot = str(int(lines[start]) + 1)
+    end = next((i for i in range(placa_idx + 1, len(lines)) if lines[i] == next_lot), len(lines))
+    return lines[:first_lot] + lines[start:end]
+
+
+def slim_document(text: str, placa: str = None) -> str:
+    """
+    Reduce el texto consolidado de un vehículo a las secciones relevantes para el prompt.
+    Si el texto no tiene marcadores de sección, sólo se limpian espacios y repeticiones.
+    """
+    sections = split_sections(text)
+    if not sections:
+        return '\n'.join(clean_lines(text))
+
+    parts = []
+    for name, body in sections:
+        if not is_relevant_section(name):
+            continue
+        lines = clean_lines(body)
+        if placa and name.upper().startswith(LISTADO_SECTION):
+            lines = extract_listado_row(lines, placa)
+        parts.append(f"--- INICIO {name} ---\n" + '\n'.join(lines) + f"\n--- FIN {name} ---")
+    return '\n\n'.join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Informe de tokens antes y después de reducir los textos.")
+    parser.add_argument('--input', type=Path, default=input_folder_path,
+                        help="Carpeta con los textos consolidados (.txt).")
+    parser.add_argument('--output', type=Path, default=None,
+                        help="Carpeta opcional donde guardar los textos reducidos.")
+    args = parser.parse_args()
+
+    archivos_txt = sorted(args.input.glob('*.txt'))
+    if not archivos_txt:
+        print(f"⚠️ ADVERTENCIA: No se encontraron archivos .txt en la carpeta '{args.input}'.")
+        return
+    if args.output:
+        args.output.mkdir(parents=True, exist_ok=True)
+
+    total_before = total_after = 0
+    print(f"{'vehículo':<12} {'tokens antes':>13} {'tokens después':>15} {'reducción':>10}")
+    for txt_file in archivos_txt:
+        texto = txt_file.read_text(encoding='utf-8')
+        reducido = slim_document(texto, txt_file.stem)
+        before, after = count_tokens(texto), count_tokens(reducido)
+        total_before += before
+        total_after += after
+        print(f"{txt_file.stem:<12} {before:>13,} {after:>15,} {1 - after / max(before, 1):>10.1%}")
+        if args.output:
+            (args.output / txt_file.name).write_text(reducido, encoding='utf-8')
+
+    print(f"{'TOTAL':<12} {total_before:>13,} {total_after:>15,} {1 - total_after / max(total_before, 1):>10.1%}")
+
+
+if __name__ == '__main__':
+    main()
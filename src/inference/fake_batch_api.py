@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+"""
+API de batch falsa y local, para probar `batch_manager.py` sin llamar a OpenAI.
+
+`FakeBatchClient` imita la parte del cliente de `openai` que usa el gestor
+(`files.create`, `files.content`, `batches.create`, `batches.retrieve`). Cada batch
+avanza un estado por consulta (validating -> in_progress -> completed) y sus salidas
+tienen el mismo formato que las reales. Se puede simular:
+- `fail_rate`: fracción de peticiones que terminan con error (van al archivo de errores).
+- `expire_batches`: los primeros N batches expiran habiendo procesado sólo la mitad.
+- `responder`: función tarea -> contenido (texto) de la respuesta del modelo.
+
+Uso:
+    python src/inference/run_batch_inference.py --fake --wait
+"""
+
+import json
+import random
+from types import SimpleNamespace
+
+# Estados por los que pasa un batch, uno por consulta
+STATUS_SEQUENCE = ('validating', 'in_progress', 'finalizing', 'completed')
+
+
+def default_responder(task: dict) -> str:
+    """Respuesta vacía (un objeto JSON sin campos) para cualquier tarea."""
+    return "{}"
+
+
+class FakeFileContent(bytes):
+    """Imita el contenido devuelto por `client.files.content(...)`."""
+
+    def read(self) -> bytes:
+        return bytes(self)
+
+    @property
+    def text(self) -> str:
+        return self.decode('utf-8')
+
+
+class _Files:
+    def __init__(self, api):
+        self._api = api
+
+    def create(self, file, purpose: str):
+        data = file.read() if hasattr(file, 'read') else file
+        return SimpleNamespace(id=self._api._add_file(data), purpose=purpose)
+
+    def content(self, file_id: str) -> FakeFileContent:
+        return FakeFileContent(self._api.stored_files[file_id])
+
+
+class _Batches:
+    def __init__(self, api):
+        self._api = api
+
+    def create(self, input_file_id: str, endpoint: str, completion_window: str, metadata=None):
+        return self._api._create_batch(input_file_id, endpoint)
+
+    def retrieve(self, batch_id: str):
+        return self._api._advance(batch_id)
+
+
+class FakeBatchClient:
+    """Cliente falso con el estado de la API en memoria."""
+
+    def __init__(self, responder=default_responder, fail_rate: float = 0.0, expire_batches: int = 0,
+                 seed: int = 0):
+        self.responder = responder
+        self.fail_rate = fail_rate
+        self.expire_batches = expire_batches
+        self.stored_files = {}
+        self.stored_batches = {}
+        self.retrieve_calls = 0
+        self._random = random.Random(seed)
+        self._counter = 0
+        self.files = _Files(self)
+        self.batches = _Batches(self)
+
+    def _next_id(self, prefix: str) -> str:
+        self._counter += 1
+        return f"{prefix}{self._counter:06d}"
+
+    def _add_file(self, data: bytes) -> str:
+        file_id = self._next_id('file-fake')
+        self.stored_files[file_id] = bytes(data)
+        return file_id
+
+    def _create_batch(self, input_file_id: str, endpoint: str):
+        batch_id = self._next_id('batch_fake')
+        expires = len(self.stored_batches) < self.expire_batches
+        self.stored_batches[batch_id] = SimpleNamespace(
+            id=batch_id, status=STATUS_SEQUENCE[0], endpoint=endpoint, input_file_id=input_file_id,
+            output_file_id=None, error_file_id=None, _step=0, _expires=expires)
+        return self.stored_batches[batch_id]
+
+    def _advance(self, batch_id: str):
+        """Avanza el batch un estado; al llegar al final genera sus archivos de salida."""
+        self.retrieve_calls += 1
+        batch = self.stored_batches[batch_id]
+        if batch.status in ('completed', 'expired'):
+            return batch
+        batch._step += 1
+        if batch._step < len(STATUS_SEQUENCE) - 1:
+            batch.status = STATUS_SEQUENCE[batch._step]
+            return batch
+
+        tasks = [json.loads(line) for line in self.stored_files[batch.input_file_id].splitlines() if line.strip()]
+        processed = tasks[:len(tasks) // 2] if batch._expires else tasks
+        outputs, errors = [], []
+        for task in processed:
+            if self._random.random() < self.fail_rate:
+                errors.append(self._error_line(task))
+            else:
+                outputs.append(self._output_line(task))
+        if outputs:
+            batch.output_file_id = self._add_file(''.join(outputs).encode('utf-8'))
+        if errors:
+            batch.error_file_id = self._add_file(''.join(errors).encode('utf-8'))
+        batch.status = 'expired' if batch._expires else 'completed'
+        return batch
+
+    def _output_line(self, task: dict) -> str:
+        content = self.responder(task)
+        return json.dumps({
+            'id': self._next_id('batch_req_'),
+            'custom_id': task['custom_id'],
+            'response': {
+                'status_code': 200,
+                'request_id': self._next_id('req_'),
+                'body': {
+                    'object': 'chat.completion',
+                    'model': task['body'].get('model'),
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                                 'finish_reason': 'stop'}],
+                    'usage': {'prompt_tokens': sum(len(m['content']) for m in task['body']['messages']) // 4,
+                              'completion_tokens': len(content) // 4},
+                },
+            },
+            'error': None,
+        }, ensure_ascii=False) + '\n'
+
+    def _error_line(self, task: dict) -> str:
+        return json.dumps({
+            'id': self._next_id('batch_req_'),
+            'custom_id': task['custom_id'],
+            'response': {'status_code': 500, 'request_id': self._next_id('req_'),
+                         'body': {'error': {'message': 'Error simulado', 'type': 'server_error'}}},
+            'error': None,
+        }) + '\n'
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+"""
+Extracción en línea (sin la ventana de 24 h del batch), para los vehículos urgentes.
+
+Envía las mismas peticiones que `run_batch_inference.py` (ver `batch_tasks.py`: documentos
+reducidos, trozos, caché y reglas) directamente a `/v1/chat/completions` con el cliente
+asíncrono de openai:
+- Concurrencia acotada: `concurrency` corrutinas toman las peticiones de una cola.
+- Tokens por minuto: antes de enviar, cada petición reserva en un balde (que se recarga de
+  forma continua) sus tokens de entrada más `max_tokens`, como los cuenta el proveedor.
+- Reintentos ante 429, errores 5xx, timeouts y errores de conexión, con espera exponencial y
+  jitter completo (o la que indique `retry-after`); los demás errores no se reintentan.
+- Cada respuesta se escribe apenas llega en `data/batch_output_procesados/`, en un archivo
+  `batch_online<fecha>_output.jsonl` con el mismo formato de línea que las salidas del batch.
+  Las tareas quedan asignadas a ese id en la caché de inferencia, así que
+  `process_batch_output.py` lo procesa (y guarda en la caché) como un batch más.
+
+Con --requeue se envían sólo los trozos de la lista de reenvío que deja
+`process_batch_output.py` (respuestas que no se pudieron reparar), si siguen sin respuesta en caché.
+
+Con --stub las peticiones van al servidor local de `stub_chat_server.py` y la caché y las
+salidas quedan en la carpeta de pruebas de `run_batch_inference.py --fake`.
+
+Uso:
+    python src/inference/online_inference.py [--placas BSWT31 CFCT74 | --requeue data/processed/batch_requeue.txt]
+                                             [--concurrency 8] [--tpm 200000] [--stub]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from batch_manager import MANIFEST_PATH, BatchManager
+from batch_tasks import MODEL, generate_tasks, input_folder_path, load_prompt_from_file, prompt_file_path
+from result_cache import CACHE_PATH, ResultCache
+from run_batch_inference import FAKE_DIR
+from tokens import count_tokens
+
+try:
+    import openai
+except ImportError:  # dependencia opcional: sólo la necesita este modo
+    openai = None
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+OUTPUT_DIR = PROJECT_ROOT / 'data' / 'batch_output_procesados'
+
+DEFAULT_CONCURRENCY = 8
+# Límite de tokens por minuto (entrada + max_tokens) de la cuenta para el modelo; 0 = sin límite
+DEFAULT_TOKENS_PER_MINUTE = 200_000
+MAX_ATTEMPTS = 5
+# Espera antes del reintento n: aleatoria entre 0 y min(MAX_BACKOFF, BASE_BACKOFF * 2**(n-1)) segundos
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+REQUEST_TIMEOUT = 120.0
+
+
+class TokenBucket:
+    """Límite de tokens por minuto compartido por las corrutinas; atiende las reservas en orden."""
+
+    def __init__(self, tokens_per_minute: float):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60
+        self.available = tokens_per_minute
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int):
+        if not self.capacity:
+            return
+        tokens = min(tokens, self.capacity)  # una petición más grande que el límite igual se envía
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                await asyncio.sleep((tokens - self.available) / self.rate)
+
+
+def request_tokens(body: dict) -> int:
+    """Tokens que el proveedor descuenta del límite por una petición: entrada más `max_tokens`."""
+    return sum(count_tokens(message['content'], body.get('model', MODEL)) for message in body['messages']) + \
+        body.get('max_tokens', 0)
+
+
+def retry_delay(error, attempt: int) -> float:
+    """Espera antes de reintentar: la que indica el servidor o una exponencial con jitter completo."""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        if 'retry-after-ms' in headers:
+            return float(headers['retry-after-ms']) / 1000
+        if 'retry-after' in headers:
+            return float(headers['retry-after'])
+    except ValueError:
+        pass
+    return random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (attempt - 1)))
+
+
+def output_line(task: dict, completion) -> str:
+    """Línea de salida de una respuesta, con el formato de las salidas del batch."""
+    return json.dumps({
+        'id': f"online_{completion.id}",
+        'custom_id': task['custom_id'],
+        'response': {'status_code': 200, 'request_id': getattr(completion, '_request_id', None),
+                     'body': completion.model_dump(mode='json', exclude_unset=True)},
+        'error': None,
+    }, ensure_ascii=False) + '\n'
+
+
+def error_line(task: dict, error) -> str:
+    """Línea de salida de una petición fallida (respuesta de error o sin respuesta)."""
+    status = getattr(error, 'status_code', None)
+    detail = {'message': str(error), 'type': type(error).__name__}
+    return json.dumps({
+        'id': None,
+        'custom_id': task['custom_id'],
+        'response': {'status_code': status, 'request_id': None, 'body': {'error': detail}} if status else None,
+        'error': None if status else {'code': type(error).__name__, 'message': str(error)},
+    }, ensure_ascii=False) + '\n'
+
+
+def create_async_client(base_url: str = None, api_key: str = None):
+    """Cliente asíncrono de openai, sin reintentos propios (los maneja `OnlineRunner`)."""
+    if openai is None:
+        raise ImportError("La extracción en línea requiere el paquete openai (pip install openai).")
+    return openai.AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=0, timeout=REQUEST_TIMEOUT)
+
+
+class OnlineRunner:
+    """Envía peticiones con concurrencia acotada, límite de tokens por minuto y reintentos."""
+
+    def __init__(self, client, concurrency: int = DEFAULT_CONCURRENCY,
+                 tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE, max_attempts: int = MAX_ATTEMPTS):
+        self.client = client
+        self.concurrency = concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.max_attempts = max_attempts
+
+    async def _send(self, task: dict, bucket: TokenBucket) -> tuple:
+        """(línea de salida, éxito, reintentos) de una petición."""
+        retryable = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+        tokens = request_tokens(task['body'])
+        for attempt in range(1, self.max_attempts + 1):
+            await bucket.acquire(tokens)
+            try:
+                completion = await self.client.chat.completions.create(**task['body'])
+            except retryable as e:
+                if attempt == self.max_attempts:
+                    return error_line(task, e), False, attempt - 1
+                await asyncio.sleep(retry_delay(e, attempt))
+            except openai.APIStatusError as e:
+                return error_line(task, e), False, attempt - 1
+            else:
+                return output_line(task, completion), True, attempt - 1
+
+    async def run(self, tasks: list, output_path: Path) -> dict:
+        """
+        Envía `tasks` y agrega cada línea de salida a `output_path` apenas llega la respuesta.
+        Devuelve {peticiones, completadas, fallidas, reintentos, segundos, latencias (s por petición)}.
+        """
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        bucket = TokenBucket(self.tokens_per_minute)
+        queue = asyncio.Queue()
+        for task in tasks:
+            queue.put_nowait(task)
+        stats = {'peticiones': len(tasks), 'completadas': 0, 'fallidas': 0, 'reintentos': 0, 'latencias': []}
+        start = time.perf_counter()
+
+        with open(output_path, 'a', encoding='utf-8') as output_file:
+            async def worker():
+                while not queue.empty():
+                    task = queue.get_nowait()
+                    task_start = time.perf_counter()
+                    line, ok, retries = await self._send(task, bucket)
+                    output_file.write(line)
+                    output_file.flush()
+                    stats['completadas' if ok else 'fallidas'] += 1
+                    stats['reintentos'] += retries
+                    stats['latencias'].append(time.perf_counter() - task_start)
+
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(tasks)))))
+        stats['segundos'] = time.perf_counter() - start
+        return stats
+
+
+async def run_online(runner: OnlineRunner, tasks: list, output_path: Path) -> dict:
+    """`runner.run` cerrando el cliente al terminar, dentro del mismo event loop."""
+    async with runner.client:
+        return await runner.run(tasks, output_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extracción en línea (sin batch) para vehículos urgentes.")
+    parser.add_argument('--placas', nargs='+', default=None,
+                        help="Patentes a procesar (por defecto, todos los textos de reports/txt_prompts).")
+    parser.add_argument('--requeue', type=Path, default=None,
+                        help="Archivo con los custom_id a reenviar (uno por línea), ej. data/processed/batch_requeue.txt.")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Peticiones simultáneas.")
+    parser.add_argument('--tpm', type=float, default=DEFAULT_TOKENS_PER_MINUTE,
+                        help="Tokens por minuto (entrada + max_tokens) permitidos; 0 = sin límite.")
+    parser.add_argument('--base-url', default=None, help="URL base de la API (por defecto, la de OpenAI).")
+    parser.add_argument('--stub', action='store_true', help="Usa el servidor local de stub_chat_server.py.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    requeue = None
+    if args.requeue:
+        requeue = set(args.requeue.read_text(encoding='utf-8').split())
+        if not requeue:
+            print(f"No hay trozos para reenviar en {args.requeue}.")
+            return
+        # custom_id 'PATENTE-N': sólo hace falta leer los textos de esos vehículos
+        args.placas = sorted({custom_id.rpartition('-')[0] for custom_id in requeue})
+    if args.placas:
+        txt_files = [input_folder_path / f"{placa.strip().upper()}.txt" for placa in args.placas]
+        missing = [txt_file.name for txt_file in txt_files if not txt_file.is_file()]
+        if missing:
+            print(f"⚠️ No se encontraron los textos: {', '.join(missing)} (prepáralos con prepare_inference_texts.py).")
+        txt_files = [txt_file for txt_file in txt_files if txt_file.is_file()]
+    else:
+        txt_files = sorted(input_folder_path.glob('*.txt'))
+    if not txt_files:
+        print("No hay textos de vehículos para procesar.")
+        return
+
+    base_url, api_key = args.base_url, None
+    if args.stub:
+        from stub_chat_server import serve_chat_stub
+        _, base_url = serve_chat_stub()
+        api_key = 'stub'
+        print(f"🧪 Usando el servidor local de chat completions: {base_url}")
+    cache_path, output_dir = (FAKE_DIR / 'inference_cache.sqlite', FAKE_DIR / 'output') if args.stub \
+        else (CACHE_PATH, OUTPUT_DIR)
+    # Los trozos que esperan respuesta en un batch en curso no se piden otra vez
+    manifest_path = FAKE_DIR / 'manifest.json' if args.stub else MANIFEST_PATH
+    in_flight = BatchManager(None, manifest_path=manifest_path).in_flight()
+
+    with ResultCache(cache_path) as cache:
+        tasks, task_stats = generate_tasks(load_prompt_from_file(prompt_file_path), txt_files, cache,
+                                           in_flight=in_flight)
+        if requeue is not None:
+            tasks = [task for task in tasks if task['custom_id'] in requeue]
+        print(f"{len(txt_files)} vehículos: {task_stats['trozos']} trozos ({task_stats['en_cache']} ya en caché, "
+              f"{task_stats['en_curso']} en un batch en curso), {task_stats['por_reglas']} resueltos por reglas; "
+              f"{len(tasks)} peticiones por enviar.")
+        if not tasks:
+            return
+        # Id con el formato de los batches, para que process_batch_output.py guarde las respuestas en la caché
+        batch_id = f"batch_online{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        cache.assign_batch([task['custom_id'] for task in tasks], batch_id)
+
+    output_path = output_dir / f"{batch_id}_output.jsonl"
+    runner = OnlineRunner(create_async_client(base_url, api_key), args.concurrency, args.tpm)
+    stats = asyncio.run(run_online(runner, tasks, output_path))
+
+    vehicles = len({task['custom_id'].rpartition('-')[0] for task in tasks})  # custom_id 'PATENTE-N'
+    print(f"✅ {stats['completadas']} respuestas y {stats['fallidas']} fallidas ({stats['reintentos']} reintentos) "
+          f"en {stats['segundos']:.1f} s: {vehicles / stats['segundos'] * 60:.1f} vehículos/min.")
+    print(f"💾 Salidas en: {output_path}")
+    if not args.stub:
+        print("Procesa las salidas con: python src/processing/process_batch_output.py")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+"""
+Caché local de resultados de inferencia, direccionada por contenido.
+
+La clave de cada petición es el hash de (modelo, temperatura, prompt del sistema, texto
+del trozo): si nada de eso cambió, la respuesta anterior sigue siendo válida y no hace
+falta volver a enviarla al batch. La caché (SQLite) guarda dos tablas:
+- `results`: clave -> JSON de la respuesta del modelo.
+- `tasks`:   custom_id -> clave de la versión actual de cada trozo de cada vehículo,
+             y el id del batch en el que se envió (si está en curso).
+
+`run_batch_inference.py` registra las tareas y sólo envía las que no están en caché;
+`process_batch_output.py` llena la caché con las respuestas que llegan y combina los
+resultados en caché con los nuevos.
+"""
+
+import hashlib
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+CACHE_PATH = PROJECT_ROOT / 'data' / 'cache' / 'inference_cache.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key        TEXT PRIMARY KEY,
+    content    TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    custom_id  TEXT PRIMARY KEY,
+    placa      TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    batch_id   TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_placa ON tasks (placa);
+"""
+
+
+def cache_key(model: str, temperature: float, system_prompt: str, chunk: str) -> str:
+    """Hash SHA-256 de todo lo que determina la respuesta del modelo para un trozo."""
+    payload = json.dumps([model, temperature, system_prompt, chunk], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class ResultCache:
+    """Caché de respuestas por clave de contenido, más el registro de las tareas actuales."""
+
+    def __init__(self, path: Path = CACHE_PATH, read_only: bool = False):
+        """Con `read_only`, abre una caché existente sin poder modificarla (ej. para simulaciones)."""
+        path = Path(path)
+        if read_only:
+            self._conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+    def get(self, key: str):
+        """Devuelve el JSON (texto) de la respuesta en caché para `key`, o None."""
+        row = self._conn.execute('SELECT content FROM results WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def sync_vehicle(self, placa: str, entries: list):
+        """
+        Reemplaza las tareas registradas de un vehículo por `entries` [(custom_id, clave), ...].
+        Las tareas que no cambiaron conservan el id del batch en que se enviaron.
+        """
+        with self._conn:
+            previous = dict(self._conn.execute(
+                'SELECT custom_id, key || char(0) || IFNULL(batch_id, \'\') FROM tasks WHERE placa = ?', (placa,)))
+            self._conn.execute('DELETE FROM tasks WHERE placa = ?', (placa,))
+            rows = []
+            for custom_id, key in entries:
+                old_key, _, batch_id = previous.get(custom_id, '').partition('\0')
+                rows.append((custom_id, placa, key, batch_id if old_key == key and batch_id else None, _now()))
+            self._conn.executemany(
+                'INSERT INTO tasks (custom_id, placa, key, batch_id, updated_at) VALUES (?, ?, ?, ?, ?)', rows)
+
+    def registered(self, custom_id: str):
+        """(clave, id del batch o None) registrados para la tarea `custom_id`, o None si no existe."""
+        return self._conn.execute('SELECT key, batch_id FROM tasks WHERE custom_id = ?', (custom_id,)).fetchone()
+
+    def assign_batch(self, custom_ids: list, batch_id: str):
+        """Registra el batch en el que se enviaron las tareas `custom_ids`."""
+        with self._conn:
+            self._conn.executemany('UPDATE tasks SET batch_id = ?, updated_at = ? WHERE custom_id = ?',
+                                   [(batch_id, _now(), custom_id) for custom_id in custom_ids])
+
+    def store_response(self, custom_id: str, content: str, batch_id: str) -> bool:
+        """
+        Guarda la respuesta de una tarea bajo su clave actual, sólo si la tarea se envió en el
+        batch `batch_id`: así la salida de un batch antiguo (o de textos que cambiaron después)
+        nunca queda asociada a otro texto. Devuelve True si se guardó una respuesta nueva.
+        Se confirma en disco con `commit()` (o al cerrar la caché).
+        """
+        row = self._conn.execute('SELECT key, batch_id FROM tasks WHERE custom_id = ?', (custom_id,)).fetchone()
+        if row is None or not batch_id or row[1] != batch_id:
+            return False
+        cursor = self._conn.execute(
+            'INSERT OR IGNORE INTO results (key, content, created_at) VALUES (?, ?, ?)', (row[0], content, _now()))
+        return cursor.rowcount > 0
+
+    def commit(self):
+        self._conn.commit()
+
+    def current_results(self):
+        """Itera (custom_id, JSON de la respuesta) de las tareas actuales que ya tienen respuesta."""
+        yield from self._conn.execute(
+            'SELECT tasks.custom_id, results.content FROM tasks JOIN results ON results.key = tasks.key '
+            'ORDER BY tasks.custom_id')
+
+    def pending_count(self) -> int:
+        """Número de tareas actuales que todavía no tienen respuesta en caché."""
+        return self._conn.execute(
+            'SELECT COUNT(*) FROM tasks LEFT JOIN results ON results.key = tasks.key '
+            'WHERE results.key IS NULL').fetchone()[0]
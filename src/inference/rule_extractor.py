@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+
+"""
+Extracción por reglas de los campos del prompt que son lecturas directas de los documentos.
+
+Casi todo lo que `prompts/prompt.txt` le pide al modelo está escrito tal cual en dos
+documentos con formato fijo:
+- La fila del vehículo en el "Listado Vehículo – Constancias": multas, constancias, llaves,
+  vencimiento del permiso de circulación y de la revisión técnica, si funciona y el grabado
+  de patente. Las celdas vacías no dejan línea en el texto, pero las cinco últimas columnas
+  siempre tienen valor (SI/NO, 'VENCE …' o 'SIN REGISTRO'), así que la fila se lee desde el
+  final: lo que queda entre la patente y esas cinco celdas son las multas ('1,5 UTM') y las
+  constancias.
+- El CAV: limitaciones al dominio, la fecha de adquisición del propietario actual y la lista
+  de propietarios anteriores.
+
+`extract_fields` devuelve sólo los campos con respuesta segura ({'grupo.campo': valor}, con
+las mismas rutas que `chunk_reducer.FIELD_RULES`): si la fila no tiene la forma esperada,
+una fecha no existe (ej. 'VENCE 31-06-2026'), el CAV está incompleto ('Continúa en la página
+2' sin la página 2) o la inscripción está cancelada y no trae propietario, esos campos se
+omiten y quedan para el modelo. Los vehículos con todos los campos resueltos no generan
+peticiones al batch (`batch_tasks.py`), y en `process_batch_output.py` los valores de las
+reglas reemplazan a los del modelo.
+
+Ejecutado como script, compara las reglas con las respuestas del modelo en
+`data/batch_output_procesados/` (acuerdo por campo) e informa el tiempo por vehículo.
+
+Uso:
+    python src/inference/rule_extractor.py [--input reports/txt_prompts] [--batch-glob 'batch_*_output.jsonl'] [--details]
+"""
+
+import argparse
+import calendar
+import re
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+from document_slimmer import LISTADO_SECTION, WHITESPACE_PATTERN, extract_listado_row, split_sections
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+input_folder_path = PROJECT_ROOT / 'reports' / 'txt_prompts'
+prompt_file_path = PROJECT_ROOT / 'prompts' / 'prompt.txt'
+
+CAV_SECTION = 'CERTIFICADO DE ANOTACIONES VIGENTES'
+
+# Campos del JSON del prompt, en su orden
+FIELDS = (
+    'estado_legal_y_documentacion.limitaciones_dominio_activas',
+    'estado_legal_y_documentacion.permiso_circulacion_vigente',
+    'estado_legal_y_documentacion.fecha_vencimiento_permiso_circulacion',
+    'estado_legal_y_documentacion.revision_tecnica_vigente',
+    'estado_legal_y_documentacion.fecha_vencimiento_revision_tecnica',
+    'historial_propiedad.numero_propietarios',
+    'historial_propiedad.meses_dueño_actual',
+    'multas_y_costos_directos.tiene_multas_anotadas',
+    'multas_y_costos_directos.monto_total_multas_utm',
+    'condicion_fisica_y_riesgos.funciona',
+    'condicion_fisica_y_riesgos.tiene_llaves',
+    'condicion_fisica_y_riesgos.observaciones_criticas',
+    'condicion_fisica_y_riesgos.es_chatarra',
+    'condicion_fisica_y_riesgos.grabado_patente_vidrios',
+)
+
+MONTHS = {'ENERO': 1, 'FEBRERO': 2, 'MARZO': 3, 'ABRIL': 4, 'MAYO': 5, 'JUNIO': 6, 'JULIO': 7, 'AGOSTO': 8,
+          'SEPTIEMBRE': 9, 'SETIEMBRE': 9, 'OCTUBRE': 10, 'NOVIEMBRE': 11, 'DICIEMBRE': 12}
+
+# Fecha de referencia del prompt: 'La fecha actual a considerar ... es **1 de agosto de 2025**'
+PROMPT_DATE_PATTERN = re.compile(r'fecha actual a considerar[^*]*\*\*(\d{1,2}) de (\w+) de (\d{4})\*\*', re.IGNORECASE)
+# Celdas del Listado
+YES_NO = {'SI': True, 'NO': False}
+NO_RECORD = 'SIN REGISTRO'
+FINES_PATTERN = re.compile(r'^(\d+(?:[.,]\d+)?) ?UTM$')
+EXPIRY_DAY_PATTERN = re.compile(r'^VENCE (\d{1,2})-(\d{1,2})-(\d{4})$')
+EXPIRY_MONTH_PATTERN = re.compile(r'^VENCE ([A-Z]+)[- ](\d{4})$')
+SCRAP_WORD = 'CHATARRA'
+# Rótulos y títulos del CAV
+CAV_HEADINGS = ('DATOS DEL VEHICULO', 'DATOS DEL PROPIETARIO', 'LIMITACIONES AL DOMINIO',
+                'DATOS DE PROPIETARIOS ANTERIORES')
+NAME_LABEL = re.compile(r'^Nombre ?:$')
+ACQUIRED_LABEL = re.compile(r'^Fec\. adquisici[oó]n ?:$')
+LIMITATION_LABEL = re.compile(r'^(Tipo Documento|Naturaleza acto) ?:$')
+NO_LIMITATIONS = 'A LA FECHA NO TIENE ANOTACIONES VIGENTES'
+CONTINUES_PATTERN = re.compile(r'^Continúa en la página (\d+)$')
+PAGE_PATTERN = re.compile(r'^Página (\d+)$')
+DATE_PATTERN = re.compile(r'^(\d{2})-(\d{2})-(\d{4})$')
+
+
+def reference_date(system_prompt: str) -> date:
+    """Fecha 'actual' que usa el prompt para las vigencias y los meses del dueño actual."""
+    match = PROMPT_DATE_PATTERN.search(system_prompt)
+    if not match or match.group(2).upper() not in MONTHS:
+        raise ValueError("El prompt no indica la fecha actual a considerar ('… es **1 de agosto de 2025**').")
+    return date(int(match.group(3)), MONTHS[match.group(2).upper()], int(match.group(1)))
+
+
+def _lines(body: str) -> list:
+    lines = [WHITESPACE_PATTERN.sub(' ', line).strip() for line in body.splitlines()]
+    return [line for line in lines if line]
+
+
+def parse_expiry(value: str):
+    """
+    Fecha de vencimiento de una celda del Listado: 'VENCE 31-03-2026', 'VENCE NOVIEMBRE-2025'
+    (último día del mes) o 'SIN REGISTRO' (None). Lanza ValueError si no se reconoce o no existe.
+    """
+    if value == NO_RECORD:
+        return None
+    match = EXPIRY_DAY_PATTERN.match(value)
+    if match:
+        return date(int(match.group(3)), int(match.group(2)), int(match.group(1)))
+    match = EXPIRY_MONTH_PATTERN.match(value)
+    if match and match.group(1) in MONTHS:
+        year, month = int(match.group(2)), MONTHS[match.group(1)]
+        return date(year, month, calendar.monthrange(year, month)[1])
+    raise ValueError(f"Vencimiento no reconocido: {value!r}")
+
+
+def extract_listado(lines: list, placa: str, today: date) -> dict:
+    """Campos de la fila del vehículo en el Listado (sólo los que tienen respuesta segura)."""
+    row = extract_listado_row(lines, placa)
+    if row is lines:  # la patente no aparece en el listado
+        return {}
+    cells = row[row.index(placa.strip().upper()) + 1:]
+    if len(cells) < 5:
+        return {}
+    *middle, keys, permit, inspection, works, engraved = cells
+    if not {keys, works, engraved} <= YES_NO.keys():
+        return {}
+
+    values = {
+        'condicion_fisica_y_riesgos.tiene_llaves': YES_NO[keys],
+        'condicion_fisica_y_riesgos.funciona': YES_NO[works],
+        'condicion_fisica_y_riesgos.grabado_patente_vidrios': YES_NO[engraved],
+    }
+    for field, cell in (('permiso_circulacion', permit), ('revision_tecnica', inspection)):
+        try:
+            expiry = parse_expiry(cell)
+        except ValueError:
+            continue
+        values[f'estado_legal_y_documentacion.fecha_vencimiento_{field}'] = expiry and expiry.isoformat()
+        values[f'estado_legal_y_documentacion.{field}_vigente'] = expiry is not None and expiry >= today
+
+    # Antes de las cinco celdas fijas: las multas (opcional) y las constancias
+    fines = FINES_PATTERN.match(middle[0]) if middle else None
+    if fines:
+        middle = middle[1:]
+    amount = float(fines.group(1).replace(',', '.')) if fines else 0.0
+    values['multas_y_costos_directos.tiene_multas_anotadas'] = amount > 0
+    values['multas_y_costos_directos.monto_total_multas_utm'] = amount
+    values['condicion_fisica_y_riesgos.es_chatarra'] = any(SCRAP_WORD in cell.upper() for cell in middle)
+    # Una constancia en varias líneas no se distingue de varias constancias: eso queda para el modelo
+    if len(middle) <= 1:
+        values['condicion_fisica_y_riesgos.observaciones_criticas'] = middle
+    return values
+
+
+def _blocks(lines: list) -> dict:
+    """{título del CAV: líneas hasta el título siguiente} (las de un título repetido se juntan)."""
+    blocks = {}
+    current = None
+    for line in lines:
+        if line in CAV_HEADINGS:
+            current = blocks.setdefault(line, [])
+        elif current is not None:
+            current.append(line)
+    return blocks
+
+
+def _value_after(lines: list, label: re.Pattern) -> list:
+    """Valores (línea siguiente) de cada aparición del rótulo `label`."""
+    return [lines[i + 1] for i, line in enumerate(lines[:-1]) if label.match(line)]
+
+
+def extract_cav(lines: list, today: date) -> dict:
+    """Campos del CAV (sólo los que tienen respuesta segura)."""
+    # Un certificado con páginas faltantes puede omitir limitaciones o propietarios anteriores
+    pages = {int(match.group(1)) for match in map(PAGE_PATTERN.match, lines) if match}
+    continues = {int(match.group(1)) for match in map(CONTINUES_PATTERN.match, lines) if match}
+    if not continues <= pages:
+        return {}
+
+    blocks = _blocks(lines)
+    values = {}
+    limitations = blocks.get('LIMITACIONES AL DOMINIO')
+    if limitations is not None:
+        if any(LIMITATION_LABEL.match(line) for line in limitations):
+            values['estado_legal_y_documentacion.limitaciones_dominio_activas'] = True
+        elif NO_LIMITATIONS in limitations:
+            values['estado_legal_y_documentacion.limitaciones_dominio_activas'] = False
+
+    # Sin un único propietario actual (ej. inscripción cancelada) no se cuentan propietarios
+    owner = blocks.get('DATOS DEL PROPIETARIO', [])
+    if len(_value_after(owner, NAME_LABEL)) != 1:
+        return values
+    previous = _value_after(blocks.get('DATOS DE PROPIETARIOS ANTERIORES', []), NAME_LABEL)
+    values['historial_propiedad.numero_propietarios'] = 1 + len(previous)
+
+    acquired = [DATE_PATTERN.match(value) for value in _value_after(owner, ACQUIRED_LABEL)]
+    if len(acquired) == 1 and acquired[0]:
+        day, month, year = (int(part) for part in acquired[0].groups())
+        months = (today.year - year) * 12 + today.month - month - (today.day < day)
+        if months >= 0:
+            values['historial_propiedad.meses_dueño_actual'] = months
+    return values
+
+
+def extract_fields(text: str, placa: str, today: date) -> dict:
+    """
+    Campos del prompt que las reglas resuelven con seguridad para un texto consolidado:
+    {'grupo.campo': valor}. Los campos ausentes quedan para el modelo.
+    """
+    values = {}
+    for name, body in split_sections(text):
+        if name.upper().startswith(CAV_SECTION):
+            values.update(extract_cav(_lines(body), today))
+        elif name.upper().startswith(LISTADO_SECTION):
+            values.update(extract_listado(_lines(body), placa, today))
+    return values
+
+
+def is_complete(values: dict) -> bool:
+    """True si las reglas resolvieron todos los campos del prompt (no hace falta el modelo)."""
+    return all(field in values for field in FIELDS)
+
+
+def apply_rules(ai_data: dict, values: dict) -> dict:
+    """
+    JSON del modelo (puede ser vacío) con los campos de las reglas por encima. Los campos
+    del prompt van siempre en su orden, con None si nadie los resolvió.
+    """
+    merged = {}
+    for path in FIELDS:
+        group, field = path.split('.')
+        merged.setdefault(group, {})[field] = None
+    for group, fields in ai_data.items():
+        if isinstance(fields, dict) and isinstance(merged.get(group), dict):
+            merged[group].update(fields)
+        else:
+            merged[group] = fields
+    for path, value in values.items():
+        group, field = path.split('.')
+        if not isinstance(merged.get(group), dict):
+            merged[group] = {}
+        merged[group][field] = value
+    return merged
+
+
+# --- Informe de acuerdo con el modelo ---
+def _same(rule_value, ai_value) -> bool:
+    if isinstance(rule_value, bool) or isinstance(ai_value, bool):
+        return type(rule_value) is type(ai_value) and rule_value == ai_value
+    if isinstance(rule_value, (int, float)) and isinstance(ai_value, (int, float)):
+        return abs(rule_value - ai_value) < 1e-9
+    if isinstance(rule_value, list) and isinstance(ai_value, list):
+        return sorted(str(item).strip().upper() for item in rule_value) == \
+            sorted(str(item).strip().upper() for item in ai_value)
+    return rule_value == ai_value
+
+
+def load_model_results(batch_glob: str) -> dict:
+    """{patente: JSON combinado} de las salidas del batch (como en process_batch_output.py)."""
+    sys.path.append(str(PROJECT_ROOT / 'src' / 'processing'))
+    from chunk_reducer import ChunkReducer
+    from process_batch_output import BATCH_OUTPUT_DIR, parse_batch_line
+
+    reducer = ChunkReducer()
+    for batch_file in sorted(BATCH_OUTPUT_DIR.glob(batch_glob)):
+        with open(batch_file, 'rb') as f:
+            for line in f:
+                try:
+                    custom_id, _, ai_data, _ = parse_batch_line(line)
+                except Exception:
+                    continue
+                if isinstance(ai_data, dict):
+                    reducer.add(custom_id, ai_data)
+    return reducer.results()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Acuerdo entre la extracción por reglas y las respuestas del modelo.")
+    parser.add_argument('--input', type=Path, default=input_folder_path,
+                        help="Carpeta con los textos consolidados (.txt).")
+    parser.add_argument('--batch-glob', default='batch_*_output.jsonl',
+                        help="Patrón de las salidas del batch en data/batch_output_procesados/.")
+    parser.add_argument('--details', action='store_true', help="Lista cada diferencia con el modelo.")
+    args = parser.parse_args()
+
+    with open(prompt_file_path, 'r', encoding='utf-8') as f:
+        today = reference_date(f.read())
+    archivos_txt = sorted(args.input.glob('*.txt'))
+    if not archivos_txt:
+        print(f"⚠️ ADVERTENCIA: No se encontraron archivos .txt en la carpeta '{args.input}'.")
+        return
+
+    texts = {txt_file.stem: txt_file.read_text(encoding='utf-8') for txt_file in archivos_txt}
+    start = time.perf_counter()
+    rules = {placa: extract_fields(text, placa, today) for placa, text in texts.items()}
+    elapsed = time.perf_counter() - start
+    complete = sum(is_complete(values) for values in rules.values())
+    print(f"Reglas: {len(rules)} vehículos en {elapsed * 1000:.0f} ms ({elapsed * 1000 / len(rules):.2f} ms por "
+          f"vehículo); {complete} resueltos por completo, {len(rules) - complete} necesitan al modelo.")
+
+    model = load_model_results(args.batch_glob)
+    if not model:
+        print(f"No hay respuestas del modelo que coincidan con '{args.batch_glob}' para comparar.")
+        return
+
+    print(f"\n{'campo':<40} {'reglas':>7} {'con IA':>7} {'iguales':>8} {'distintos':>10} {'IA nulo':>8} {'acuerdo':>8}")
+    differences = []
+    for path in FIELDS:
+        group, field = path.split('.')
+        resolved = compared = equal = ai_null = 0
+        for placa, values in rules.items():
+            if path not in values:
+                continue
+            resolved += 1
+            if placa not in model:
+                continue
+            compared += 1
+            ai_value = (model[placa].get(group) or {}).get(field)
+            if ai_value is None and values[path] is not None:
+                ai_null += 1
+            if _same(values[path], ai_value):
+                equal += 1
+            else:
+                differences.append((placa, path, values[path], ai_value))
+        agreement = f"{equal / compared:.1%}" if compared else '-'
+        print(f"{field:<40} {resolved:>7} {compared:>7} {equal:>8} {compared - equal:>10} {ai_null:>8} {agreement:>8}")
+
+    if args.details and differences:
+        print(f"\n{'vehículo':<10} {'campo':<40} {'reglas':<30} modelo")
+        for placa, path, rule_value, ai_value in differences:
+            print(f"{placa:<10} {path.split('.')[1]:<40} {str(rule_value):<30} {ai_value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,23 +3,35 @@
 """
 Script para procesar archivos de texto de patentes en lotes (batch) utilizando la API de OpenAI.
 
-Este script realiza los siguientes pasos:
+Este script realiza los siguientes pasos, sin pedir confirmación (apto para ejecución programada):
 1.  Define y crea la estructura de carpetas para el proyecto.
 2.  Carga un prompt desde un archivo externo.
 3.  Lee archivos .txt desde la carpeta de entrada especificada.
 4.  Asigna un ID único a cada tarea basado en el nombre del archivo de patente.
-5.  Genera un archivo JSONL con todas las tareas y lo guarda en una carpeta de salida.
-6.  Pide confirmación al usuario antes de enviar el lote a OpenAI.
-7.  Sube el archivo JSONL y crea el trabajo de batch.
+5.  Omite las tareas cuya respuesta ya está en la caché local (ver result_cache.py), las que
+    esperan respuesta en un batch en curso del manifiesto y los vehículos que las reglas
+    resuelven por completo (ver rule_extractor.py).
+6.  Divide las tareas restantes en fragmentos dentro de los límites por batch y los envía
+    (ver batch_manager.py), registrándolos en un manifiesto local.
+7.  Con --wait, consulta los batches hasta que terminen, descarga sus salidas en
+    'data/batch_output_procesados/' y reenvía las peticiones que fallaron.
+
+Uso:
+    python src/inference/run_batch_inference.py [--wait] [--resume] [--dry-run] [--fake]
+
+Sin tareas nuevas (o con --resume) sólo se retoman los batches en curso del manifiesto.
 """
 
 # --- Parte 1: Configuración e Inicialización ---
-import json
-import datetime
+import argparse
 from pathlib import Path
-from openai import OpenAI
 from dotenv import load_dotenv
 
+from batch_manager import MAX_POLL_INTERVAL, POLL_INTERVAL, BatchManager, shard_tasks
+from batch_tasks import (SLIM_DOCUMENTS, generate_tasks, input_folder_path, load_prompt_from_file,
+                         prompt_file_path)
+from result_cache import CACHE_PATH, ResultCache
+
 # Carga variables de entorno (asegúrate de que tu .env esté en la raíz del proyecto)
 load_dotenv()
 
@@ -27,160 +39,130 @@ load_dotenv()
 # El script está en 'src/inference/', así que subimos TRES niveles para llegar a la raíz del proyecto.
 PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
 
-# Ruta al archivo que contiene el prompt del sistema.
-prompt_file_path = PROJECT_ROOT / 'prompts' / 'prompt.txt'
-
-# Carpeta de entrada para los archivos .txt de patentes.
-input_folder_path = PROJECT_ROOT / 'reports' / 'txt_prompts'
-
-# Carpeta de salida para guardar los archivos .jsonl que se envían a la API.
-batch_json_folder_path = PROJECT_ROOT / 'data' / 'batch_json_generados'
-
-# Carpeta de salida para los resultados procesados del batch (para un script posterior).
-batch_output_folder_path = PROJECT_ROOT / 'data' / 'batch_output_procesados'
+# El prompt del sistema ('prompts/prompt.txt'), la carpeta de entrada ('reports/txt_prompts')
+# y la configuración del modelo están en batch_tasks.py. Los archivos .jsonl enviados se
+# guardan en 'data/batch_json_generados/' y las salidas en 'data/batch_output_procesados/'
+# (ver batch_manager.py).
 
-# --- Creación de Carpetas ---
-# Asegura que todas las carpetas necesarias existan antes de empezar.
-input_folder_path.mkdir(parents=True, exist_ok=True)
-batch_json_folder_path.mkdir(parents=True, exist_ok=True)
-batch_output_folder_path.mkdir(parents=True, exist_ok=True)
-(PROJECT_ROOT / 'prompts').mkdir(parents=True, exist_ok=True)
+# Con --fake, el manifiesto, los archivos y la caché van en una carpeta aparte para no
+# mezclar batches simulados con los reales. El estado de la API falsa vive en memoria, así
+# que el manifiesto simulado se descarta en cada ejecución.
+FAKE_DIR = PROJECT_ROOT / 'data' / 'batch_jobs' / 'fake'
 
-# --- Configuración del Proceso ---
-# Define el tamaño máximo de cada trozo de texto para no exceder el límite de tokens.
-chunk_size = 5000
 
-# --- Funciones Auxiliares ---
-def load_prompt_from_file(filename: Path) -> str:
-    """Carga el prompt desde una ruta específica."""
+def create_client(fake: bool = False):
+    """Cliente de OpenAI, o el cliente falso local de fake_batch_api.py."""
+    if fake:
+        from fake_batch_api import FakeBatchClient
+        print("🧪 Usando la API de batch falsa (local).")
+        return FakeBatchClient()
     try:
-        with open(filename, 'r', encoding='utf-8') as file:
-            return file.read()
-    except FileNotFoundError:
-        print(f"Error CRÍTICO: El archivo de prompt '{filename}' no se encontró.")
-        raise
+        from openai import OpenAI
+        client = OpenAI()
+        print("✅ Cliente de OpenAI inicializado correctamente.")
+        return client
     except Exception as e:
-        print(f"Error CRÍTICO al leer el archivo de prompt '{filename}': {e}")
+        print(f"Error CRÍTICO al inicializar el cliente de OpenAI: {e}")
         raise
 
-def split_text_in_chunks(texto: str, tamano_chunk: int) -> list:
-    """Divide un texto largo en fragmentos más pequeños."""
-    return [texto[i:i+tamano_chunk] for i in range(0, len(texto), tamano_chunk)]
-
-# --- Inicialización del Cliente y Carga del Prompt ---
-try:
-    client = OpenAI()
-    print("✅ Cliente de OpenAI inicializado correctamente.")
-except Exception as e:
-    print(f"Error CRÍTICO al inicializar el cliente de OpenAI: {e}")
-    raise
 
-final_system_prompt = load_prompt_from_file(prompt_file_path)
-print("✅ Prompt del sistema cargado correctamente.")
+def build_batch_tasks(result_cache, register: bool = True, in_flight=()) -> list:
+    """--- Parte 2: Generación de Tareas para el Batch ---"""
+    input_folder_path.mkdir(parents=True, exist_ok=True)
+    (PROJECT_ROOT / 'prompts').mkdir(parents=True, exist_ok=True)
 
-# --- Parte 2: Generación de Tareas para el Batch ---
-print("\nIniciando la generación de tareas para el batch...")
-batch_tasks_list = []
+    final_system_prompt = load_prompt_from_file(prompt_file_path)
+    print("✅ Prompt del sistema cargado correctamente.")
 
-archivos_txt = list(input_folder_path.glob('*.txt'))
+    print("\nIniciando la generación de tareas para el batch...")
+    archivos_txt = sorted(input_folder_path.glob('*.txt'))
+    if not archivos_txt:
+        print(f"⚠️ ADVERTENCIA: No se encontraron archivos .txt en la carpeta '{input_folder_path}'.")
+        return []
 
-if not archivos_txt:
-    print(f"⚠️ ADVERTENCIA: No se encontraron archivos .txt en la carpeta '{input_folder_path}'.")
-else:
     print(f"Procesando {len(archivos_txt)} archivos desde: '{input_folder_path}'")
-    for txt_file in archivos_txt:
-        try:
-            # Intenta leer el archivo con codificación UTF-8.
-            texto = txt_file.read_text(encoding='utf-8')
-        except UnicodeDecodeError:
-            # Si falla, intenta con cp1252, común en sistemas Windows.
-            try:
-                texto = txt_file.read_text(encoding='cp1252')
-            except Exception as e:
-                print(f"Error al leer el archivo {txt_file.name}: {e}. Saltando archivo.")
-                continue
-        except Exception as e:
-            print(f"Error inesperado con el archivo {txt_file.name}: {e}. Saltando archivo.")
-            continue
-
-        # Divide el texto en chunks si es necesario.
-        chunks = split_text_in_chunks(texto, chunk_size) if len(texto) > chunk_size else [texto]
-
-        # Genera una tarea por cada chunk, usando el nombre del archivo como ID base.
-        for idx, chunk in enumerate(chunks):
-            if not chunk.strip():
-                continue
-
-            # El custom_id ahora es la patente (nombre del archivo sin extensión).
-            custom_id = f"{txt_file.stem}-{idx+1}"
-
-            task_item = {
-                "custom_id": custom_id,
-                "method": "POST",
-                "url": "/v1/chat/completions",
-                "body": {
-                    "model": "gpt-4.1-mini",
-                    "temperature": 0.1,
-                    "max_tokens": 4000,
-                    "response_format": {"type": "json_object"}, # Para asegurar salida en JSON
-                    "messages": [
-                        {"role": "system", "content": final_system_prompt},
-                        {"role": "user", "content": chunk}
-                    ],
-                }
-            }
-            batch_tasks_list.append(task_item)
-
-print(f"\n✅ Generación de tareas completada.")
-print(f"Número total de tareas generadas para el batch: {len(batch_tasks_list)}")
-
-# --- Parte 3: Creación y Envío del Archivo Batch ---
-if not batch_tasks_list:
-    print("No se generaron tareas. El proceso de batch ha finalizado sin envío.")
-else:
-    # Confirmación del usuario antes de proceder.
-    user_confirmation_envio = input(f"Se han generado {len(batch_tasks_list)} tareas. ¿Deseas proceder con el envío del batch a OpenAI? (s/N): ")
-
-    if user_confirmation_envio.lower() != 's':
-        print("Envío del batch cancelado por el usuario.")
+    batch_tasks_list, stats = generate_tasks(final_system_prompt, archivos_txt, result_cache, register=register,
+                                              in_flight=in_flight)
+
+    print(f"\n✅ Generación de tareas completada.")
+    print(f"Trozos de texto: {stats['trozos']} ({stats['en_cache']} ya en caché).")
+    if stats['en_curso']:
+        print(f"Trozos que esperan respuesta en un batch en curso (no se reenvían): {stats['en_curso']}.")
+    if stats['por_reglas']:
+        print(f"Vehículos resueltos por reglas, sin llamar al modelo: {stats['por_reglas']}.")
+    print(f"Número total de tareas generadas para el batch: {len(batch_tasks_list)}")
+    if SLIM_DOCUMENTS and stats['tokens_antes']:
+        print(f"Tokens de documentos: {stats['tokens_antes']:,} -> {stats['tokens_despues']:,} tras la reducción "
+              f"({1 - stats['tokens_despues'] / stats['tokens_antes']:.1%} menos).")
+    return batch_tasks_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera y envía las tareas de inferencia en batch.")
+    parser.add_argument('--wait', action='store_true',
+                        help="Espera a que terminen los batches, descarga sus salidas y reenvía los fallos.")
+    parser.add_argument('--resume', action='store_true',
+                        help="No genera tareas nuevas: sólo sigue los batches en curso del manifiesto.")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Genera las tareas y muestra los fragmentos sin enviar nada.")
+    parser.add_argument('--fake', action='store_true', help="Usa la API de batch falsa (fake_batch_api.py).")
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL,
+                        help="Segundos entre consultas de estado (se duplica mientras nada cambia).")
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="Segundos máximos de espera con --wait (los batches en curso se retoman después).")
+    args = parser.parse_args()
+
+    # Caché de respuestas: los trozos cuyo (modelo, temperatura, prompt, texto) ya se procesaron
+    # en un batch anterior no se vuelven a enviar (ver result_cache.py).
+    if args.fake:
+        if not args.dry_run:
+            (FAKE_DIR / 'manifest.json').unlink(missing_ok=True)
+        cache_path = FAKE_DIR / 'inference_cache.sqlite'
+        manager_paths = {'manifest_path': FAKE_DIR / 'manifest.json', 'input_dir': FAKE_DIR / 'input',
+                         'output_dir': FAKE_DIR / 'output'}
     else:
-        print("\nProcediendo con la creación del archivo batch y envío a OpenAI...")
-
-        # Genera un nombre de archivo único con timestamp.
-        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-        batch_input_filename = f"batch_input_{timestamp}.jsonl"
-        batch_input_filepath = batch_json_folder_path / batch_input_filename
+        cache_path, manager_paths = CACHE_PATH, {}
 
-        # Convierte la lista de tareas a formato JSONL y guarda el archivo.
+    if args.dry_run:
+        # Sin efectos: la caché (si existe) se abre sólo para lectura y no se registran las tareas
+        result_cache = ResultCache(cache_path, read_only=True) if cache_path.exists() else None
+        in_flight = BatchManager(None, **manager_paths).in_flight()
         try:
-            with open(batch_input_filepath, 'w', encoding='utf-8') as f:
-                for task in batch_tasks_list:
-                    f.write(json.dumps(task) + '\n')
-            print(f"✅ Archivo batch guardado en: '{batch_input_filepath}'")
-        except Exception as e:
-            print(f"Error CRÍTICO al guardar el archivo JSONL: {e}")
-            raise
-
-        # Procede a subir el archivo y crear el job.
-        try:
-            # Paso 1: Subir el archivo .jsonl a OpenAI.
-            print(f"Subiendo archivo '{batch_input_filepath.name}' a OpenAI...")
-            with open(batch_input_filepath, 'rb') as f:
-                openai_batch_file_object = client.files.create(
-                    file=f,
-                    purpose="batch"
-                )
-            print(f"✅ Archivo subido a OpenAI con ID: {openai_batch_file_object.id}")
-
-            # Paso 2: Crear el job de batch.
-            print("Creando el job de batch en OpenAI...")
-            openai_batch_job_object = client.batches.create(
-                input_file_id=openai_batch_file_object.id,
-                endpoint="/v1/chat/completions",
-                completion_window="24h"
-            )
-            print(f"🚀 ¡Éxito! Job de batch enviado con ID: {openai_batch_job_object.id}")
-            print("Puedes monitorear el estado en tu dashboard de OpenAI o usando la API.")
-
-        except Exception as e:
-            print(f"Error CRÍTICO durante el envío del batch a OpenAI: {e}")
\ No newline at end of file
+            batch_tasks_list = [] if args.resume else build_batch_tasks(result_cache, register=False,
+                                                                        in_flight=in_flight)
+        finally:
+            if result_cache is not None:
+                result_cache.close()
+        shards = shard_tasks(batch_tasks_list)
+        print(f"Simulación: {len(batch_tasks_list)} tareas en {len(shards)} batches; no se envió nada.")
+        return
+
+    with ResultCache(cache_path) as result_cache:
+        manager = BatchManager(create_client(args.fake), cache=result_cache, **manager_paths)
+        batch_tasks_list = [] if args.resume else build_batch_tasks(result_cache, in_flight=manager.in_flight())
+
+        # --- Parte 3: Envío de los fragmentos como batches ---
+        if batch_tasks_list:
+            print("\nProcediendo con la creación de los archivos batch y su envío...")
+            try:
+                manager.submit(batch_tasks_list)
+            except Exception as e:
+                print(f"Error CRÍTICO durante el envío del batch a OpenAI: {e}")
+                raise
+        else:
+            print("No hay tareas nuevas (todas en caché o en un batch en curso).")
+
+        # --- Parte 4: Seguimiento y descarga de resultados ---
+        if not manager.in_flight():
+            print("No hay batches en curso.")
+        elif args.wait:
+            if manager.wait(args.poll_interval, max(MAX_POLL_INTERVAL, args.poll_interval), args.timeout):
+                print("\n🎉 Todos los batches terminaron. Procesa las salidas con: "
+                      "python src/processing/process_batch_output.py")
+        else:
+            manager.poll()
+            print(f"{len(manager.in_flight())} batches en curso. Vuelve a ejecutar con --resume --wait para seguirlos.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""
+Servidor local que imita `/v1/chat/completions`, para probar `online_inference.py` sin OpenAI.
+
+Responde con el mismo JSON que la API (`chat.completion`, con `usage`), así que el cliente
+asíncrono de openai lo acepta apuntando `base_url` a este servidor. Cada respuesta espera
+`latency` segundos (± `jitter`, para simular la duración de la generación) y se puede
+simular:
+- `fail_rate`: fracción de peticiones que terminan con 500.
+- `rate_limit_rate`: fracción de peticiones rechazadas con 429 y `retry-after-ms`.
+- `responder`: función tarea -> contenido (texto) de la respuesta, como en `fake_batch_api.py`.
+
+El contenido de cada respuesta lo decide el `responder` a partir de la petición (el mismo
+de la API de batch falsa: por defecto, un objeto JSON vacío).
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fake_batch_api import default_responder
+from tokens import count_tokens
+
+ENDPOINT = '/v1/chat/completions'
+RETRY_AFTER_MS = 200
+
+
+def completion_body(request_body: dict, content: str, completion_id: str) -> dict:
+    """Cuerpo de una respuesta `chat.completion` para la petición `request_body`."""
+    prompt_tokens = sum(count_tokens(message['content']) for message in request_body['messages'])
+    completion_tokens = count_tokens(content)
+    return {
+        'id': completion_id,
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': request_body.get('model'),
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                     'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                  'total_tokens': prompt_tokens + completion_tokens},
+    }
+
+
+def serve_chat_stub(latency: float = 0.5, jitter: float = 0.0, fail_rate: float = 0.0,
+                    rate_limit_rate: float = 0.0, responder=default_responder, seed: int = 0, port: int = 0):
+    """
+    Levanta el servidor en un hilo de fondo y devuelve (servidor, base_url); `base_url`
+    termina en '/v1', como espera el cliente de openai. `servidor.requests_served` cuenta
+    las peticiones recibidas (incluidas las rechazadas).
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, para que el cliente reutilice conexiones
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            request_body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            with lock:
+                server.requests_served += 1
+                request_number = server.requests_served
+                draw = rng.random()
+                delay = max(0.0, latency + rng.uniform(-jitter, jitter))
+            if self.path != ENDPOINT:
+                self._send_json(404, {'error': {'message': f'Ruta desconocida: {self.path}', 'type': 'invalid_request_error'}})
+                return
+            if draw < rate_limit_rate:
+                self._send_json(429, {'error': {'message': 'Límite de tasa simulado', 'type': 'rate_limit_error'}},
+                                {'retry-after-ms': str(RETRY_AFTER_MS)})
+                return
+            time.sleep(delay)
+            if draw < rate_limit_rate + fail_rate:
+                self._send_json(500, {'error': {'message': 'Error simulado', 'type': 'server_error'}})
+                return
+            content = responder({'custom_id': None, 'body': request_body})
+            self._send_json(200, completion_body(request_body, content, f'chatcmpl-stub{request_number:06d}'),
+                            {'x-request-id': f'req_stub{request_number:06d}'})
+
+        def log_message(self, format, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 256  # cola de conexiones pendientes, para la concurrencia alta del benchmark
+
+    server = Server(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    server.requests_served = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
@@ -0,0 +1,48 @@
+"""
+Conteo de tokens para los textos que se envían al modelo.
+
+Usa `tiktoken` con la codificación del modelo cuando está disponible. Si la librería
+no está instalada (o no puede cargar su codificación, ej. sin acceso a internet), se
+usa una aproximación de `CHARS_PER_TOKEN` caracteres por token.
+"""
+
+import math
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # dependencia opcional
+    tiktoken = None
+
+DEFAULT_MODEL = "gpt-4.1-mini"
+FALLBACK_ENCODING = "o200k_base"
+CHARS_PER_TOKEN = 4
+
+
+def get_encoding(model: str = DEFAULT_MODEL):
+    """Devuelve la codificación de `tiktoken` para el modelo, o None si no está disponible."""
+    return _load_encoding(model)
+
+
+@lru_cache(maxsize=None)
+def _load_encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding(FALLBACK_ENCODING)
+    except Exception as e:
+        print(f"⚠️ No se pudo cargar la codificación de tiktoken ({type(e).__name__}); se usará una aproximación.")
+        return None
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """Cuenta los tokens de `text` para `model` (exacto con tiktoken, aproximado sin él)."""
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
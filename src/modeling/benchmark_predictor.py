@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark de latencia y throughput de la predicción de precios.
+
+1. En proceso: `PricePredictor.predict_one` auto por auto (latencia p50/p99 sin HTTP).
+2. Servicio HTTP (`price_service.py`) con varios clientes concurrentes, cada uno con su
+   conexión keep-alive y una petición de un auto a la vez, sin micro-batching
+   (`max_batch=1`) y con micro-batching. Reporta p50/p99 por petición, peticiones por
+   segundo y registros medios por lote.
+
+Los autos se toman del dataset de entrada de la variante del modelo (`data/raw` o
+`data/processed`), tal como los recibiría el servicio.
+
+Uso:
+    python src/modeling/benchmark_predictor.py [--feature-set enriched] [--requests 2000]
+                                               [--concurrency 1 8 32] [--max-batch 64]
+"""
+
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from predictor import PricePredictor
+from price_service import serve
+from train_model import FEATURE_SETS
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'processing'))
+from clean_pipeline import VARIANTS  # noqa: E402
+from storage import read_table  # noqa: E402
+
+
+def sample_records(predictor: PricePredictor) -> list:
+    """Autos del dataset de entrada, sólo con las columnas que usa el modelo (nulos como None)."""
+    df = read_table(VARIANTS[predictor.metadata['variant']]['input'], columns=predictor.sources, csv_dtype=str)
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def percentiles(latencies: list) -> tuple:
+    """(p50, p99) en milisegundos."""
+    return tuple(float(value) * 1000 for value in np.percentile(latencies, [50, 99]))
+
+
+def bench_in_process(predictor: PricePredictor, records: list, n: int) -> tuple:
+    latencies = []
+    for i in range(n):
+        start = time.perf_counter()
+        predictor.predict_one(records[i % len(records)])
+        latencies.append(time.perf_counter() - start)
+    return percentiles(latencies), n / sum(latencies)
+
+
+def bench_http(base_url: str, bodies: list, n: int, concurrency: int) -> tuple:
+    """
+    `concurrency` clientes envían en total `n` peticiones.
+    Devuelve ((p50, p99), peticiones/s, peticiones fallidas).
+    """
+    host, port = base_url.removeprefix('http://').split(':')
+    latencies = []
+    failures = []
+    counter = iter(range(n))
+    lock = threading.Lock()
+
+    def client():
+        connection = http.client.HTTPConnection(host, int(port))
+        own = []
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            start = time.perf_counter()
+            try:
+                connection.request('POST', '/predict', body=bodies[i % len(bodies)],
+                                   headers={'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise RuntimeError(f"Respuesta {response.status} del servicio.")
+                own.append(time.perf_counter() - start)
+            except (OSError, http.client.HTTPException, RuntimeError) as e:
+                connection.close()
+                with lock:
+                    failures.append(e)
+        connection.close()
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return percentiles(latencies), len(latencies) / elapsed, len(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de latencia del predictor y del servicio HTTP.")
+    parser.add_argument('--feature-set', choices=list(FEATURE_SETS), default='enriched')
+    parser.add_argument('--requests', type=int, default=2000, help="Peticiones por escenario HTTP.")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    try:
+        start = time.perf_counter()
+        predictor = PricePredictor(args.feature_set)
+        load_seconds = time.perf_counter() - start
+    except FileNotFoundError as e:
+        print(f"Error: {e} Entrena antes el modelo con src/modeling/train_model.py.")
+        return
+    records = sample_records(predictor)
+    bodies = [json.dumps(record, ensure_ascii=False).encode('utf-8') for record in records]
+    print(f"Modelo '{args.feature_set}' versión {predictor.metadata['version']} cargado en {load_seconds:.2f} s; "
+          f"{len(records)} autos de ejemplo.\n")
+
+    (p50, p99), per_second = bench_in_process(predictor, records, min(args.requests, 500))
+    print(f"{'escenario':<28} {'clientes':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'req/s':>8} {'autos/lote':>11} {'fallidas':>9}")
+    print(f"{'en proceso (predict_one)':<28} {1:>8} {p50:>9.2f} {p99:>9.2f} {per_second:>8.0f} {1:>11.1f} {0:>9}")
+
+    for name, max_batch in (('HTTP sin micro-batching', 1), ('HTTP con micro-batching', args.max_batch)):
+        for concurrency in args.concurrency:
+            server, base_url, batcher = serve(predictor, port=0, max_batch=max_batch, max_wait=args.max_wait_ms / 1000)
+            try:
+                (p50, p99), per_second, failed = bench_http(base_url, bodies, args.requests, concurrency)
+                per_batch = (args.requests - failed) / max(batcher.batches, 1)
+            finally:
+                server.shutdown()
+                server.server_close()
+                batcher.close()
+            print(f"{name:<28} {concurrency:>8} {p50:>9.2f} {p99:>9.2f} {per_second:>8.0f} {per_batch:>11.1f} {failed:>9}")
+
+
+if __name__ == '__main__':
+    main()
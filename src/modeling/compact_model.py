@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+
+"""
+Exportación compacta de un modelo de precio (RandomForest) para cargarlo y predecir rápido.
+
+El `model.joblib` de `train_model.py` es un pickle de 100 árboles sin podar: ocupa mucho,
+tarda en cargarse (hay que reconstruir cada objeto `Tree`) y cada predicción recorre los
+árboles uno por uno. `export` genera, junto a la versión, una carpeta `compact/` con:
+
+1. Un bosque con límites de profundidad / tamaño de hoja elegidos por validación: se
+   prueban los límites de `PRUNING_GRID` sobre una validación interna del entrenamiento y
+   se elige el bosque con menos nodos cuyo MAE no empeora más de `--tolerance` respecto
+   del bosque sin límites. Se reentrena con todo el entrenamiento del split original.
+2. Los árboles aplanados en arreglos NumPy (`.npy` sin comprimir): feature (int16),
+   umbral (float32), hijos (int32) y valor de las hojas (float32). Se cargan con
+   memory-mapping (`np.load(mmap_mode='r')`): cargar no copia ni decodifica nada, y las
+   páginas se leen del disco a medida que se usan. Los umbrales se redondean hacia abajo
+   a float32, así que las decisiones son idénticas a las de scikit-learn (que compara
+   en float32).
+3. El preprocesador (`ColumnTransformer`) reducido a sus parámetros (medias, escalas y
+   categorías) en `compact.json`: el artefacto no tiene pickles y predecir no pasa por
+   scikit-learn.
+
+`CompactForest.predict` recorre todos los árboles a la vez con operaciones vectorizadas
+(una por nivel de profundidad). `load_compact` devuelve un objeto con `predict(X)` que
+reemplaza al pipeline en `PricePredictor(compact=True)`.
+
+Al exportar se imprime (y se guarda en `compact/report.json`) la comparación de tamaño,
+tiempo de carga y latencia de predicción contra el pickle joblib original.
+
+Uso:
+    python src/modeling/compact_model.py [--feature-set basic|enriched] [--version V] [--tolerance 0.01]
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import train_test_split
+
+from train_model import (FEATURE_SETS, MODELS_DIR, RANDOM_STATE, REGRESSOR_PARAMS, TEST_SIZE, _write_json,
+                         build_pipeline, load_model, load_training_data)
+
+COMPACT_DIR = 'compact'
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+
+# Límites candidatos (min_samples_leaf, max_depth); (1, None) es el bosque sin límites
+PRUNING_GRID = [(leaf, depth) for leaf in (1, 2, 3, 5, 10) for depth in (None, 16, 12, 10, 8)]
+
+
+class CompactForest:
+    """
+    Bosque de regresión aplanado: los nodos de todos los árboles en arreglos contiguos.
+    Las hojas apuntan a sí mismas (umbral +inf), así que recorrer `depth` niveles deja
+    cada muestra en su hoja sin revisar en qué nodos ya se llegó a una.
+    """
+
+    def __init__(self, arrays: dict, depth: int):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.depth = depth
+
+    @classmethod
+    def from_sklearn(cls, forest) -> 'CompactForest':
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left == -1
+            threshold = tree.threshold.astype(np.float32)
+            # Redondear hacia abajo: para todo x float32, x <= t  <=>  x <= t32
+            too_high = threshold.astype(np.float64) > tree.threshold
+            threshold[too_high] = np.nextafter(threshold[too_high], np.float32(-np.inf))
+            threshold[leaf] = np.inf
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(threshold)
+            lefts.append(np.where(leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(leaf, nodes, tree.children_right) + offset)
+            values.append(tree.value[:, 0, 0])
+            roots.append(offset)
+            offset += tree.node_count
+        arrays = {
+            'feature': np.concatenate(features).astype(np.int16),
+            'threshold': np.concatenate(thresholds),
+            'left': np.concatenate(lefts).astype(np.int32),
+            'right': np.concatenate(rights).astype(np.int32),
+            'value': np.concatenate(values).astype(np.float32),
+            'roots': np.array(roots, dtype=np.int32),
+        }
+        return cls(arrays, depth=max(estimator.tree_.max_depth for estimator in forest.estimators_))
+
+    @property
+    def node_count(self) -> int:
+        return len(self.feature)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Promedio de las hojas de todos los árboles para cada fila de X (denso)."""
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes].astype(np.float64).mean(axis=1)
+
+    def save(self, directory: Path):
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in ARRAYS:
+            np.save(directory / f'{name}.npy', getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: Path, depth: int, mmap: bool = True) -> 'CompactForest':
+        return cls({name: np.load(directory / f'{name}.npy', mmap_mode='r' if mmap else None)
+                    for name in ARRAYS}, depth)
+
+
+class CompactPreprocessor:
+    """
+    El `ColumnTransformer` de `train_model.build_preprocessor` (StandardScaler + OneHotEncoder
+    con handle_unknown='ignore') reducido a sus parámetros ajustados, en JSON: medias y
+    escalas de las numéricas y categorías de cada columna categórica. Produce la misma
+    matriz densa que el original, sin pasar por scikit-learn.
+    """
+
+    def __init__(self, numeric: list, mean: list, scale: list, categorical: list, categories: list):
+        self.numeric = numeric
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.categorical = categorical
+        self.categories = [list(values) for values in categories]
+
+    @classmethod
+    def from_sklearn(cls, column_transformer) -> 'CompactPreprocessor':
+        scaler = column_transformer.named_transformers_['num']
+        encoder = column_transformer.named_transformers_['cat']
+        numeric = list(column_transformer.transformers_[0][2])
+        categorical = list(column_transformer.transformers_[1][2])
+        return cls(numeric, scaler.mean_.tolist(), scaler.scale_.tolist(), categorical,
+                   [[value.item() if isinstance(value, np.generic) else value for value in values]
+                    for values in encoder.categories_])
+
+    def transform(self, X) -> np.ndarray:
+        n_categories = [len(values) for values in self.categories]
+        out = np.zeros((len(X), len(self.numeric) + sum(n_categories)), dtype=np.float64)
+        if self.numeric:
+            out[:, :len(self.numeric)] = (X[self.numeric].to_numpy(dtype=np.float64) - self.mean) / self.scale
+        start = len(self.numeric)
+        rows = np.arange(len(X))
+        for column, values, size in zip(self.categorical, self.categories, n_categories):
+            # Código de cada valor en las categorías del entrenamiento (-1 = desconocido -> fila de ceros)
+            codes = pd.Categorical(np.asarray(X[column], dtype=object), categories=values).codes
+            known = codes >= 0
+            out[rows[known], start + codes[known]] = 1.0
+            start += size
+        return out
+
+    def to_dict(self) -> dict:
+        return {'numeric': self.numeric, 'mean': self.mean.tolist(), 'scale': self.scale.tolist(),
+                'categorical': self.categorical, 'categories': self.categories}
+
+
+class CompactPipeline:
+    """`CompactPreprocessor` + `CompactForest`, con la misma interfaz `predict` que el pipeline."""
+
+    def __init__(self, preprocessor: CompactPreprocessor, forest: CompactForest):
+        self.preprocessor = preprocessor
+        self.forest = forest
+
+    def predict(self, X) -> np.ndarray:
+        return self.forest.predict(self.preprocessor.transform(X))
+
+    def set_params(self, **params):
+        return self  # compatibilidad con Pipeline.set_params (ej. regressor__n_jobs)
+
+
+def save_compact(pipeline, directory: Path, info: dict, X_test=None, y_test=None) -> CompactPipeline:
+    """
+    Guarda un pipeline (preprocesador + RandomForest) ajustado en formato compacto. Con
+    `X_test`/`y_test`, guarda también las métricas del modelo compacto (mismo formato que
+    las de `train_model.py`): es otro bosque que el original y sus métricas son otras.
+    """
+    compact = CompactPipeline(CompactPreprocessor.from_sklearn(pipeline[0]), CompactForest.from_sklearn(pipeline[-1]))
+    compact.forest.save(directory)
+    if X_test is not None:
+        y_pred = compact.predict(X_test)
+        info = {**info, 'metrics': {'mae': float(mean_absolute_error(y_test, y_pred)),
+                                    'r2': float(r2_score(y_test, y_pred))}}
+    _write_json({**info, 'depth': compact.forest.depth, 'nodes': compact.forest.node_count,
+                 'preprocessor': compact.preprocessor.to_dict()}, directory / 'compact.json')
+    return compact
+
+
+def compact_info(version_dir: Path) -> dict:
+    """Contenido de `compact.json` de una versión (límites, `source_version`, métricas, preprocesador)."""
+    path = Path(version_dir) / COMPACT_DIR / 'compact.json'
+    if not path.is_file():
+        raise FileNotFoundError(f"El modelo no está exportado en formato compacto: {path.parent}. "
+                                f"Expórtalo con src/modeling/compact_model.py.")
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_compact(version_dir: Path, mmap: bool = True) -> CompactPipeline:
+    directory = Path(version_dir) / COMPACT_DIR
+    info = compact_info(version_dir)
+    return CompactPipeline(CompactPreprocessor(**info['preprocessor']),
+                           CompactForest.load(directory, info['depth'], mmap=mmap))
+
+
+def choose_limits(feature_set: str, features: list, X_train, y_train, tolerance: float) -> tuple:
+    """
+    Elige (min_samples_leaf, max_depth) del bosque más pequeño cuyo MAE en una validación
+    interna del entrenamiento no supera en más de `tolerance` al del bosque sin límites.
+    Devuelve (límites elegidos, [resultados de cada candidato]).
+    """
+    X_fit, X_valid, y_fit, y_valid = train_test_split(X_train, y_train, test_size=0.25, random_state=RANDOM_STATE)
+    results = []
+    for leaf, depth in PRUNING_GRID:
+        regressor = RandomForestRegressor(**REGRESSOR_PARAMS, min_samples_leaf=leaf, max_depth=depth, n_jobs=-1)
+        model = build_pipeline(feature_set, features, regressor).fit(X_fit, y_fit)
+        nodes = sum(estimator.tree_.node_count for estimator in model[-1].estimators_)
+        results.append({'min_samples_leaf': leaf, 'max_depth': depth, 'nodes': nodes,
+                        'mae': float(mean_absolute_error(y_valid, model.predict(X_valid)))})
+    baseline = next(result for result in results if result['min_samples_leaf'] == 1 and result['max_depth'] is None)
+    eligible = [result for result in results if result['mae'] <= baseline['mae'] * (1 + tolerance)]
+    best = min(eligible, key=lambda result: result['nodes'])
+    return (best['min_samples_leaf'], best['max_depth']), results
+
+
+def _directory_size(path: Path) -> int:
+    return sum(file.stat().st_size for file in Path(path).rglob('*') if file.is_file())
+
+
+def _latency_ms(predict, X, repeats: int) -> float:
+    """Mediana (ms) de `repeats` llamadas a predict(X)."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+
+def export(feature_set: str, version: str = None, tolerance: float = 0.01, models_dir: Path = MODELS_DIR) -> dict:
+    """Exporta la versión (por defecto, la última) en formato compacto y devuelve el reporte comparativo."""
+    model, metadata = load_model(feature_set, version, models_dir)
+    version_dir = Path(models_dir) / feature_set / metadata['version']
+    directory = version_dir / COMPACT_DIR
+    if not isinstance(model[-1], RandomForestRegressor):
+        raise ValueError(f"Sólo se exportan bosques RandomForest (el modelo es {type(model[-1]).__name__}).")
+
+    X, y, features = load_training_data(feature_set)
+    if features != metadata['features']:
+        raise ValueError("Las features del dataset no coinciden con las del modelo; reentrena con train_model.py.")
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+
+    print(f"[{feature_set}] Eligiendo límites de profundidad y hoja por validación (tolerancia {tolerance:.0%})...")
+    (leaf, depth), candidates = choose_limits(feature_set, features, X_train, y_train, tolerance)
+    pruned = build_pipeline(feature_set, features, RandomForestRegressor(
+        **REGRESSOR_PARAMS, min_samples_leaf=leaf, max_depth=depth, n_jobs=-1)).fit(X_train, y_train)
+    pruned[-1].set_params(n_jobs=1)
+    limits = {'min_samples_leaf': leaf, 'max_depth': depth, 'tolerance': tolerance,
+                    'source_version': metadata['version']}
+    compact = save_compact(pruned, directory, limits, X_test, y_test)
+    forest = compact.forest
+    pruned_pickle = directory / 'pruned_model.joblib'  # sólo para el reporte (pickle del bosque podado)
+    joblib.dump(pruned, pruned_pickle)
+
+    # --- Reporte: tamaño, carga y latencia contra el pickle original ---
+    model.set_params(regressor__n_jobs=1)
+    one, batch = X_test.iloc[:1], X_test.sample(1000, replace=True, random_state=RANDOM_STATE)
+    original_path = version_dir / 'model.joblib'
+
+    def timed_load(load):
+        start = time.perf_counter()
+        loaded = load()
+        return loaded, (time.perf_counter() - start) * 1000
+
+    rows = []
+    for name, load, size in (
+            ('joblib original', lambda: joblib.load(original_path), original_path.stat().st_size),
+            ('joblib podado', lambda: joblib.load(pruned_pickle), pruned_pickle.stat().st_size),
+            ('compacto (mmap)', lambda: load_compact(version_dir), _directory_size(directory) - pruned_pickle.stat().st_size)):
+        loaded, load_ms = timed_load(load)
+        loaded.set_params(regressor__n_jobs=1)
+        y_pred = loaded.predict(X_test)
+        rows.append({'artefacto': name, 'bytes': size, 'carga_ms': load_ms,
+                     'latencia_1_ms': _latency_ms(loaded.predict, one, 50),
+                     'latencia_1000_ms': _latency_ms(loaded.predict, batch, 5),
+                     'mae_test': float(mean_absolute_error(y_test, y_pred)), 'r2_test': float(r2_score(y_test, y_pred))})
+    pruned_pickle.unlink()
+
+    # Las decisiones del bosque compacto son las del podado: sólo difiere el redondeo de las hojas a float32
+    max_difference = float(np.abs(compact.predict(X_test) - pruned.predict(X_test)).max())
+    report = {**limits, 'depth': forest.depth, 'nodes': forest.node_count, 'candidates': candidates,
+              'artifacts': rows, 'max_abs_difference_vs_pruned': max_difference}
+    _write_json(report, directory / 'report.json')
+
+    print(f"  Límites elegidos: min_samples_leaf={leaf}, max_depth={depth} ({forest.node_count:,} nodos, "
+          f"profundidad {forest.depth}).")
+    print(f"\n  {'artefacto':<18} {'tamaño (KB)':>12} {'carga (ms)':>11} {'1 auto (ms)':>12} "
+          f"{'1000 autos (ms)':>16} {'MAE test':>12}")
+    for row in rows:
+        print(f"  {row['artefacto']:<18} {row['bytes'] / 1024:>12,.0f} {row['carga_ms']:>11.1f} "
+              f"{row['latencia_1_ms']:>12.2f} {row['latencia_1000_ms']:>16.1f} {row['mae_test']:>12,.0f}")
+    print(f"\n  Diferencia máxima compacto vs podado: ${max_difference:,.2f}")
+    print(f"  Artefacto compacto guardado en: {directory}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta un modelo de precio en formato compacto (mmap).")
+    parser.add_argument('--feature-set', choices=list(FEATURE_SETS), default='enriched')
+    parser.add_argument('--version', default=None, help="Versión a exportar (por defecto, la última entrenada).")
+    parser.add_argument('--tolerance', type=float, default=0.01,
+                        help="Empeoramiento relativo máximo del MAE de validación al limitar los árboles.")
+    args = parser.parse_args()
+    try:
+        export(args.feature_set, args.version, args.tolerance)
+    except FileNotFoundError as e:
+        print(f"Error: {e} Entrena antes el modelo con src/modeling/train_model.py.")
+
+
+if __name__ == '__main__':
+    main()
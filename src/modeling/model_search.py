@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+"""
+Búsqueda de modelo e hiperparámetros con validación cruzada y successive halving, en paralelo.
+
+Explora configuraciones de `RandomForestRegressor` y `HistGradientBoostingRegressor`
+(`SEARCH_SPACE`) sobre el mismo preprocesamiento de `train_model.py`, usando sólo la parte
+de entrenamiento del split 80/20 (el test queda fuera de la búsqueda):
+
+1. Ronda 0: todas las configuraciones se evalúan con K-fold sobre una submuestra pequeña
+   (por defecto, con al menos `MIN_RUNGS` rondas aunque haya pocas filas; ver `rung_resources`).
+2. Sólo el mejor 1/`factor` (por MAE medio) pasa a la ronda siguiente, que usa `factor`
+   veces más filas. La última ronda usa todas las filas de entrenamiento.
+3. La mejor configuración de la última ronda se reentrena con todo el entrenamiento y se
+   evalúa en el test.
+
+Cada evaluación (configuración x fold) es una tarea de un pool de procesos (por defecto,
+uno por núcleo; cada proceso usa un solo hilo para no competir por la CPU) y su resultado
+se guarda apenas termina en `models/search/search_results.sqlite` (ver `search_store.py`).
+Si la búsqueda se interrumpe, al volver a ejecutarla con los mismos datos y ajustes se
+retoma: sólo se evalúa lo que falta.
+
+Uso:
+    python src/modeling/model_search.py [--feature-set basic|enriched] [--workers N]
+                                        [--folds 5] [--factor 3] [--min-resources N]
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import KFold, train_test_split
+from threadpoolctl import threadpool_limits
+
+from search_store import STORE_PATH, SearchStore
+from train_model import FEATURE_SETS, RANDOM_STATE, TEST_SIZE, build_pipeline, data_hash, load_training_data
+
+# Valores a combinar por modelo (producto cartesiano)
+SEARCH_SPACE = {
+    'random_forest': {
+        'n_estimators': [100, 300],
+        'max_depth': [None, 12],
+        'min_samples_leaf': [1, 3],
+        'max_features': [1.0, 'sqrt'],
+    },
+    'hist_gradient_boosting': {
+        'learning_rate': [0.05, 0.1],
+        'max_iter': [200, 500],
+        'max_leaf_nodes': [15, 31],
+        'min_samples_leaf': [5, 20],
+    },
+}
+
+REGRESSORS = {
+    'random_forest': RandomForestRegressor,
+    'hist_gradient_boosting': HistGradientBoostingRegressor,
+}
+
+# Parámetros fijos: cada proceso entrena con un solo hilo; el boosting además se detiene
+# solo cuando deja de mejorar en su fracción de validación interna.
+FIXED_PARAMS = {
+    'random_forest': {'random_state': RANDOM_STATE, 'n_jobs': 1},
+    'hist_gradient_boosting': {'random_state': RANDOM_STATE, 'early_stopping': True,
+                               'validation_fraction': 0.1, 'n_iter_no_change': 10},
+}
+
+# Regresores que no aceptan la salida dispersa del OneHotEncoder
+DENSE_MODELS = {'hist_gradient_boosting'}
+
+# Filas de la primera ronda si hay datos de sobra, y rondas mínimas cuando hay pocas filas
+# (con una sola ronda todas las configuraciones hacen la validación cruzada completa)
+MIN_RESOURCES = 40
+MIN_RUNGS = 3
+
+
+def candidates() -> list:
+    """Todas las configuraciones del espacio de búsqueda: [{candidate_id, model, params}, ...]."""
+    result = []
+    for model, grid in SEARCH_SPACE.items():
+        for values in itertools.product(*grid.values()):
+            params = dict(zip(grid, values))
+            payload = json.dumps([model, params], sort_keys=True)
+            result.append({'candidate_id': hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12],
+                           'model': model, 'params': params})
+    return result
+
+
+def make_pipeline(feature_set: str, features: list, candidate: dict):
+    regressor = REGRESSORS[candidate['model']](**candidate['params'], **FIXED_PARAMS[candidate['model']])
+    return build_pipeline(feature_set, features, regressor, dense=candidate['model'] in DENSE_MODELS)
+
+
+def default_min_resources(n_rows: int, factor: int, n_folds: int) -> int:
+    """
+    `MIN_RESOURCES`, o menos si así no alcanzan `MIN_RUNGS` rondas, sin bajar de 2 filas por
+    fold (ej. 104 filas, factor 3, 5 folds -> 11, rondas [12, 35, 104]).
+    """
+    return max(2 * n_folds, min(MIN_RESOURCES, n_rows // factor ** (MIN_RUNGS - 1)))
+
+
+def rung_resources(n_rows: int, factor: int, min_resources: int) -> list:
+    """Filas por ronda, de menor a mayor, terminando en `n_rows` (ej. 1000, 3, 100 -> [111, 333, 1000])."""
+    n_rungs = 1 + max(0, int(math.log(n_rows / min_resources, factor))) if n_rows > min_resources else 1
+    return [round(n_rows / factor ** (n_rungs - 1 - rung)) for rung in range(n_rungs)]
+
+
+# --- Procesos del pool: los datos se envían una vez por proceso, no una vez por tarea ---
+_WORKER = {}
+
+
+def _init_worker(feature_set: str, features: list, X, y, n_folds: int):
+    threadpool_limits(1)
+    _WORKER.update(feature_set=feature_set, features=features, X=X, y=y, n_folds=n_folds)
+
+
+def _evaluate(candidate: dict, rung: int, fold: int, resource: int) -> dict:
+    """Entrena una configuración en K-1 folds de las primeras `resource` filas y la evalúa en el restante."""
+    X, y = _WORKER['X'].iloc[:resource], _WORKER['y'].iloc[:resource]
+    folds = KFold(n_splits=_WORKER['n_folds'], shuffle=True, random_state=RANDOM_STATE)
+    train_idx, valid_idx = list(folds.split(X))[fold]
+    model = make_pipeline(_WORKER['feature_set'], _WORKER['features'], candidate)
+    start = time.perf_counter()
+    model.fit(X.iloc[train_idx], y.iloc[train_idx])
+    y_pred = model.predict(X.iloc[valid_idx])
+    return {**candidate, 'rung': rung, 'fold': fold, 'resource': resource,
+            'mae': float(mean_absolute_error(y.iloc[valid_idx], y_pred)),
+            'r2': float(r2_score(y.iloc[valid_idx], y_pred)),
+            'seconds': time.perf_counter() - start}
+
+
+def search(feature_set: str, workers: int = None, n_folds: int = 5, factor: int = 3,
+           min_resources: int = None, store_path=STORE_PATH) -> dict:
+    """
+    Ejecuta (o retoma) la búsqueda para `feature_set` y devuelve la mejor configuración,
+    con sus métricas en el test: {candidate_id, model, params, cv_mae, test_mae, test_r2}.
+    Sin `min_resources`, las filas de la primera ronda salen de `default_min_resources`.
+    """
+    workers = workers or os.cpu_count()
+    X, y, features = load_training_data(feature_set)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+    # Orden aleatorio fijo: la submuestra de cada ronda son las primeras filas (y contiene a la anterior)
+    order = np.random.default_rng(RANDOM_STATE).permutation(len(X_train))
+    X_train, y_train = X_train.iloc[order].reset_index(drop=True), y_train.iloc[order].reset_index(drop=True)
+
+    if min_resources is None:
+        min_resources = default_min_resources(len(X_train), factor, n_folds)
+    resources = rung_resources(len(X_train), factor, max(min_resources, 2 * n_folds))
+    survivors = candidates()
+    settings = {'data_hash': data_hash(X_train, y_train), 'candidates': [c['candidate_id'] for c in survivors],
+                'fixed_params': FIXED_PARAMS, 'n_folds': n_folds, 'factor': factor, 'resources': resources}
+    search_id = hashlib.sha256(json.dumps([feature_set, settings], sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+    with SearchStore(store_path) as store:
+        resumed = store.start_search(search_id, feature_set, settings)
+        print(f"[{feature_set}] Búsqueda {search_id} ({'se retoma' if resumed else 'nueva'}): "
+              f"{len(survivors)} configuraciones, rondas de {resources} filas, {n_folds} folds, {workers} procesos.")
+        if len(resources) == 1:
+            print(f"  Aviso: una sola ronda, no se descarta ninguna configuración (todas hacen los {n_folds} folds "
+                  f"con las {resources[0]} filas). Baja --min-resources o --factor para usar successive halving.")
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(feature_set, features, X_train, y_train, n_folds)) as pool:
+            for rung, resource in enumerate(resources):
+                done = store.done_trials(search_id, rung)
+                tasks = [(candidate, rung, fold, resource) for candidate in survivors for fold in range(n_folds)
+                         if (candidate['candidate_id'], fold) not in done]
+                start = time.perf_counter()
+                futures = [pool.submit(_evaluate, *task) for task in tasks]
+                try:
+                    for future in as_completed(futures):
+                        store.record_trial(search_id, future.result())
+                except KeyboardInterrupt:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    print("\nBúsqueda interrumpida: los resultados guardados se reutilizan al volver a ejecutarla.")
+                    raise
+
+                scores = store.rung_scores(search_id, rung, n_folds)
+                survivors = sorted(survivors, key=lambda candidate: scores[candidate['candidate_id']])
+                best = survivors[0]
+                print(f"  Ronda {rung}: {len(survivors)} configuraciones x {resource} filas "
+                      f"({len(tasks)} evaluaciones nuevas, {time.perf_counter() - start:.1f} s). "
+                      f"Mejor: {best['model']} MAE ${scores[best['candidate_id']]:,.0f}")
+                if rung < len(resources) - 1:
+                    survivors = survivors[:max(1, math.ceil(len(survivors) / factor))]
+
+        store.set_status(search_id, 'done')
+        cv_mae = scores[best['candidate_id']]
+
+    # La mejor configuración, con todo el entrenamiento, evaluada en el test que no vio la búsqueda
+    model = make_pipeline(feature_set, features, best)
+    with threadpool_limits(workers):
+        if best['model'] == 'random_forest':
+            model.set_params(regressor__n_jobs=workers)
+        model.fit(X_train, y_train)
+    y_pred = model.predict(X_test)
+    result = {**best, 'search_id': search_id, 'cv_mae': cv_mae,
+              'test_mae': float(mean_absolute_error(y_test, y_pred)), 'test_r2': float(r2_score(y_test, y_pred))}
+    print(f"[{feature_set}] Mejor configuración: {best['model']} {json.dumps(best['params'])}")
+    print(f"  MAE validación cruzada: ${cv_mae:,.0f} | test: MAE ${result['test_mae']:,.0f}, R² {result['test_r2']:.4f}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca el mejor modelo de precio con successive halving en paralelo.")
+    parser.add_argument('--feature-set', choices=list(FEATURE_SETS), default='enriched')
+    parser.add_argument('--workers', type=int, default=None, help="Procesos del pool (por defecto, todos los núcleos).")
+    parser.add_argument('--folds', type=int, default=5, help="Folds de la validación cruzada.")
+    parser.add_argument('--factor', type=int, default=3, help="En cada ronda pasa 1/factor de las configuraciones.")
+    parser.add_argument('--min-resources', type=int, default=None,
+                        help=f"Filas mínimas de la primera ronda (por defecto {MIN_RESOURCES}, o menos para tener "
+                             f"al menos {MIN_RUNGS} rondas).")
+    parser.add_argument('--top', type=int, default=10, help="Configuraciones a mostrar en el ranking final.")
+    args = parser.parse_args()
+
+    try:
+        result = search(args.feature_set, workers=args.workers, n_folds=args.folds, factor=args.factor,
+                        min_resources=args.min_resources)
+    except FileNotFoundError as e:
+        print(f"Error: {e} Ejecuta antes src/processing/clean_pipeline.py.")
+        return
+    except KeyboardInterrupt:
+        return
+
+    with SearchStore() as store:
+        print("\nRanking (ronda más alta alcanzada, MAE medio):")
+        for row in store.leaderboard(result['search_id'], limit=args.top):
+            print(f"  ronda {row['rung']} ({row['resource']} filas) MAE ${row['mae']:>12,.0f} | "
+                  f"R² {row['r2']:>7.4f} | {row['model']} {json.dumps(row['params'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+"""
+Predicción de la oferta ganadora de subastas nuevas con un modelo entrenado por `train_model.py`.
+
+`PricePredictor` carga una sola vez el pipeline, su metadata y las medianas de imputación
+guardadas con el modelo, y predice a partir de registros tal como los producen las etapas
+anteriores:
+- un auto recién scrapeado (columnas de `data/raw`, ej. 'kilometraje': '85.000 km'), o
+- un registro enriquecido (columnas de `data/processed`, con los campos de la IA aplanados
+  como 'condicion_fisica_y_riesgos_funciona'); el JSON anidado de la IA también se acepta
+  tal cual y se aplana igual que en `process_batch_output.py`.
+
+Cada registro pasa por la misma limpieza y las mismas características derivadas que el
+dataset de entrenamiento (`clean_pipeline.clean`), pero con las medianas del modelo: la
+predicción no depende de qué otros autos vengan en la misma petición. `predict` procesa
+muchos registros de una vez (una sola limpieza y una sola llamada al modelo), que es lo que
+aprovecha el micro-batching de `price_service.py`; `predict_frame` hace lo mismo con un
+DataFrame completo (ver `score_listings.py`). Con `compact=True` se usa el modelo exportado
+por `compact_model.py` en lugar del pickle: es un bosque reentrenado con límites de
+profundidad y hoja, así que la metadata del predictor pasa a ser la suya (versión
+'<versión>-compact', `source_version`, límites y métricas propias de `compact.json`).
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from compact_model import COMPACT_DIR, compact_info, load_compact
+from train_model import MODELS_DIR, load_model
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'processing'))
+from clean_pipeline import PARSERS, SCHEMA, clean, finish, required_columns  # noqa: E402
+from imputer import Imputer  # noqa: E402
+from process_batch_output import flatten_json  # noqa: E402
+
+
+def compact_metadata(metadata: dict, info: dict) -> dict:
+    """
+    Metadata del modelo compacto a partir de la del original y de su `compact.json`: versión
+    propia ('<versión>-compact'), la versión de origen, los límites del bosque y sus métricas
+    (None si se exportó antes de que `compact_model.py` las guardara).
+    """
+    return {**metadata,
+            'version': f"{metadata['version']}-{COMPACT_DIR}",
+            'source_version': info.get('source_version', metadata['version']),
+            'metrics': info.get('metrics'),
+            'compact': {key: info.get(key) for key in ('min_samples_leaf', 'max_depth', 'tolerance', 'depth', 'nodes')}}
+
+
+class PricePredictor:
+    """Modelo de precio cargado en memoria; ver el docstring del módulo."""
+
+    def __init__(self, feature_set: str = 'enriched', version: str = None, models_dir: Path = MODELS_DIR,
+                 compact: bool = False):
+        self.model, self.metadata = load_model(feature_set, version, models_dir)
+        version_dir = Path(models_dir) / feature_set / self.metadata['version']
+        if compact:
+            # Bosque exportado por `compact_model.py` (mmap): carga y predicción más rápidas
+            self.model = load_compact(version_dir)
+            self.metadata = compact_metadata(self.metadata, compact_info(version_dir))
+        # Cada llamada predice pocas filas: repartir los árboles entre hilos cuesta más de lo que ahorra
+        self.model.set_params(regressor__n_jobs=1)
+        self.features = self.metadata['features']
+        imputer_path = version_dir / 'imputer.json'
+        if not imputer_path.is_file():
+            raise FileNotFoundError(f"El modelo no tiene medianas de imputación guardadas: {imputer_path}")
+        self.imputer = Imputer.load(imputer_path)
+        # Columnas de entrada que necesita la limpieza para calcular las features (y ya interpretadas)
+        self.parsed_columns = required_columns(self.features)[0]
+        self.sources = [SCHEMA[name].get('source', name) for name in self.parsed_columns]
+
+    def prepare(self, records: list) -> tuple:
+        """
+        Limpia `records` (lista de dicts) y calcula las features del modelo; ver `prepare_frame`.
+        """
+        rows = []
+        for record in records:
+            if any(isinstance(value, dict) for value in record.values()):
+                record = flatten_json(record)
+            if isinstance(record.get('historial_ofertas'), list):
+                record = {**record, 'historial_ofertas': json.dumps(record['historial_ofertas'], ensure_ascii=False)}
+            rows.append(record)
+        # Como objetos de Python (igual que al leer un CSV): una columna ausente o toda nula no queda como float
+        return self.prepare_frame(pd.DataFrame(rows).reindex(columns=self.sources).astype(object))
+
+    def prepare_frame(self, raw_df: pd.DataFrame, parsed: bool = False) -> tuple:
+        """
+        Limpia un DataFrame de entrada (columnas de `data/raw` o `data/processed`) y calcula
+        las features del modelo. Devuelve (X, errores), donde `errores` es {posición: mensaje}
+        de las filas que no se pueden predecir (sin año o sin una feature numérica que no se
+        imputa) y X tiene una fila por cada fila válida, en orden. Con `parsed=True`, `raw_df`
+        trae las columnas ya interpretadas (un snapshot de `feature_store.py`).
+        """
+        columns = self.parsed_columns if parsed else self.sources
+        absent = [name for name in columns if name not in raw_df.columns]
+        raw_df = raw_df.reindex(columns=columns).reset_index(drop=True)
+        if absent:
+            # Columnas ausentes como objetos nulos (no float), para que los parsers de texto las acepten
+            raw_df[absent] = raw_df[absent].astype(object)
+        # Sin año no hay antigüedad (y en entrenamiento esas filas se descartan)
+        valid = PARSERS['number'](raw_df['año']).notna().to_numpy()
+        errors = {position: "Falta el año del vehículo o no es numérico."
+                  for position in np.flatnonzero(~valid).tolist()}
+        if not valid.any():
+            return pd.DataFrame(columns=self.features), errors
+        clean_function = finish if parsed else clean
+        X, _ = clean_function(raw_df[valid].reset_index(drop=True), self.features, imputer=self.imputer,
+                              required=['año'])
+        X = X.reindex(columns=self.features)
+
+        # Features numéricas sin regla de imputación (ej. valor_inicial): el modelo no acepta nulos
+        missing = X[self.metadata['numeric']].isna()
+        incomplete = missing.any(axis=1).to_numpy()
+        for row, position in zip(np.flatnonzero(incomplete), np.flatnonzero(valid)[incomplete]):
+            columns = ', '.join(missing.columns[missing.iloc[row].to_numpy()])
+            errors[int(position)] = f"Faltan datos del vehículo: {columns}."
+        return X[~incomplete].reset_index(drop=True), errors
+
+    def predict_frame(self, raw_df: pd.DataFrame, parsed: bool = False) -> tuple:
+        """
+        Predice todas las filas de `raw_df` con una sola limpieza y una sola llamada al modelo.
+        Devuelve (array con la predicción de cada fila, NaN donde hay error; {posición: mensaje}).
+        """
+        X, errors = self.prepare_frame(raw_df, parsed=parsed)
+        predictions = np.full(len(raw_df), np.nan)
+        if len(X):
+            ok = np.ones(len(raw_df), dtype=bool)
+            ok[list(errors)] = False
+            predictions[ok] = self.model.predict(X)
+        return predictions, errors
+
+    def predict(self, records: list) -> list:
+        """Predice cada registro: [{'oferta_ganadora': valor} o {'error': mensaje}, ...] en el mismo orden."""
+        X, errors = self.prepare(records)
+        predictions = iter(self.model.predict(X).tolist() if len(X) else [])
+        return [{'error': errors[position]} if position in errors else {'oferta_ganadora': next(predictions)}
+                for position in range(len(records))]
+
+    def predict_one(self, record: dict) -> float:
+        """Oferta ganadora esperada de un solo auto (ValueError si el registro no se puede predecir)."""
+        result = self.predict([record])[0]
+        if 'error' in result:
+            raise ValueError(result['error'])
+        return result['oferta_ganadora']
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+"""
+Servicio HTTP local para cotizar la oferta ganadora de autos en subasta.
+
+Carga el modelo una sola vez al iniciar (`PricePredictor`) y atiende:
+- POST /predict: un registro (objeto JSON) o una lista de registros (raw o enriquecidos,
+  ver `predictor.py`). Responde {"predicciones": [{"oferta_ganadora": ...} | {"error": ...}]}.
+- GET /health:   versión, features y métricas del modelo cargado.
+
+Micro-batching: las peticiones que llegan al mismo tiempo (cada una en su hilo) se juntan
+en una cola y un solo hilo las predice de una vez, esperando como máximo `--max-wait-ms`
+para completar un lote de hasta `--max-batch` registros. Limpiar y predecir un lote de 50
+autos cuesta casi lo mismo que uno solo, así que el throughput crece con la concurrencia y
+una petición aislada sólo espera `--max-wait-ms` extra. Ver `benchmark_predictor.py`.
+
+Uso:
+    python src/modeling/price_service.py [--feature-set basic|enriched] [--port 8000]
+                                         [--max-batch 64] [--max-wait-ms 2] [--compact]
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from predictor import PricePredictor
+from train_model import FEATURE_SETS
+
+
+class MicroBatcher:
+    """Junta los registros de peticiones concurrentes y los predice en lotes con `predict_fn`."""
+
+    def __init__(self, predict_fn, max_batch: int = 64, max_wait: float = 0.002):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, records: list) -> Future:
+        """Encola los registros de una petición; el Future entrega sus predicciones en orden."""
+        future = Future()
+        self._queue.put((records, future))
+        return future
+
+    def predict(self, records: list) -> list:
+        return self.submit(records).result()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            pending = [item]
+            size = len(item[0])
+            deadline = time.perf_counter() + self.max_wait
+            # Completar el lote con lo que llegue antes del plazo (sin pasar de max_batch registros)
+            while size < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # terminar después de este lote
+                    break
+                pending.append(item)
+                size += len(item[0])
+            self._predict(pending)
+
+    def _predict(self, pending: list):
+        self.batches += 1
+        try:
+            results = self.predict_fn([record for records, _ in pending for record in records])
+        except Exception as e:
+            if len(pending) > 1:
+                # Que una petición inválida no haga fallar a las demás del lote
+                for request in pending:
+                    self._predict([request])
+                return
+            pending[0][1].set_exception(e)
+            return
+        start = 0
+        for records, future in pending:
+            future.set_result(results[start:start + len(records)])
+            start += len(records)
+
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Cola de conexiones pendientes (la de socketserver es 5): con muchos clientes a la vez
+    # el sistema rechazaría conexiones antes de que un hilo alcance a aceptarlas
+    request_queue_size = 128
+
+
+def serve(predictor: PricePredictor, host: str = '127.0.0.1', port: int = 8000,
+          max_batch: int = 64, max_wait: float = 0.002) -> tuple:
+    """
+    Levanta el servicio en un hilo de fondo y devuelve (servidor, base_url, batcher).
+    Con `max_batch=1` cada petición se predice sola (sin micro-batching).
+    """
+    batcher = MicroBatcher(predictor.predict, max_batch=max_batch, max_wait=max_wait)
+    # Con el modelo compacto, también la versión de origen y los límites del bosque
+    health = json.dumps({key: predictor.metadata[key] for key in
+                         ('version', 'feature_set', 'features', 'metrics', 'created_at', 'source_version', 'compact')
+                         if key in predictor.metadata}).encode('utf-8')
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive: los clientes reutilizan la conexión
+
+        def _send(self, status: int, body: bytes):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, status: int, message: str):
+            self._send(status, json.dumps({'error': message}, ensure_ascii=False).encode('utf-8'))
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send(200, health)
+            else:
+                self._error(404, "Ruta no encontrada.")
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._error(404, "Ruta no encontrada.")
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            except (ValueError, UnicodeDecodeError):
+                self._error(400, "El cuerpo no es JSON válido.")
+                return
+            records = [payload] if isinstance(payload, dict) else payload
+            if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+                self._error(400, "Se espera un objeto JSON o una lista de objetos.")
+                return
+            try:
+                predictions = batcher.predict(records)
+            except Exception as e:
+                self._error(500, f"Error al predecir: {e}")
+                return
+            self._send(200, json.dumps({'predicciones': predictions}, ensure_ascii=False).encode('utf-8'))
+
+        def log_message(self, format, *args):
+            pass
+
+    server = PredictionServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}", batcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio HTTP de predicción de la oferta ganadora.")
+    parser.add_argument('--feature-set', choices=list(FEATURE_SETS), default='enriched')
+    parser.add_argument('--version', default=None, help="Versión del modelo (por defecto, la última entrenada).")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch', type=int, default=64, help="Registros máximos por lote (1 = sin micro-batching).")
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help="Espera máxima para completar un lote.")
+    parser.add_argument('--compact', action='store_true', help="Usa el modelo exportado por compact_model.py.")
+    args = parser.parse_args()
+
+    try:
+        predictor = PricePredictor(args.feature_set, args.version, compact=args.compact)
+    except FileNotFoundError as e:
+        print(f"Error: {e} Entrena antes el modelo con src/modeling/train_model.py.")
+        return
+    server, base_url, batcher = serve(predictor, args.host, args.port, args.max_batch, args.max_wait_ms / 1000)
+    print(f"Modelo '{args.feature_set}' versión {predictor.metadata['version']} escuchando en {base_url}/predict")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print("\nDeteniendo el servicio...")
+    finally:
+        server.shutdown()
+        batcher.close()
+
+
+if __name__ == '__main__':
+    main()
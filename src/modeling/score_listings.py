@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+"""
+Puntuación masiva: predice la oferta ganadora de todos los autos guardados por el scraper
+(por ejemplo, las `NUM_PAGES_TO_SCRAPE` páginas del listado) para priorizar en qué
+subastas ofertar.
+
+Lee el dataset de entrada del modelo (`data/raw` para 'basic', `data/processed` para
+'enriched', u otro con --input) por partes de `--chunk-size` filas, sólo con las columnas
+que usa el modelo. Cada parte se limpia y se predice de una vez con el preprocesador y el
+modelo guardados (`PricePredictor.predict_frame`) y se escribe de inmediato en
+`data/predictions/predicciones_<feature_set>.parquet`, junto a `placa` y `detail_url`. Así
+la memoria depende del tamaño de la parte, no del número de autos.
+
+Como en la limpieza, de cada subasta (`detail_url`) se puntúa sólo la última captura;
+para saber cuál es, antes se lee únicamente la columna `detail_url`. Con --from-store se
+puntúa un snapshot del almacén de características (`feature_store.py`), con las columnas ya
+interpretadas; --as-of elige el snapshot (el mismo con el que se entrenó, por ejemplo).
+
+Uso:
+    python src/modeling/score_listings.py [--feature-set basic|enriched] [--input ruta]
+                                          [--output ruta] [--chunk-size 50000] [--csv] [--compact]
+                                          [--from-store [--as-of FECHA]]
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from predictor import PricePredictor
+from train_model import FEATURE_SETS
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'processing'))
+from clean_pipeline import DEDUP_KEY, VARIANTS  # noqa: E402
+from feature_store import FeatureStore  # noqa: E402
+from storage import CSV_ENCODING, PARQUET_COMPRESSION, csv_path, iter_table  # noqa: E402
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+PREDICTIONS_DIR = PROJECT_ROOT / 'data' / 'predictions'
+CHUNK_SIZE = 50_000
+
+PREDICTIONS_SCHEMA = pa.schema([
+    ('placa', pa.string()),
+    ('detail_url', pa.string()),
+    ('oferta_ganadora_predicha', pa.float64()),
+    ('error', pa.string()),  # por qué no se pudo predecir (nulo si hay predicción)
+    ('modelo_version', pa.string()),
+])
+
+
+def last_capture_mask(path, chunk_size: int = CHUNK_SIZE):
+    """True en la última fila de cada `detail_url` (None si la tabla no tiene esa columna)."""
+    urls = [chunk[DEDUP_KEY] for chunk in iter_table(path, columns=[DEDUP_KEY], chunk_size=chunk_size, csv_dtype=str)
+            if DEDUP_KEY in chunk.columns]
+    if not urls:
+        return None
+    return ~pd.concat(urls, ignore_index=True).duplicated(keep='last').to_numpy()
+
+
+def _text_column(chunk: pd.DataFrame, name: str) -> pa.Array:
+    if name not in chunk.columns:
+        return pa.nulls(len(chunk), pa.string())
+    values = chunk[name].astype(object)
+    return pa.array(values.where(values.notna(), None).map(str, na_action='ignore'), type=pa.string())
+
+
+def _input_chunks(input_path: Path, columns: list, chunk_size: int):
+    """Partes de la tabla de entrada, sólo con la última captura de cada subasta."""
+    keep = last_capture_mask(input_path, chunk_size)
+    offset = 0
+    for chunk in iter_table(input_path, columns=columns, chunk_size=chunk_size, csv_dtype=str):
+        if keep is not None:
+            mask = keep[offset:offset + len(chunk)]
+            offset += len(chunk)
+            chunk = chunk[mask]
+        yield chunk
+
+
+def score(feature_set: str, input_path=None, output_path=None, chunk_size: int = CHUNK_SIZE,
+          export_csv: bool = False, compact: bool = False, from_store: bool = False, as_of: str = None) -> dict:
+    """
+    Puntúa todos los autos de `input_path` y escribe las predicciones en `output_path`.
+    Con `from_store`, puntúa en cambio el snapshot `as_of` (por defecto, el último) del
+    almacén de características, con las columnas ya interpretadas.
+    Devuelve {filas, predichas, errores, segundos, filas_por_segundo, salida, snapshot}.
+    """
+    predictor = PricePredictor(feature_set, compact=compact)
+    version = predictor.metadata['version']
+    output_path = Path(output_path or PREDICTIONS_DIR / f'predicciones_{feature_set}.parquet')
+
+    start = time.perf_counter()
+    snapshot = None
+    if from_store:
+        snapshot_df, snapshot = FeatureStore(predictor.metadata['variant']).snapshot(as_of)
+        chunks = (snapshot_df.iloc[i:i + chunk_size] for i in range(0, len(snapshot_df), chunk_size))
+    else:
+        input_path = Path(input_path or VARIANTS[predictor.metadata['variant']]['input'])
+        chunks = _input_chunks(input_path, list(dict.fromkeys([*predictor.sources, 'placa', DEDUP_KEY])), chunk_size)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_suffix('.parquet.tmp')
+    rows = scored = 0
+    n_errors = 0
+    with pq.ParquetWriter(tmp_path, PREDICTIONS_SCHEMA, compression=PARQUET_COMPRESSION) as writer:
+        for chunk in chunks:
+            predictions, errors = predictor.predict_frame(chunk, parsed=from_store)
+            error_messages = np.full(len(chunk), None, dtype=object)
+            for position, message in errors.items():
+                error_messages[position] = message
+            writer.write_table(pa.table({
+                'placa': _text_column(chunk, 'placa'),
+                'detail_url': _text_column(chunk, DEDUP_KEY),
+                'oferta_ganadora_predicha': pa.array(predictions, type=pa.float64(), from_pandas=True),
+                'error': pa.array(error_messages, type=pa.string()),
+                'modelo_version': pa.array([version] * len(chunk), type=pa.string()),
+            }, schema=PREDICTIONS_SCHEMA))
+            rows += len(chunk)
+            n_errors += len(errors)
+            scored += len(chunk) - len(errors)
+            print(f"  {rows:,} autos puntuados ({rows / (time.perf_counter() - start):,.0f} filas/s)", end='\r')
+    os.replace(tmp_path, output_path)
+    elapsed = time.perf_counter() - start
+    print()
+
+    if export_csv:
+        # Copia CSV también por partes, para no cargar todas las predicciones en memoria
+        with open(csv_path(output_path), 'w', encoding=CSV_ENCODING, newline='') as f:
+            for i, batch in enumerate(pq.ParquetFile(output_path).iter_batches(batch_size=chunk_size)):
+                batch.to_pandas().to_csv(f, index=False, header=i == 0)
+
+    return {'filas': rows, 'predichas': scored, 'errores': n_errors, 'segundos': elapsed,
+            'filas_por_segundo': rows / elapsed if elapsed else float('inf'), 'salida': output_path, 'snapshot': snapshot}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predice la oferta ganadora de todos los autos guardados.")
+    parser.add_argument('--feature-set', choices=list(FEATURE_SETS), default='enriched')
+    parser.add_argument('--input', default=None, help="Tabla de entrada (por defecto, la de la variante del modelo).")
+    parser.add_argument('--output', default=None, help="Parquet de salida (por defecto, en data/predictions/).")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Filas por parte.")
+    parser.add_argument('--csv', action='store_true', help="Además del Parquet, exporta una copia CSV.")
+    parser.add_argument('--compact', action='store_true', help="Usa el modelo exportado por compact_model.py.")
+    parser.add_argument('--from-store', action='store_true', help="Puntúa el snapshot del almacén de características.")
+    parser.add_argument('--as-of', default=None, help="Con --from-store, fecha ISO del snapshot (por defecto, el último).")
+    args = parser.parse_args()
+
+    print(f"Puntuando autos con el modelo '{args.feature_set}'...")
+    try:
+        stats = score(args.feature_set, args.input, args.output, args.chunk_size, args.csv, args.compact,
+                      args.from_store, args.as_of)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        return
+    print(f"¡Listo! {stats['filas']:,} autos en {stats['segundos']:.1f} s ({stats['filas_por_segundo']:,.0f} filas/s): "
+          f"{stats['predichas']:,} predicciones y {stats['errores']:,} sin predicción.")
+    if stats['snapshot']:
+        print(f"Snapshot del almacén: lote {stats['snapshot']['batch']} ({stats['snapshot']['ingested_at']}).")
+    print(f"Predicciones guardadas en: {stats['salida']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+"""
+Registro local (SQLite) de las búsquedas de modelos de `model_search.py`.
+
+Cada evaluación (configuración x ronda de successive halving x fold de validación cruzada)
+se guarda apenas termina, así que una búsqueda interrumpida se retoma sin repetir lo ya
+evaluado. Dos tablas:
+- `searches`: una fila por búsqueda (hash de datos + espacio de búsqueda + ajustes), con
+              su descripción y estado.
+- `trials`:   el resultado de cada evaluación (MAE y R² del fold, segundos).
+"""
+
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+STORE_PATH = PROJECT_ROOT / 'models' / 'search' / 'search_results.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS searches (
+    search_id   TEXT PRIMARY KEY,
+    feature_set TEXT NOT NULL,
+    settings    TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    created_at  TEXT NOT NULL,
+    updated_at  TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trials (
+    search_id    TEXT NOT NULL,
+    candidate_id TEXT NOT NULL,
+    rung         INTEGER NOT NULL,
+    fold         INTEGER NOT NULL,
+    resource     INTEGER NOT NULL,
+    model        TEXT NOT NULL,
+    params       TEXT NOT NULL,
+    mae          REAL NOT NULL,
+    r2           REAL NOT NULL,
+    seconds      REAL NOT NULL,
+    created_at   TEXT NOT NULL,
+    PRIMARY KEY (search_id, candidate_id, rung, fold)
+);
+"""
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class SearchStore:
+    """Búsquedas y evaluaciones registradas; ver el docstring del módulo."""
+
+    def __init__(self, path: Path = STORE_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+    def start_search(self, search_id: str, feature_set: str, settings: dict) -> bool:
+        """Registra la búsqueda si es nueva. Devuelve True si ya existía (se retoma)."""
+        with self._conn:
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO searches (search_id, feature_set, settings, status, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (search_id, feature_set, json.dumps(settings, ensure_ascii=False), 'running', _now(), _now()))
+        return cursor.rowcount == 0
+
+    def set_status(self, search_id: str, status: str):
+        with self._conn:
+            self._conn.execute('UPDATE searches SET status = ?, updated_at = ? WHERE search_id = ?',
+                               (status, _now(), search_id))
+
+    def record_trial(self, search_id: str, trial: dict):
+        """Guarda (y confirma en disco) el resultado de una evaluación."""
+        with self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO trials (search_id, candidate_id, rung, fold, resource, model, params, '
+                'mae, r2, seconds, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (search_id, trial['candidate_id'], trial['rung'], trial['fold'], trial['resource'], trial['model'],
+                 json.dumps(trial['params'], ensure_ascii=False, sort_keys=True), trial['mae'], trial['r2'],
+                 trial['seconds'], _now()))
+
+    def done_trials(self, search_id: str, rung: int) -> set:
+        """(candidate_id, fold) ya evaluados en la ronda `rung`."""
+        return set(self._conn.execute(
+            'SELECT candidate_id, fold FROM trials WHERE search_id = ? AND rung = ?', (search_id, rung)))
+
+    def rung_scores(self, search_id: str, rung: int, n_folds: int) -> dict:
+        """{candidate_id: MAE medio} de las configuraciones con todos los folds evaluados en la ronda."""
+        return dict(self._conn.execute(
+            'SELECT candidate_id, AVG(mae) FROM trials WHERE search_id = ? AND rung = ? '
+            'GROUP BY candidate_id HAVING COUNT(*) = ?', (search_id, rung, n_folds)))
+
+    def leaderboard(self, search_id: str, limit: int = 10) -> list:
+        """
+        Mejores configuraciones de la búsqueda, primero las que llegaron a la ronda más alta y
+        dentro de ella por MAE medio: [{candidate_id, model, params, rung, resource, mae, r2}, ...].
+        """
+        rows = self._conn.execute(
+            'WITH scored AS (SELECT candidate_id, model, params, rung, resource, AVG(mae) AS mae, AVG(r2) AS r2 '
+            'FROM trials WHERE search_id = ? GROUP BY candidate_id, rung) '
+            'SELECT candidate_id, model, params, rung, resource, mae, r2 FROM scored '
+            'WHERE rung = (SELECT MAX(rung) FROM scored AS best WHERE best.candidate_id = scored.candidate_id) '
+            'ORDER BY rung DESC, mae ASC LIMIT ?', (search_id, limit))
+        return [{'candidate_id': candidate_id, 'model': model, 'params': json.loads(params), 'rung': rung,
+                 'resource': resource, 'mae': mae, 'r2': r2}
+                for candidate_id, model, params, rung, resource, mae, r2 in rows]
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+"""
+Entrenamiento de los modelos de precio (`oferta_ganadora`) desde la línea de comandos.
+
+Reproduce los dos modelos del notebook `2.0-EDA-and-Modeling.ipynb`:
+- 'basic':    datos del scraper (`data/clean/karcal_data_cleaned_raw.parquet`).
+- 'enriched': datos con los campos extraídos por la IA (`data/clean/karcal_data_cleaned.parquet`).
+Cada uno es un Pipeline `ColumnTransformer` (StandardScaler + OneHotEncoder) +
+`RandomForestRegressor(n_estimators=100)`, con el mismo split 80/20 (random_state=42).
+
+A diferencia del notebook:
+- Los árboles se entrenan en paralelo (`--n-jobs`, por defecto todos los núcleos).
+- El preprocesador ajustado se guarda en caché (`joblib.Memory`, en `models/cache/`):
+  si los datos de entrenamiento no cambiaron, no se vuelve a ajustar.
+- Cada modelo se guarda en una versión propia, `models/<feature_set>/<versión>/`, con
+  `model.joblib`, `metadata.json` (features, hash de los datos, parámetros, métricas) y las
+  medianas de imputación de la limpieza (`imputer.json`). La versión es el hash de los
+  datos + features + parámetros: si ya existe, se reutiliza en vez de volver a entrenar.
+  `models/<feature_set>/latest.json` apunta a la última versión entrenada o reutilizada.
+
+Uso:
+    python src/modeling/train_model.py [--feature-set basic|enriched|all] [--n-jobs N] [--force]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import pandas as pd
+import sklearn
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'processing'))
+from clean_pipeline import VARIANTS, load_clean  # noqa: E402
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+MODELS_DIR = PROJECT_ROOT / 'models'
+PREPROCESSOR_CACHE_DIR = MODELS_DIR / 'cache'
+
+TARGET = 'oferta_ganadora'
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+
+# Features de cada modelo (las del notebook), separadas por tipo de preprocesamiento
+FEATURE_SETS = {
+    'basic': {
+        'variant': 'basic',
+        'numeric': ['antiguedad', 'kilometraje', 'cilindrada', 'visitas', 'numero_pujas', 'valor_inicial'],
+        'categorical': ['marca', 'transmisión', 'combustible'],
+    },
+    'enriched': {
+        'variant': 'enriched',
+        'numeric': [
+            'antiguedad', 'kilometraje', 'cilindrada', 'visitas', 'numero_pujas',
+            'valor_inicial', 'numero_propietarios', 'meses_dueño_actual',
+            'funciona', 'tiene_llaves', 'tiene_multas', 'monto_multas_utm',
+        ],
+        'categorical': ['marca', 'transmisión', 'combustible', 'tracción', 'mandante'],
+    },
+}
+
+# Parámetros del regresor del notebook (n_jobs no cambia el resultado, así que no entra en la versión)
+REGRESSOR_PARAMS = {'n_estimators': 100, 'random_state': RANDOM_STATE}
+
+
+def feature_columns(feature_set: str) -> list:
+    config = FEATURE_SETS[feature_set]
+    return config['numeric'] + config['categorical']
+
+
+def load_training_data(feature_set: str) -> tuple:
+    """
+    Lee sólo las features y la variable objetivo del dataset limpio y descarta las filas con
+    nulos (como el notebook). Devuelve (X, y, features); las features que no existan en el
+    dataset se omiten.
+    """
+    config = FEATURE_SETS[feature_set]
+    df = load_clean(config['variant'], columns=feature_columns(feature_set) + [TARGET])
+    features = [name for name in feature_columns(feature_set) if name in df.columns]
+    df = df.dropna(subset=features + [TARGET]).reset_index(drop=True)
+    return df[features], df[TARGET], features
+
+
+def feature_snapshot(variant: str) -> dict:
+    """Snapshot del almacén de características del que sale el dataset limpio (None si no sale de uno)."""
+    path = VARIANTS[variant]['snapshot']
+    if not path.is_file():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def data_hash(X: pd.DataFrame, y: pd.Series) -> str:
+    """Hash del contenido de los datos de entrenamiento (no depende del formato del archivo)."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(list(X.columns), ensure_ascii=False).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(X.astype(object), index=False).to_numpy().tobytes())
+    digest.update(pd.util.hash_pandas_object(y, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def build_preprocessor(feature_set: str, features: list, dense: bool = False) -> ColumnTransformer:
+    """Escala las numéricas y codifica one-hot las categóricas; con `dense`, la salida nunca es dispersa."""
+    config = FEATURE_SETS[feature_set]
+    return ColumnTransformer(
+        transformers=[
+            ('num', StandardScaler(), [name for name in config['numeric'] if name in features]),
+            ('cat', OneHotEncoder(handle_unknown='ignore'), [name for name in config['categorical'] if name in features]),
+        ], sparse_threshold=0 if dense else 0.3)
+
+
+def build_pipeline(feature_set: str, features: list, regressor, memory=None, dense: bool = False) -> Pipeline:
+    """
+    Pipeline preprocesador + `regressor`; con `memory` (ruta o joblib.Memory) el preprocesador
+    ajustado se guarda en caché. `dense=True` para regresores que no aceptan matrices
+    dispersas (ej. HistGradientBoostingRegressor).
+    """
+    return Pipeline(steps=[
+        ('preprocessor', build_preprocessor(feature_set, features, dense=dense)),
+        ('regressor', regressor),
+    ], memory=memory)
+
+
+def model_version(feature_set: str, features: list, data_digest: str, params: dict) -> str:
+    payload = json.dumps({
+        'feature_set': feature_set, 'features': features, 'data': data_digest, 'params': params,
+        'split': [TEST_SIZE, RANDOM_STATE], 'sklearn': sklearn.__version__,
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]
+
+
+def _write_json(data: dict, path: Path):
+    """Escritura atómica (archivo temporal + rename)."""
+    tmp_path = path.with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def train(feature_set: str, n_jobs: int = -1, force: bool = False, models_dir: Path = MODELS_DIR) -> dict:
+    """
+    Entrena (o reutiliza, si los datos y parámetros no cambiaron) el modelo de `feature_set`.
+    Devuelve la metadata de la versión resultante.
+    """
+    models_dir = Path(models_dir)
+    X, y, features = load_training_data(feature_set)
+    data_digest = data_hash(X, y)
+    version = model_version(feature_set, features, data_digest, REGRESSOR_PARAMS)
+    version_dir = models_dir / feature_set / version
+    metadata_path = version_dir / 'metadata.json'
+
+    if metadata_path.is_file() and (version_dir / 'model.joblib').is_file() and not force:
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        print(f"[{feature_set}] Datos y parámetros sin cambios: se reutiliza la versión {version}.")
+    else:
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+        model = build_pipeline(feature_set, features, RandomForestRegressor(**REGRESSOR_PARAMS, n_jobs=n_jobs),
+                               memory=joblib.Memory(models_dir / 'cache', verbose=0))
+        print(f"[{feature_set}] Entrenando con {len(X_train)} filas y {len(features)} features...")
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        train_seconds = time.perf_counter() - start
+        y_pred = model.predict(X_test)
+
+        metadata = {
+            'version': version,
+            'feature_set': feature_set,
+            'variant': FEATURE_SETS[feature_set]['variant'],
+            'target': TARGET,
+            'features': features,
+            'numeric': [name for name in FEATURE_SETS[feature_set]['numeric'] if name in features],
+            'categorical': [name for name in FEATURE_SETS[feature_set]['categorical'] if name in features],
+            'data_hash': data_digest,
+            'rows': {'train': len(X_train), 'test': len(X_test)},
+            'params': REGRESSOR_PARAMS,
+            'metrics': {'mae': float(mean_absolute_error(y_test, y_pred)), 'r2': float(r2_score(y_test, y_pred))},
+            'train_seconds': round(train_seconds, 3),
+            'sklearn_version': sklearn.__version__,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'snapshot': feature_snapshot(FEATURE_SETS[feature_set]['variant']),
+        }
+        version_dir.mkdir(parents=True, exist_ok=True)
+        # Sin la caché del preprocesador: el modelo guardado no depende de models/cache
+        model.set_params(memory=None)
+        joblib.dump(model, version_dir / 'model.joblib')
+        imputer_path = VARIANTS[metadata['variant']]['imputer']
+        if imputer_path.is_file():
+            shutil.copyfile(imputer_path, version_dir / 'imputer.json')
+        _write_json(metadata, metadata_path)
+
+    _write_json(metadata, models_dir / feature_set / 'latest.json')
+    print(f"[{feature_set}] Versión {version}: MAE ${metadata['metrics']['mae']:,.0f} | "
+          f"R² {metadata['metrics']['r2']:.4f}")
+    return metadata
+
+
+def load_model(feature_set: str, version: str = None, models_dir: Path = MODELS_DIR) -> tuple:
+    """Carga (pipeline, metadata) de una versión guardada (por defecto, la última)."""
+    models_dir = Path(models_dir)
+    if version is None:
+        with open(models_dir / feature_set / 'latest.json', 'r', encoding='utf-8') as f:
+            version = json.load(f)['version']
+    version_dir = models_dir / feature_set / version
+    with open(version_dir / 'metadata.json', 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    return joblib.load(version_dir / 'model.joblib'), metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrena los modelos de precio y guarda versiones con metadata.")
+    parser.add_argument('--feature-set', choices=[*FEATURE_SETS, 'all'], default='all',
+                        help="Modelo a entrenar (por defecto, ambos).")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="Procesos para entrenar los árboles (-1 = todos los núcleos).")
+    parser.add_argument('--force', action='store_true', help="Reentrena aunque exista la versión.")
+    args = parser.parse_args()
+    for feature_set in (FEATURE_SETS if args.feature_set == 'all' else [args.feature_set]):
+        try:
+            train(feature_set, n_jobs=args.n_jobs, force=args.force)
+        except FileNotFoundError as e:
+            print(f"Error: {e} Ejecuta antes src/processing/clean_pipeline.py.")
+
+
+if __name__ == '__main__':
+    main()
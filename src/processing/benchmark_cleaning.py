@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark de las funciones de limpieza: versión anterior por celda (`Series.apply`) vs
+la versión vectorizada de `cleaning.py`, sobre una copia ampliada de
+`data/processed/karcal_data_processed.csv`.
+
+Para que la copia cubra los casos difíciles, una parte de las filas se altera al azar:
+kilometraje 'NO REGISTRA', valores nulos, booleanos como texto en distintas
+mayúsculas e historiales de ofertas vacíos o inválidos. Además de los tiempos,
+verifica que ambas versiones den exactamente el mismo resultado.
+
+Uso:
+    python src/processing/benchmark_cleaning.py [--rows 1000000]
+"""
+
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cleaning import count_bids, parse_bool, parse_digits, parse_km
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+INPUT_PATH = PROJECT_ROOT / 'data' / 'processed' / 'karcal_data_processed.csv'
+BOOL_COLUMN = 'condicion_fisica_y_riesgos_funciona'
+
+
+# --- Funciones anteriores (data_cleaner.py / data_cleaner_open_ai.py), como referencia ---
+
+def limpiar_valor_monetario(valor):
+    if isinstance(valor, str):
+        numeros = re.sub(r'[^\d]', '', valor)
+        return pd.to_numeric(numeros, errors='coerce')
+    return pd.to_numeric(valor, errors='coerce')
+
+
+def limpiar_kilometraje(valor):
+    if isinstance(valor, str):
+        if 'no registra' in valor.lower():
+            return np.nan
+        numeros = re.sub(r'[^\d]', '', valor)
+        return pd.to_numeric(numeros, errors='coerce')
+    return pd.to_numeric(valor, errors='coerce')
+
+
+def limpiar_booleano(valor):
+    if isinstance(valor, str):
+        if valor.lower() == 'true':
+            return 1
+        elif valor.lower() == 'false':
+            return 0
+    elif isinstance(valor, bool):
+        return int(valor)
+    return 0
+
+
+def contar_pujas(json_str):
+    if isinstance(json_str, str):
+        try:
+            return len(json.loads(json_str))
+        except (json.JSONDecodeError, TypeError):
+            return 0
+    return 0
+
+
+def scaled_copy(df: pd.DataFrame, rows: int, seed: int = 42) -> pd.DataFrame:
+    """Repite `df` hasta `rows` filas y altera al azar ~5% de cada columna con casos límite."""
+    rng = np.random.default_rng(seed)
+    big = df.iloc[rng.integers(0, len(df), rows)].reset_index(drop=True)
+
+    def pick(fraction):
+        return rng.random(rows) < fraction
+
+    big.loc[pick(0.05), 'kilometraje'] = 'NO REGISTRA'
+    big.loc[pick(0.02), 'kilometraje'] = 'No registra km'
+    big.loc[pick(0.02), 'kilometraje'] = np.nan
+    big.loc[pick(0.02), 'oferta_ganadora'] = np.nan
+    big.loc[pick(0.01), 'valor_inicial'] = 'Sin valor'
+    big.loc[pick(0.02), 'visitas'] = np.nan
+
+    # Con valores no booleanos, la columna se lee del CSV como texto
+    big[BOOL_COLUMN] = big[BOOL_COLUMN].astype('str')
+    for value, fraction in (('True', 0.1), ('false', 0.1), ('TRUE', 0.05), ('no sé', 0.02)):
+        big.loc[pick(fraction), BOOL_COLUMN] = value
+
+    big.loc[pick(0.02), 'historial_ofertas'] = '[]'
+    big.loc[pick(0.01), 'historial_ofertas'] = '[{"usuario": "trunca'
+    big.loc[pick(0.01), 'historial_ofertas'] = '["a", "b", "c"]'
+    big.loc[pick(0.02), 'historial_ofertas'] = np.nan
+    return big
+
+
+CASES = [
+    ('oferta_ganadora (monetario)', 'oferta_ganadora',
+     lambda s: s.apply(limpiar_valor_monetario), parse_digits),
+    ('valor_inicial (monetario)', 'valor_inicial',
+     lambda s: s.apply(limpiar_valor_monetario), parse_digits),
+    ('visitas (str(x) + monetario)', 'visitas',
+     lambda s: s.apply(lambda x: limpiar_valor_monetario(str(x))), lambda s: parse_digits(s, as_text=True)),
+    ('kilometraje', 'kilometraje',
+     lambda s: s.apply(limpiar_kilometraje), parse_km),
+    ('booleano', BOOL_COLUMN,
+     lambda s: s.apply(limpiar_booleano), parse_bool),
+    ('numero_pujas', 'historial_ofertas',
+     lambda s: s.apply(contar_pujas), count_bids),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara la limpieza por celda con la vectorizada.")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Filas de la copia ampliada.")
+    args = parser.parse_args()
+
+    df = scaled_copy(pd.read_csv(INPUT_PATH), args.rows)
+    print(f"{len(df):,} filas (a partir de {INPUT_PATH.name}).\n")
+    print(f"{'columna':<30} {'apply (s)':>10} {'vectorizado (s)':>16} {'aceleración':>12}  resultado")
+
+    total_old = total_new = 0.0
+    for name, column, old, new in CASES:
+        start = time.perf_counter()
+        expected = old(df[column])
+        old_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = new(df[column])
+        new_elapsed = time.perf_counter() - start
+
+        # Mismos valores (y mismos nulos); el tipo puede diferir (ej. int8 vs int64 en las banderas)
+        pd.testing.assert_series_equal(result.astype('float64'), expected.astype('float64'), check_names=False)
+        total_old += old_elapsed
+        total_new += new_elapsed
+        print(f"{name:<30} {old_elapsed:>10.2f} {new_elapsed:>16.2f} {old_elapsed / new_elapsed:>11.1f}x  idéntico")
+
+    print(f"{'total':<30} {total_old:>10.2f} {total_new:>16.2f} {total_old / total_new:>11.1f}x")
+
+
+if __name__ == '__main__':
+    main()
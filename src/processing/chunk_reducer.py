@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+"""
+Reducción de las respuestas por trozo (chunk) a un único registro por vehículo.
+
+Cada vehículo puede generar varias peticiones al batch (`custom_id` como 'BSWT31-1',
+'BSWT31-2', ...), y cada respuesta sólo ve una parte de los documentos. En vez de
+convertir cada respuesta en una fila, aquí se combinan los JSON del mismo vehículo
+campo por campo con reglas explícitas:
+- 'first': gana el primer valor no nulo (en orden de trozo).
+- 'or':    para banderas de riesgo, basta con que un trozo lo detecte.
+- 'max':   para conteos y montos que un trozo puede ver sólo parcialmente.
+- 'union': para listas, sin duplicados.
+"""
+
+# Reglas por campo (ruta 'grupo.campo' del JSON definido en prompts/prompt.txt).
+# Los campos no listados usan 'union' si son listas y 'first' en cualquier otro caso.
+FIELD_RULES = {
+    'estado_legal_y_documentacion.limitaciones_dominio_activas': 'or',
+    'historial_propiedad.numero_propietarios': 'max',
+    'historial_propiedad.meses_dueño_actual': 'max',
+    'multas_y_costos_directos.tiene_multas_anotadas': 'or',
+    'multas_y_costos_directos.monto_total_multas_utm': 'max',
+    'condicion_fisica_y_riesgos.observaciones_criticas': 'union',
+    'condicion_fisica_y_riesgos.es_chatarra': 'or',
+}
+
+
+def parse_custom_id(custom_id: str) -> tuple:
+    """'BSWT31-3' -> ('BSWT31', 3). Un id sin número de trozo se trata como el trozo 1."""
+    vehicle_id, _, chunk = custom_id.rpartition('-')
+    if not vehicle_id or not chunk.isdigit():
+        return custom_id, 1
+    return vehicle_id, int(chunk)
+
+
+TRUE_WORDS = {'true', 'si', 'sí', 'yes'}
+FALSE_WORDS = {'false', 'no'}
+
+
+def _as_bool(value):
+    """Booleano de una respuesta del modelo (True, 'true', 'SI', 1, ...); None si no se reconoce."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        text = value.strip().lower()
+        return True if text in TRUE_WORDS else False if text in FALSE_WORDS else None
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    return None
+
+
+def _merge_value(rule, current, new):
+    if rule == 'or':
+        # 'False' o 'no' como texto no cuentan como detección
+        flags = [flag for flag in (_as_bool(current), _as_bool(new)) if flag is not None]
+        return any(flags) if flags else None
+    if new is None:
+        return current
+    if current is None:
+        return list(dict.fromkeys(new)) if rule == 'union' and isinstance(new, list) else new
+    if rule == 'max':
+        try:
+            return max(current, new)
+        except TypeError:  # tipos no comparables (ej. número y texto): se conserva el primero
+            return current
+    if rule == 'union' and isinstance(current, list) and isinstance(new, list):
+        return list(dict.fromkeys(current + new))
+    return current
+
+
+def merge_responses(current: dict, new: dict, rules: dict = FIELD_RULES, prefix: str = '',
+                    chunk: int = 0, origins: dict = None) -> dict:
+    """
+    Combina el JSON `new` sobre `current` (in-place) según `rules`, recorriendo los objetos anidados.
+    Con `origins` ({ruta: número de trozo}) la regla 'first' respeta el orden de los trozos
+    aunque las respuestas lleguen desordenadas.
+    """
+    for key, value in new.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            if not isinstance(current.get(key), dict):
+                current[key] = {}
+            merge_responses(current[key], value, rules, f"{path}.", chunk, origins)
+            continue
+        rule = rules.get(path, 'union' if isinstance(value, list) else 'first')
+        if rule == 'first' and origins is not None:
+            if value is not None and (current.get(key) is None or chunk < origins.get(path, chunk)):
+                current[key] = value
+                origins[path] = chunk
+            else:
+                current.setdefault(key, None)
+            continue
+        current[key] = _merge_value(rule, current.get(key), value)
+    return current
+
+
+def reduce_chunks(chunks, rules: dict = FIELD_RULES) -> dict:
+    """Reduce una lista de (número_de_trozo, json) de un mismo vehículo a un solo JSON."""
+    merged = {}
+    for _, response in sorted(chunks, key=lambda chunk: chunk[0]):
+        merge_responses(merged, response, rules)
+    return merged
+
+
+class ChunkReducer:
+    """
+    Combina las respuestas por vehículo a medida que se leen (en cualquier orden).
+    Sólo guarda el JSON combinado de cada vehículo, no las respuestas individuales,
+    así que la memoria crece con el número de vehículos y no con el de trozos.
+    """
+
+    def __init__(self, rules: dict = FIELD_RULES):
+        self.rules = rules
+        self._merged = {}
+
+    def add(self, custom_id: str, response: dict) -> str:
+        """Registra la respuesta de un trozo y devuelve la patente a la que pertenece."""
+        vehicle_id, chunk = parse_custom_id(custom_id)
+        merged, origins = self._merged.setdefault(vehicle_id, ({}, {}))
+        merge_responses(merged, response, self.rules, chunk=chunk, origins=origins)
+        return vehicle_id
+
+    def __len__(self):
+        return len(self._merged)
+
+    def results(self) -> dict:
+        """Devuelve {patente: json combinado}."""
+        return {vehicle_id: merged for vehicle_id, (merged, _) in self._merged.items()}
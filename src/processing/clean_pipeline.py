@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pipeline de limpieza único, definido por un esquema de columnas.
+
+Genera los dos datasets para el modelo desde el mismo código:
+- 'basic':    desde `data/raw/karcal_data_raw.parquet`  -> `data/clean/karcal_data_cleaned_raw.parquet`
+- 'enriched': desde `data/processed/karcal_data_processed.parquet` (con los datos extraídos
+              por la IA) -> `data/clean/karcal_data_cleaned.parquet`
+
+Cada columna del esquema (`SCHEMA`) declara de qué columna de entrada sale, cómo se
+interpreta (`parser`), su tipo final compacto (`dtype`: categorías para el texto
+repetido, enteros pequeños para las banderas) y cómo se imputan sus nulos (`impute`).
+Las características derivadas están en `DERIVED_FEATURES` y las columnas de cada
+variante en `VARIANTS`. Sólo se leen las columnas que la variante necesita y cada una se
+interpreta una sola vez. Las tablas se guardan en Parquet (ver `storage.py`), que conserva
+los tipos compactos; con --csv también se exporta una copia CSV.
+
+Con --from-store, las columnas interpretadas salen del almacén de características
+(`feature_store.py`), que sólo interpreta las filas nuevas o cambiadas; --as-of reconstruye
+el dataset de un snapshot anterior.
+
+Uso:
+    python src/processing/clean_pipeline.py [--variant basic|enriched|all] [--csv]
+                                            [--from-store [--as-of FECHA]]
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from cleaning import count_bids, parse_bool, parse_digits, parse_km
+from imputer import Imputer
+from storage import read_table, write_table
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+# Año de referencia para la antigüedad (el mismo de la fecha fija del prompt de extracción),
+# para que el dataset no cambie según el año en que se ejecute la limpieza.
+REFERENCE_YEAR = 2025
+
+# Columna que identifica cada subasta: el scraper incremental puede agregar varias capturas.
+# Las filas sin `detail_url` no se pueden identificar y se conservan todas.
+DEDUP_KEY = 'detail_url'
+
+PARSERS = {
+    'text': lambda s: s,
+    'upper': lambda s: s.str.upper().str.strip(),
+    'number': lambda s: pd.to_numeric(s, errors='coerce'),
+    'digits': parse_digits,  # '$1.234.567' -> 1234567 ('1.600' cc -> 1600)
+    'km': parse_km,          # como 'digits', con 'NO REGISTRA' -> nulo
+    'bool': parse_bool,      # 'True'/'False' -> 1/0, nulos -> 0
+    'bids': count_bids,      # historial de ofertas (JSON) -> número de pujas
+}
+
+# Imputación de nulos (ver imputer.py): 'median' (mediana global), {'median_by': [niveles]}
+# (mediana del grupo más específico con datos y, si no hay, la global) o un valor fijo.
+# Las medianas se ajustan sobre el dataset limpio y se guardan junto a él.
+KM_IMPUTATION = {'median_by': [['año', 'marca'], ['año']]}
+SCHEMA = {
+    # ---- Variable objetivo y claves (las filas sin estos valores se descartan) ----
+    'oferta_ganadora': {'parser': 'digits', 'dtype': 'float64', 'required': True},
+    'año': {'parser': 'number', 'dtype': 'int16', 'required': True},
+    # ---- Datos de la subasta ----
+    'marca': {'parser': 'text', 'dtype': 'category'},
+    'modelo': {'parser': 'text', 'dtype': 'category'},
+    'kilometraje': {'parser': 'km', 'dtype': 'float32', 'impute': KM_IMPUTATION},
+    'transmisión': {'parser': 'upper', 'dtype': 'category'},
+    'combustible': {'parser': 'upper', 'dtype': 'category'},
+    'tracción': {'parser': 'upper', 'dtype': 'category'},
+    'cilindrada': {'parser': 'digits', 'dtype': 'float32', 'impute': 'median'},
+    'visitas': {'parser': 'digits', 'dtype': 'float32', 'impute': 'median'},
+    'valor_inicial': {'parser': 'digits', 'dtype': 'float64'},
+    'numero_pujas': {'source': 'historial_ofertas', 'parser': 'bids', 'dtype': 'int16'},
+    'mandante': {'parser': 'text', 'dtype': 'category'},
+    'placa': {'parser': 'text', 'dtype': 'str'},
+    'detail_url': {'parser': 'text', 'dtype': 'str'},
+    'image_url': {'parser': 'text', 'dtype': 'str'},
+    # ---- Datos extraídos por la IA (process_batch_output.py) ----
+    'numero_propietarios': {'source': 'historial_propiedad_numero_propietarios', 'parser': 'number',
+                            'dtype': 'float32', 'impute': 'median'},
+    'meses_dueño_actual': {'source': 'historial_propiedad_meses_dueño_actual', 'parser': 'number',
+                           'dtype': 'float32', 'impute': 'median'},
+    'funciona': {'source': 'condicion_fisica_y_riesgos_funciona', 'parser': 'bool', 'dtype': 'int8'},
+    'tiene_llaves': {'source': 'condicion_fisica_y_riesgos_tiene_llaves', 'parser': 'bool', 'dtype': 'int8'},
+    'es_chatarra': {'source': 'condicion_fisica_y_riesgos_es_chatarra', 'parser': 'bool', 'dtype': 'int8'},
+    'limitaciones_dominio': {'source': 'estado_legal_y_documentacion_limitaciones_dominio_activas',
+                             'parser': 'bool', 'dtype': 'int8'},
+    'permiso_circulacion_vigente': {'source': 'estado_legal_y_documentacion_permiso_circulacion_vigente',
+                                    'parser': 'bool', 'dtype': 'int8'},
+    'revision_tecnica_vigente': {'source': 'estado_legal_y_documentacion_revision_tecnica_vigente',
+                                 'parser': 'bool', 'dtype': 'int8'},
+    'tiene_multas': {'source': 'multas_y_costos_directos_tiene_multas_anotadas', 'parser': 'bool', 'dtype': 'int8'},
+    # Si no hay dato de multas, no hay multa
+    'monto_multas_utm': {'source': 'multas_y_costos_directos_monto_total_multas_utm', 'parser': 'number',
+                         'dtype': 'float32', 'impute': 0},
+}
+
+# Características calculadas a partir de columnas ya limpias e imputadas: (función, dtype, dependencias)
+DERIVED_FEATURES = {
+    'antiguedad': (lambda df: REFERENCE_YEAR - df['año'], 'int16', ['año']),
+    # +1 para evitar la división por cero en autos del año de referencia
+    'km_por_año': (lambda df: df['kilometraje'] / (df['antiguedad'] + 1), 'float32', ['kilometraje', 'antiguedad']),
+    'ratio_oferta_inicial': (lambda df: df['oferta_ganadora'] / df['valor_inicial'], 'float32',
+                             ['oferta_ganadora', 'valor_inicial']),
+}
+
+VARIANTS = {
+    'basic': {
+        'input': PROJECT_ROOT / 'data' / 'raw' / 'karcal_data_raw.parquet',
+        'output': PROJECT_ROOT / 'data' / 'clean' / 'karcal_data_cleaned_raw.parquet',
+        'imputer': PROJECT_ROOT / 'data' / 'clean' / 'karcal_data_cleaned_raw.imputer.json',
+        'snapshot': PROJECT_ROOT / 'data' / 'clean' / 'karcal_data_cleaned_raw.snapshot.json',
+        # Como el limpiador básico original, sin imputar cilindrada ni visitas
+        'impute': {'cilindrada': None, 'visitas': None},
+        'columns': [
+            'marca', 'modelo', 'año', 'antiguedad', 'oferta_ganadora', 'kilometraje',
+            'km_por_año', 'transmisión', 'combustible', 'cilindrada', 'visitas',
+            'numero_pujas', 'valor_inicial', 'mandante', 'placa',
+            'detail_url', 'image_url',
+        ],
+    },
+    'enriched': {
+        'input': PROJECT_ROOT / 'data' / 'processed' / 'karcal_data_processed.parquet',
+        'output': PROJECT_ROOT / 'data' / 'clean' / 'karcal_data_cleaned.parquet',
+        'imputer': PROJECT_ROOT / 'data' / 'clean' / 'karcal_data_cleaned.imputer.json',
+        'snapshot': PROJECT_ROOT / 'data' / 'clean' / 'karcal_data_cleaned.snapshot.json',
+        'columns': [
+            # ---- Variable Objetivo ----
+            'oferta_ganadora',
+            # ---- Features Principales ----
+            'marca', 'modelo', 'año', 'antiguedad', 'kilometraje', 'km_por_año',
+            'transmisión', 'combustible', 'cilindrada', 'tracción',
+            # ---- Features de Subasta ----
+            'valor_inicial', 'numero_pujas', 'visitas', 'ratio_oferta_inicial', 'mandante',
+            # ---- Features de Condición e Historial ----
+            'numero_propietarios', 'meses_dueño_actual', 'funciona', 'tiene_llaves',
+            'es_chatarra',
+            # ---- Features Legales y de Multas ----
+            'limitaciones_dominio', 'permiso_circulacion_vigente', 'revision_tecnica_vigente',
+            'tiene_multas', 'monto_multas_utm',
+        ],
+    },
+}
+
+
+def required_columns(columns: list) -> tuple:
+    """
+    Columnas del esquema y características derivadas necesarias para `columns`, incluidas
+    las dependencias de las derivadas. Devuelve (columnas del esquema, derivadas).
+    """
+    needed = [name for name, spec in SCHEMA.items() if spec.get('required')]
+    derived = set()
+    pending = list(columns)
+    while pending:
+        name = pending.pop()
+        if name in DERIVED_FEATURES and name not in derived:
+            derived.add(name)
+            pending.extend(DERIVED_FEATURES[name][2])
+        elif name in SCHEMA and name not in needed:
+            needed.append(name)
+    return needed, derived
+
+
+def latest_captures(raw_df: pd.DataFrame) -> pd.DataFrame:
+    """Última captura de cada subasta (`DEDUP_KEY`); las filas sin `DEDUP_KEY` se conservan todas."""
+    if DEDUP_KEY not in raw_df.columns:
+        return raw_df
+    return raw_df[raw_df[DEDUP_KEY].isna() | ~raw_df.duplicated(subset=DEDUP_KEY, keep='last')]
+
+
+def imputation_rules(columns, overrides: dict = None) -> dict:
+    """Reglas de imputación del esquema para `columns`; en `overrides`, None quita la regla de una columna."""
+    rules = {name: SCHEMA[name]['impute'] for name in columns if 'impute' in SCHEMA.get(name, {})}
+    rules.update(overrides or {})
+    return {name: rule for name, rule in rules.items() if rule is not None and name in columns}
+
+
+def parse_source(raw_df: pd.DataFrame, schema_columns: list) -> pd.DataFrame:
+    """
+    Interpreta cada columna de `schema_columns` desde su columna de entrada (una sola vez, y
+    arma el DataFrame de una vez, no columna a columna). Las columnas cuya fuente no está
+    en `raw_df` se omiten. No descarta filas ni imputa: el resultado depende sólo de cada fila.
+    """
+    parsed = {}
+    for name in schema_columns:
+        spec = SCHEMA[name]
+        source = spec.get('source', name)
+        if source in raw_df.columns:
+            parsed[name] = PARSERS[spec['parser']](raw_df[source])
+    return pd.DataFrame(parsed, index=raw_df.index)
+
+
+def finish(df: pd.DataFrame, columns: list, imputer: Imputer = None, required: list = None,
+           impute: dict = None) -> tuple:
+    """
+    Completa la limpieza de columnas ya interpretadas (`parse_source`): descarta las filas
+    sin alguna columna `required`, imputa, aplica los tipos del esquema y calcula las
+    características derivadas. Devuelve (DataFrame con sólo `columns`, Imputer); ver `clean`.
+    `impute` cambia las reglas de imputación del esquema al ajustar (ver `imputation_rules`).
+    """
+    derived = required_columns(columns)[1]
+
+    # 2. Descartar filas sin variable objetivo o año
+    if required is None:
+        required = [name for name, spec in SCHEMA.items() if spec.get('required')]
+    df = df.dropna(subset=required)
+
+    # 3. Imputar nulos (medianas calculadas una vez por grupo) y aplicar los tipos compactos
+    if imputer is None:
+        imputer = Imputer(imputation_rules(df.columns, impute))
+        imputer.fit(df)
+    df = imputer.transform(df)
+    df = df.astype({name: SCHEMA[name]['dtype'] for name in df.columns})
+
+    # 4. Características derivadas (en el orden de DERIVED_FEATURES, que respeta sus dependencias)
+    for name, (function, dtype, dependencies) in DERIVED_FEATURES.items():
+        if name in derived and all(dependency in df.columns for dependency in dependencies):
+            df[name] = function(df).astype(dtype)
+
+    return df[[name for name in columns if name in df.columns]].reset_index(drop=True), imputer
+
+
+def clean(raw_df: pd.DataFrame, columns: list, imputer: Imputer = None, required: list = None,
+          impute: dict = None) -> tuple:
+    """
+    Limpia `raw_df` y devuelve (DataFrame con sólo `columns` y los tipos del esquema, Imputer).
+    Sin `imputer`, las medianas de imputación se ajustan sobre estos datos; con uno ya
+    ajustado (ej. al predecir subastas nuevas) se aplican las medianas guardadas.
+    Se descartan las filas sin alguna de las columnas `required` (por defecto, las marcadas
+    'required' en el esquema; al predecir, la oferta ganadora todavía no existe).
+    Las columnas del esquema cuya fuente no está en `raw_df` se omiten.
+    """
+    # El scraper incremental agrega filas: quedarse con la última captura de cada subasta
+    raw_df = latest_captures(raw_df)
+
+    # 1. Interpretar cada columna una sola vez
+    df = parse_source(raw_df, required_columns(columns)[0])
+    return finish(df, columns, imputer=imputer, required=required, impute=impute)
+
+
+def read_source(path: Path, columns: list) -> pd.DataFrame:
+    """
+    Lee sólo las columnas de entrada necesarias para `columns`. Desde un CSV anterior al
+    cambio a Parquet se leen todas como texto, para que cada parser las interprete.
+    """
+    sources = [SCHEMA[name].get('source', name) for name in required_columns(columns)[0]]
+    return read_table(path, columns=list(dict.fromkeys([*sources, DEDUP_KEY])), csv_dtype=str)
+
+
+def load_clean(variant: str, columns: list = None) -> pd.DataFrame:
+    """Lee el dataset limpio de una variante; con `columns`, sólo esas columnas (ej. las features del modelo)."""
+    return read_table(VARIANTS[variant]['output'], columns=columns)
+
+
+def run_variant(variant: str, export_csv: bool = False, from_store: bool = False, as_of: str = None) -> pd.DataFrame:
+    """
+    Limpia y guarda el dataset de una variante ('basic' o 'enriched'). Con `from_store`, las
+    columnas ya interpretadas se toman del almacén de características (`feature_store.py`):
+    primero se agregan las filas nuevas o cambiadas y luego se limpia su último snapshot, o
+    el snapshot de `as_of` (sin actualizar) para reconstruir un dataset anterior.
+    """
+    config = VARIANTS[variant]
+    print(f"Iniciando la limpieza '{variant}'...")
+    snapshot = None
+    if from_store:
+        # Importación diferida: feature_store importa este módulo
+        from feature_store import FeatureStore, update_variant
+        try:
+            if as_of is None:
+                stats = update_variant(variant)
+                print(f"Almacén de características actualizado: {stats['nuevas_o_cambiadas']:,} subastas nuevas "
+                      f"o cambiadas ({stats['filas']:,} filas revisadas).")
+            parsed, snapshot = FeatureStore(variant).snapshot(as_of)
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+            return None
+        print(f"Snapshot del lote {snapshot['batch']} ({snapshot['ingested_at']}): {snapshot['rows']:,} subastas.")
+        df_final, imputer = finish(parsed, config['columns'], impute=config.get('impute'))
+    else:
+        try:
+            raw_df = read_source(config['input'], config['columns'])
+            print(f"Cargado exitosamente: {config['input']}")
+        except FileNotFoundError:
+            print(f"Error: No se encontró el archivo {config['input']}. Asegúrate de que el archivo exista.")
+            return None
+        df_final, imputer = clean(raw_df, config['columns'], impute=config.get('impute'))
+
+    print("Guardando datos limpios...")
+    write_table(df_final, config['output'], export_csv=export_csv)
+    # Medianas de imputación, para aplicar la misma limpieza a subastas nuevas al predecir
+    imputer.save(config['imputer'])
+    # De qué snapshot del almacén sale el dataset (lo registra train_model.py en la metadata del modelo)
+    if snapshot is not None:
+        with open(config['snapshot'], 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+    else:
+        config['snapshot'].unlink(missing_ok=True)
+
+    memory_mb = df_final.memory_usage(deep=True).sum() / 1e6
+    print(f"¡Limpieza completada! Archivo guardado en: {config['output']}")
+    print(f"Dimensiones del dataframe final: {df_final.shape} ({memory_mb:.2f} MB en memoria)")
+    return df_final
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Limpia los datos para el modelo según el esquema de columnas.")
+    parser.add_argument('--variant', choices=[*VARIANTS, 'all'], default='all',
+                        help="Dataset a generar (por defecto, ambos).")
+    parser.add_argument('--csv', action='store_true', help="Además del Parquet, exporta una copia CSV.")
+    parser.add_argument('--from-store', action='store_true',
+                        help="Usa el almacén de características (sólo interpreta las filas nuevas o cambiadas).")
+    parser.add_argument('--as-of', default=None,
+                        help="Con --from-store, limpia el snapshot de esa fecha ISO (sin actualizar el almacén).")
+    args = parser.parse_args()
+    for variant in (VARIANTS if args.variant == 'all' else [args.variant]):
+        run_variant(variant, export_csv=args.csv, from_store=args.from_store, as_of=args.as_of)
+
+
+if __name__ == '__main__':
+    main()
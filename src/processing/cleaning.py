@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+Funciones de limpieza vectorizadas, compartidas por `data_cleaner.py` y `data_cleaner_open_ai.py`.
+
+Cada función recibe una columna completa (Series) y devuelve la columna limpia, con el
+mismo resultado que las funciones anteriores por celda (`limpiar_valor_monetario`,
+`limpiar_kilometraje`, `limpiar_booleano`, `contar_pujas`) pero sin llamar a Python
+por cada fila: usan las operaciones `Series.str` (regex sobre toda la columna) y
+`pd.to_numeric` una sola vez. Ver `benchmark_cleaning.py`.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype, is_bool_dtype, is_object_dtype, is_string_dtype
+
+# Un historial de ofertas es una lista JSON de objetos planos, generada por el scraper con
+# json.dumps: '[{"usuario": ...}, {"usuario": ...}]'. Los objetos van separados por '}, {'.
+BID_SEPARATOR_PATTERN = r'\}, \{'
+
+
+
+def _text_mask(series: pd.Series) -> pd.Series:
+    """True donde el valor es un string."""
+    if is_object_dtype(series.dtype):
+        inferred = infer_dtype(series, skipna=True)
+        if inferred in ('string', 'empty'):
+            return series.notna()
+        if inferred != 'mixed':
+            return pd.Series(False, index=series.index)
+        # Columna mixta (ej. texto y booleanos): se revisa el tipo de cada valor
+        return series.map(type, na_action='ignore').eq(str)
+    if is_string_dtype(series.dtype):
+        return series.notna()
+    return pd.Series(False, index=series.index)
+
+
+def parse_digits(series: pd.Series, as_text: bool = False) -> pd.Series:
+    """
+    Extrae sólo los dígitos de cada string y los convierte a número (ej. '$1.234.567' -> 1234567).
+    Los valores que no son texto se convierten directamente con `pd.to_numeric`; lo que
+    no se pueda convertir queda como NaN. Con `as_text=True`, todos los valores se tratan
+    como texto (igual que `limpiar_valor_monetario(str(x))`: 3.605 -> 3605).
+    """
+    if as_text:
+        series = series.astype(str)
+    text = _text_mask(series)
+    if not text.any():
+        return pd.to_numeric(series, errors='coerce')
+
+    digits = series.where(text).astype('str').str.replace(r'\D', '', regex=True)
+    parsed = pd.to_numeric(digits, errors='coerce')
+    if not text.all():
+        parsed = parsed.where(text, pd.to_numeric(series.where(~text), errors='coerce'))
+    return parsed
+
+
+def parse_km(series: pd.Series) -> pd.Series:
+    """Como `parse_digits`, pero 'NO REGISTRA' (sin importar mayúsculas) queda como NaN."""
+    parsed = parse_digits(series)
+    text = _text_mask(series)
+    if text.any():
+        no_registra = series.where(text).astype('str').str.contains('no registra', case=False, regex=False)
+        parsed = parsed.mask(no_registra.fillna(False).astype(bool))
+    return parsed
+
+
+def parse_bool(series: pd.Series) -> pd.Series:
+    """
+    Convierte 'True'/'False' (en cualquier combinación de mayúsculas) y booleanos a 1/0.
+    Los nulos y valores no reconocidos se asumen 0 (Falso).
+    """
+    if is_bool_dtype(series.dtype):
+        return series.fillna(False).astype(np.int8)
+    if is_object_dtype(series.dtype) and infer_dtype(series, skipna=True) == 'boolean':
+        # Booleanos con nulos (ej. columnas True/False/vacío leídas del CSV)
+        return series.eq(True).astype(np.int8)
+    result = pd.Series(np.zeros(len(series), dtype=np.int8), index=series.index)
+    text = _text_mask(series)
+    if text.any():
+        result[series.where(text).astype('str').str.lower().eq('true').fillna(False).astype(bool)] = 1
+    if is_object_dtype(series.dtype):
+        # Booleanos de Python mezclados con texto o nulos (ej. columnas leídas de JSON)
+        result[series.map(type, na_action='ignore').eq(bool) & series.eq(True)] = 1
+    return result
+
+
+def count_bids(series: pd.Series) -> pd.Series:
+    """
+    Cuenta las ofertas de cada historial (lista JSON) sin decodificar el JSON: en una lista
+    de objetos '[{...}, {...}]' hay un objeto más que separadores '}, {'. Los historiales
+    que no tienen esa forma se decodifican con `json.loads`; los inválidos o nulos cuentan 0.
+    """
+    text = _text_mask(series)
+    values = series.where(text).astype('str').str.strip()
+    object_list = (values.str.startswith('[{') & values.str.endswith('}]')).fillna(False).astype(bool)
+    empty_list = values.eq('[]').fillna(False).astype(bool)
+
+    counts = pd.Series(np.zeros(len(series), dtype=np.int64), index=series.index)
+    if object_list.any():
+        counts[object_list] = values[object_list].str.count(BID_SEPARATOR_PATTERN).astype(np.int64) + 1
+    # Casos que el conteo rápido no cubre (ej. listas de otros valores o JSON inválido)
+    slow = text & ~object_list & ~empty_list
+    if slow.any():
+        counts[slow] = [_count_bids_json(value) for value in series[slow]]
+    return counts
+
+
+def _count_bids_json(json_str) -> int:
+    try:
+        return len(json.loads(json_str))
+    except (json.JSONDecodeError, TypeError):
+        return 0
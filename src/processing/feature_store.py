@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+"""
+Almacén de características por subasta, con actualización incremental.
+
+`clean_pipeline.py` vuelve a interpretar todo el historial en cada ejecución (montos,
+kilometraje, historial de ofertas en JSON, campos de la IA...), aunque sólo hayan llegado
+unas pocas subastas nuevas. `FeatureStore` guarda esas columnas ya interpretadas
+(`clean_pipeline.parse_source`) y en cada `update` sólo interpreta las filas nuevas o
+cambiadas: el costo crece con las subastas agregadas, no con el historial.
+
+- Cada fila de entrada se identifica por su subasta (`placa`, `detail_url`) y un hash de
+  sus columnas de entrada: un auto que se vuelve a subastar con otra URL conserva sus
+  subastas anteriores, igual que en `clean_pipeline.py` (que se queda con la última captura
+  de cada `detail_url`). Las filas sin URL se identifican sólo por la placa. Si la subasta
+  no existe o el hash cambió, la fila se interpreta y se agrega en un lote
+  nuevo (`part-<lote>.parquet`). Los lotes nunca se modifican. Como el scraper sólo agrega
+  filas, el manifiesto recuerda hasta qué fila se leyó la entrada y la siguiente
+  actualización sólo compara las posteriores.
+- La carpeta del almacén lleva la versión de la definición de las columnas (fuente, parser
+  y código de los parsers): si cambia la forma de interpretar una columna, se usa una
+  carpeta nueva y el primer `update` recalcula todo.
+- `snapshot(as_of)` arma la vista de un momento: la última versión de cada subasta entre
+  los lotes ingresados hasta `as_of` (por defecto, todos); `vehicle(placa, as_of)` filtra
+  las subastas de un auto. Entrenar y puntuar con el mismo
+  `as_of` ve exactamente los mismos datos aunque después lleguen subastas nuevas.
+
+La imputación y las características derivadas (`antiguedad`, `km_por_año`,
+`ratio_oferta_inicial`) dependen de las medianas de todo el dataset o del modelo, así que
+no se guardan: se calculan sobre el snapshot con `clean_pipeline.finish` (operaciones
+vectorizadas, baratas frente a interpretar el texto).
+
+Uso:
+    python src/processing/feature_store.py [--variant basic|enriched|all]
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+import cleaning
+from clean_pipeline import (DEDUP_KEY, PARSERS, PROJECT_ROOT, SCHEMA, VARIANTS, latest_captures, parse_source,
+                            read_source, required_columns)
+from storage import read_table, write_table
+
+FEATURES_DIR = PROJECT_ROOT / 'data' / 'features'
+ENTITY_KEY = 'placa'
+# Cada fila del almacén es una subasta: un mismo auto (placa) puede tener varias
+ROW_KEY = [ENTITY_KEY, DEDUP_KEY]
+# Columnas internas de cada lote
+ROW_HASH = '_row_hash'
+BATCH = '_batch'
+
+
+def definition_version(columns: list) -> str:
+    """Hash de cómo se obtiene cada columna: fuente, parser y código de los parsers."""
+    payload = {
+        'columns': {name: [SCHEMA[name].get('source', name), SCHEMA[name]['parser'],
+                           inspect.getsource(PARSERS[SCHEMA[name]['parser']]).strip()] for name in columns},
+        'cleaning': inspect.getsource(cleaning),
+        'row_key': ROW_KEY,
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def _row_keys(df: pd.DataFrame) -> pd.Index:
+    """Clave de cada fila: 'placa' + '\0' + 'detail_url' (vacía si la fila no tiene URL)."""
+    urls = df[DEDUP_KEY].astype(object).where(df[DEDUP_KEY].notna(), '') if DEDUP_KEY in df.columns else ''
+    return pd.Index(df[ENTITY_KEY].astype(str) + '\0' + pd.Series(urls, index=df.index).astype(str))
+
+
+def _parse_time(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+class FeatureStore:
+    """Columnas interpretadas de una variante ('basic' o 'enriched'); ver el docstring del módulo."""
+
+    def __init__(self, variant: str, root: Path = FEATURES_DIR):
+        self.variant = variant
+        self.columns = required_columns([*VARIANTS[variant]['columns'], ENTITY_KEY, DEDUP_KEY])[0]
+        self.sources = [SCHEMA[name].get('source', name) for name in self.columns]
+        self.version = definition_version(self.columns)
+        self.directory = Path(root) / variant / self.version
+        self.manifest_path = self.directory / 'manifest.json'
+
+    def _manifest(self) -> dict:
+        if not self.manifest_path.is_file():
+            return {'batches': [], 'checkpoint': None}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def batches(self) -> list:
+        """Lotes ingresados, en orden: [{batch, ingested_at, rows, file}, ...]."""
+        return self._manifest()['batches']
+
+    def checkpoint(self) -> dict:
+        """Hasta dónde se leyó la tabla de entrada: {rows, last_row_hash} (None si nunca)."""
+        return self._manifest().get('checkpoint')
+
+    def _write_manifest(self, batches: list, checkpoint: dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'variant': self.variant, 'definition_version': self.version, 'columns': self.columns,
+                       'checkpoint': checkpoint, 'batches': batches}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _row_hashes(self, raw_df: pd.DataFrame) -> pd.Series:
+        sources = [source for source in dict.fromkeys(self.sources) if source in raw_df.columns]
+        return pd.util.hash_pandas_object(raw_df[sources].astype(object), index=False).astype('int64')
+
+    def _known_hashes(self) -> pd.Series:
+        """Hash de la última versión guardada de cada subasta (sólo se leen tres columnas de cada lote)."""
+        parts = [read_table(self.directory / batch['file'], columns=[*ROW_KEY, ROW_HASH]) for batch in self.batches()]
+        if not parts:
+            return pd.Series(dtype='int64')
+        known = pd.concat(parts, ignore_index=True).drop_duplicates(ROW_KEY, keep='last')
+        return pd.Series(known[ROW_HASH].to_numpy(), index=_row_keys(known))
+
+    def update(self, raw_df: pd.DataFrame, checkpoint: dict = None) -> dict:
+        """
+        Interpreta y guarda las filas de `raw_df` nuevas o cambiadas (puede ser el historial
+        completo o sólo las capturas nuevas). `checkpoint` se guarda con el manifiesto (ver
+        `update_variant`). Devuelve {filas (revisadas), nuevas_o_cambiadas, sin_placa, lote, segundos};
+        `lote` es None si no había nada que agregar.
+        """
+        start = time.perf_counter()
+        raw_df = latest_captures(raw_df)
+        without_key = int(raw_df[ENTITY_KEY].isna().sum())
+        # Las filas sin URL de una misma placa no se distinguen entre sí: queda la última
+        raw_df = raw_df[raw_df[ENTITY_KEY].notna()]
+        raw_df = raw_df.drop_duplicates(subset=[key for key in ROW_KEY if key in raw_df.columns], keep='last')
+
+        hashes = self._row_hashes(raw_df).to_numpy()
+        plates = raw_df[ENTITY_KEY].astype(str).to_numpy()
+        known = self._known_hashes()
+        # Posición de cada subasta entre las guardadas (-1 si es nueva): una sola búsqueda en el índice
+        positions = known.index.get_indexer(_row_keys(raw_df))
+        seen = positions >= 0
+        changed = ~seen
+        changed[seen] = known.to_numpy()[positions[seen]] != hashes[seen]
+
+        batch = None
+        batches = self.batches()
+        if changed.any():
+            batch = batches[-1]['batch'] + 1 if batches else 1
+            delta = parse_source(raw_df[changed], self.columns)
+            delta[ENTITY_KEY] = plates[changed]
+            delta[ROW_HASH] = hashes[changed]
+            delta[BATCH] = batch
+            file_name = f'part-{batch:05d}.parquet'
+            write_table(delta.reset_index(drop=True), self.directory / file_name)
+            batches = [*batches, {'batch': batch, 'ingested_at': datetime.now().isoformat(timespec='seconds'),
+                                  'rows': int(changed.sum()), 'file': file_name}]
+        # El manifiesto se escribe al final: un lote sin registrar no forma parte de ningún snapshot
+        if batch is not None or checkpoint is not None:
+            self._write_manifest(batches, checkpoint)
+        return {'filas': len(raw_df), 'nuevas_o_cambiadas': int(changed.sum()), 'sin_placa': without_key,
+                'lote': batch, 'segundos': time.perf_counter() - start}
+
+    def snapshot(self, as_of=None) -> tuple:
+        """
+        Columnas interpretadas de cada subasta tal como estaban en `as_of` (fecha ISO o
+        datetime; por defecto, el último lote). Devuelve (DataFrame, info del snapshot).
+        Lanza FileNotFoundError si no hay lotes hasta esa fecha.
+        """
+        batches = [batch for batch in self.batches()
+                   if as_of is None or _parse_time(batch['ingested_at']) <= _parse_time(as_of)]
+        if not batches:
+            until = f" hasta {as_of}" if as_of else ""
+            raise FileNotFoundError(f"El almacén de características '{self.variant}' no tiene lotes{until}: "
+                                    f"{self.directory}. Actualízalo con src/processing/feature_store.py.")
+        df = pd.concat([read_table(self.directory / batch['file']) for batch in batches], ignore_index=True)
+        df = df.drop_duplicates(ROW_KEY, keep='last').drop(columns=[ROW_HASH, BATCH]).reset_index(drop=True)
+        info = {'variant': self.variant, 'definition_version': self.version, 'batch': batches[-1]['batch'],
+                'ingested_at': batches[-1]['ingested_at'], 'rows': len(df)}
+        return df, info
+
+    def vehicle(self, placa: str, as_of=None) -> pd.DataFrame:
+        """Subastas de un auto (`placa`) en el snapshot de `as_of`, de la más antigua a la más reciente."""
+        df, _ = self.snapshot(as_of)
+        return df[df[ENTITY_KEY] == placa].reset_index(drop=True)
+
+
+def update_variant(variant: str) -> dict:
+    """
+    Actualiza el almacén de una variante con su dataset de entrada (`VARIANTS[variant]['input']`).
+    El scraper sólo agrega filas al final de la tabla, así que si la última fila leída la vez
+    anterior sigue en su lugar, sólo se comparan las filas posteriores; si no (la tabla se
+    regeneró), se comparan todas.
+    """
+    store = FeatureStore(variant)
+    start = time.perf_counter()
+    raw_df = read_source(VARIANTS[variant]['input'], store.columns)
+    read_seconds = time.perf_counter() - start
+
+    checkpoint = store.checkpoint()
+    new_rows = raw_df
+    if checkpoint and 0 < checkpoint['rows'] <= len(raw_df):
+        last_row = raw_df.iloc[[checkpoint['rows'] - 1]]
+        if int(store._row_hashes(last_row).iloc[0]) == checkpoint['last_row_hash']:
+            new_rows = raw_df.iloc[checkpoint['rows']:]
+    last_hash = int(store._row_hashes(raw_df.iloc[[-1]]).iloc[0]) if len(raw_df) else None
+    stats = store.update(new_rows, checkpoint={'rows': len(raw_df), 'last_row_hash': last_hash})
+    stats['segundos_lectura'] = read_seconds
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Actualiza el almacén de características con las filas nuevas o cambiadas.")
+    parser.add_argument('--variant', choices=[*VARIANTS, 'all'], default='all',
+                        help="Almacén a actualizar (por defecto, ambos).")
+    args = parser.parse_args()
+    for variant in (VARIANTS if args.variant == 'all' else [args.variant]):
+        try:
+            stats = update_variant(variant)
+        except FileNotFoundError as e:
+            print(f"[{variant}] Error: {e}")
+            continue
+        batch = f"lote {stats['lote']}" if stats['lote'] else "sin cambios"
+        print(f"[{variant}] {stats['filas']:,} filas revisadas, {stats['nuevas_o_cambiadas']:,} subastas nuevas "
+              f"o cambiadas ({batch}) en {stats['segundos']:.2f} s (+{stats['segundos_lectura']:.2f} s de lectura).")
+        if stats['sin_placa']:
+            print(f"[{variant}] {stats['sin_placa']:,} filas sin placa no se guardaron.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+"""
+Imputación de nulos por medianas de grupo con niveles de respaldo, ajustable y persistente.
+
+Cada columna tiene una regla:
+- 'median':                         mediana global.
+- {'median_by': [['año', 'marca'], ['año']]}: mediana del grupo más específico que tenga
+  datos (año+marca, si no año) y, si ninguno tiene, la mediana global.
+- un valor fijo (ej. 0).
+
+`fit` calcula todas las medianas una sola vez con agregaciones de pandas (sin funciones
+Python por grupo) y `transform` rellena los nulos buscando la mediana de cada fila en un
+índice por grupo. Las medianas se guardan en JSON (`save`/`load`) para aplicar exactamente
+la misma imputación a subastas nuevas al predecir, sin recalcular sobre todo el historial.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def _key_frame(df: pd.DataFrame, keys: list) -> pd.DataFrame:
+    """Columnas de agrupación con sus valores simples (las categorías se comparan por valor)."""
+    return pd.DataFrame({key: np.asarray(df[key], dtype=object) for key in keys}, index=df.index)
+
+
+class Imputer:
+    """Rellena nulos según `rules` ({columna: regla}); ver el docstring del módulo."""
+
+    def __init__(self, rules: dict):
+        self.rules = rules
+        self.medians = {}
+
+    def fit(self, df: pd.DataFrame) -> 'Imputer':
+        self.medians = {}
+        for column, rule in self.rules.items():
+            if column not in df.columns or not self._uses_median(rule):
+                continue
+            values = pd.to_numeric(df[column], errors='coerce')
+            fitted = {'global': None if values.isna().all() else float(values.median()), 'levels': []}
+            for keys in self._levels(rule):
+                if not all(key in df.columns for key in keys):
+                    continue
+                grouped = values.groupby([_key_frame(df, keys)[key] for key in keys]).median().dropna()
+                fitted['levels'].append({'keys': list(keys), 'medians': grouped})
+            self.medians[column] = fitted
+        return self
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Devuelve una copia de `df` con los nulos de las columnas con regla rellenados."""
+        df = df.copy()
+        for column, rule in self.rules.items():
+            if column not in df.columns:
+                continue
+            if not self._uses_median(rule):
+                df[column] = df[column].fillna(rule)
+                continue
+            fitted = self.medians.get(column)
+            if fitted is None:
+                raise ValueError(f"La columna '{column}' no fue ajustada (llamar a fit o load antes).")
+            values = df[column]
+            for level in fitted['levels']:
+                missing = values.isna()
+                if not missing.any():
+                    break
+                if not all(key in df.columns for key in level['keys']):
+                    continue
+                keys = _key_frame(df.loc[missing], level['keys'])
+                lookup = pd.MultiIndex.from_frame(keys) if len(level['keys']) > 1 else pd.Index(keys.iloc[:, 0])
+                filled = level['medians'].reindex(lookup).to_numpy()
+                values = values.fillna(pd.Series(filled, index=keys.index))
+            if fitted['global'] is not None:
+                values = values.fillna(fitted['global'])
+            df[column] = values
+        return df
+
+    def fit_transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.fit(df).transform(df)
+
+    # --- Persistencia ---
+    def to_dict(self) -> dict:
+        medians = {}
+        for column, fitted in self.medians.items():
+            medians[column] = {
+                'global': fitted['global'],
+                'levels': [{'keys': level['keys'],
+                            'medians': [[list(key) if isinstance(key, tuple) else [key], value]
+                                        for key, value in level['medians'].items()]}
+                           for level in fitted['levels']],
+            }
+        return {'rules': self.rules, 'medians': medians}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Imputer':
+        imputer = cls(data['rules'])
+        for column, fitted in data['medians'].items():
+            levels = []
+            for level in fitted['levels']:
+                keys = [tuple(key) if len(key) > 1 else key[0] for key, _ in level['medians']]
+                index = (pd.MultiIndex.from_tuples(keys, names=level['keys']) if len(level['keys']) > 1
+                         else pd.Index(keys, name=level['keys'][0], dtype=object))
+                medians = pd.Series([value for _, value in level['medians']], index=index, dtype='float64')
+                levels.append({'keys': level['keys'], 'medians': medians})
+            imputer.medians[column] = {'global': fitted['global'], 'levels': levels}
+        return imputer
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=1, default=_json_default)
+        return path
+
+    @classmethod
+    def load(cls, path) -> 'Imputer':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    @staticmethod
+    def _uses_median(rule) -> bool:
+        return rule == 'median' or isinstance(rule, dict)
+
+    @staticmethod
+    def _levels(rule) -> list:
+        return rule.get('median_by', []) if isinstance(rule, dict) else []
+
+
+def _json_default(value):
+    """Convierte los escalares de numpy (ej. años int16 en las claves) a tipos de JSON."""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
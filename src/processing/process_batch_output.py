@@ -2,28 +2,87 @@
 
 """
 Script para procesar los resultados de un batch de OpenAI, extraer la información
-estructurada y unirla con un archivo CSV existente para crear un dataset enriquecido.
+estructurada y unirla con los datos crudos del scraper para crear un dataset enriquecido
+(`data/processed/karcal_data_processed.parquet`, con copia CSV opcional).
+
+Los archivos de salida del batch se leen en streaming (línea a línea, con `orjson` si
+está instalado), de modo que la memoria no depende de cuántos batches se procesen:
+- Cada respuesta válida se escribe en `batch_responses.parquet` en lotes de registros.
+- Cada respuesta se valida y se convierte a los tipos del esquema al leerla, reparando los
+  defectos comunes (ver `response_schema.py`); se guarda ya normalizada.
+- Cada línea con errores se escribe en `batch_errors.jsonl` en vez de acumularse en memoria,
+  y los `custom_id` de las respuestas que no se pudieron reparar (y que tampoco tienen otra
+  respuesta válida) quedan en `batch_requeue.txt`, para reenviar sólo esos trozos
+  (`online_inference.py --requeue`).
+- Las respuestas se combinan por vehículo a medida que se leen (ver `chunk_reducer.py`).
+- Las respuestas de tareas registradas en la caché de inferencia (`src/inference/result_cache.py`)
+  se guardan en ella, y las respuestas en caché de los trozos que no vinieron en estos
+  archivos se combinan con las nuevas: así un batch con sólo los vehículos nuevos basta
+  para regenerar el dataset completo.
+- Los campos que resuelven las reglas sobre los textos de `reports/txt_prompts`
+  (`src/inference/rule_extractor.py`) reemplazan a los del modelo; los vehículos que las
+  reglas resuelven por completo no necesitan respuesta del modelo.
 """
 
+import argparse
 import json
 import pandas as pd
 from pathlib import Path
 import re
+import sys
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional: se usa el módulo json estándar
+    orjson = None
+
+from chunk_reducer import ChunkReducer, parse_custom_id
+from response_schema import ResponseDecoder, ResponseError
+from storage import read_table, table_exists, write_table
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'inference'))
+from batch_tasks import input_folder_path, load_prompt_from_file, prompt_file_path, read_text_file  # noqa: E402
+from result_cache import CACHE_PATH, ResultCache  # noqa: E402
+from rule_extractor import apply_rules, extract_fields, reference_date  # noqa: E402
 
 # --- 1. CONFIGURACIÓN DE RUTAS ---
 # El script está en 'src/processing/', así que subimos DOS niveles para llegar a la raíz.
 PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
-# --- ¡IMPORTANTE! MODIFICA ESTA LÍNEA CON EL NOMBRE DE TU ARCHIVO DE SALIDA ---
-# Asegúrate de que este archivo esté en la carpeta 'data/batch_output_procesados/'
-# Por tu captura de pantalla, parece que el archivo se llama 'batch_688d09996e...'
-batch_output_file = 'batch_688d09996e208190baccb01eb575491e_output.jsonl' #<-- CAMBIA ESTO
-# --- Rutas a los archivos de entrada y salida ---
-# --------------------------------------------------------------------------------
+# Patrón de los archivos de salida del batch dentro de 'data/batch_output_procesados/'.
+# Se procesan todos los que coincidan (ej. 'batch_688d09996e..._output.jsonl').
+BATCH_OUTPUT_GLOB = 'batch_*_output.jsonl'
 
 # Rutas a los archivos de entrada y salida
-RAW_CSV_PATH = PROJECT_ROOT / 'data' / 'raw' / 'karcal_data_raw.csv'
-BATCH_JSONL_PATH = PROJECT_ROOT / 'data' / 'batch_output_procesados' / batch_output_file
-PROCESSED_CSV_PATH = PROJECT_ROOT / 'data' / 'processed' / 'karcal_data_processed.csv'
+RAW_DATA_PATH = PROJECT_ROOT / 'data' / 'raw' / 'karcal_data_raw.parquet'
+BATCH_OUTPUT_DIR = PROJECT_ROOT / 'data' / 'batch_output_procesados'
+PROCESSED_DATA_PATH = PROJECT_ROOT / 'data' / 'processed' / 'karcal_data_processed.parquet'
+RESPONSES_PARQUET_PATH = PROJECT_ROOT / 'data' / 'processed' / 'batch_responses.parquet'
+ERRORS_JSONL_PATH = PROJECT_ROOT / 'data' / 'processed' / 'batch_errors.jsonl'
+REQUEUE_PATH = PROJECT_ROOT / 'data' / 'processed' / 'batch_requeue.txt'
+# Caché de respuestas de inferencia (la misma que usa run_batch_inference.py)
+INFERENCE_CACHE_PATH = CACHE_PATH
+
+# Número de respuestas que se acumulan antes de escribir un lote en Parquet
+RECORD_BATCH_SIZE = 10_000
+
+RESPONSES_SCHEMA = pa.schema([
+    ('source_file', pa.string()),
+    ('line', pa.int64()),
+    ('custom_id', pa.string()),
+    ('placa', pa.string()),
+    ('chunk', pa.int32()),
+    ('content', pa.string()),  # JSON de la respuesta, validado y normalizado según el esquema
+    ('prompt_tokens', pa.int64()),
+    ('completion_tokens', pa.int64()),
+])
+
+
+def json_loads(data):
+    """Decodifica JSON desde str o bytes, con orjson si está disponible."""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
 
 
 def flatten_json(nested_json: dict) -> dict:
@@ -45,98 +104,274 @@ def flatten_json(nested_json: dict) -> dict:
     flatten(nested_json)
     return out
 
-def process_and_extend_data():
+
+def batch_id_from_filename(batch_file: Path):
+    """'batch_688d..._output.jsonl' -> 'batch_688d...' (id del batch en OpenAI), o None."""
+    match = re.match(r'(batch_[A-Za-z0-9]+)_output', batch_file.name)
+    return match.group(1) if match else None
+
+
+def parse_batch_line(line, decoder: ResponseDecoder = None):
+    """
+    Extrae de una línea del archivo de salida del batch el `custom_id`, el JSON de la
+    respuesta (normalizado, como texto), el JSON decodificado con los tipos del esquema y
+    el uso de tokens. Lanza ResponseError (con el `custom_id`, si se conoce) si la línea o
+    la respuesta no se pueden reparar.
+    """
+    try:
+        line_data = json_loads(line)
+    except ValueError as e:
+        raise ResponseError(f"Línea JSON inválida: {e}") from None
+
+    if not isinstance(line_data, dict):
+        raise ResponseError("La línea no es un objeto JSON.")
+    custom_id = line_data.get('custom_id', '')
+    if not custom_id or not isinstance(custom_id, str):
+        raise ResponseError("No se pudo obtener 'custom_id'.")
+
+    # Navegar la estructura para obtener la respuesta de la IA; cada nivel debe ser un objeto
+    response = line_data.get('response') or {}
+    body = response.get('body') or {} if isinstance(response, dict) else None
+    if not isinstance(body, dict):
+        raise ResponseError("'response.body' no es un objeto JSON.", custom_id)
+    choices = body.get('choices') or [{}]
+    choice = choices[0] if isinstance(choices, list) else None
+    message = choice.get('message') or {} if isinstance(choice, dict) else None
+    if not isinstance(message, dict):
+        raise ResponseError("'choices[0].message' no es un objeto JSON.", custom_id)
+    response_content_str = message.get('content')
+    if not response_content_str or not isinstance(response_content_str, str):
+        raise ResponseError("No se encontró contenido en la respuesta.", custom_id)
+
+    # Validar y convertir los tipos del JSON (puede venir dentro de un bloque markdown o con texto extra)
+    ai_data = (decoder or ResponseDecoder()).decode(response_content_str, custom_id)
+    usage = body.get('usage') if isinstance(body.get('usage'), dict) else {}
+    return custom_id, json.dumps(ai_data, ensure_ascii=False), ai_data, usage
+
+
+class ResponseWriter:
+    """Escribe las respuestas en un archivo Parquet por lotes de `batch_size` registros."""
+
+    def __init__(self, path: Path, batch_size: int = RECORD_BATCH_SIZE):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._writer = pq.ParquetWriter(path, RESPONSES_SCHEMA, compression='zstd')
+        self._batch_size = batch_size
+        self._buffer = {name: [] for name in RESPONSES_SCHEMA.names}
+        self.rows = 0
+
+    def write(self, **record):
+        for name, values in self._buffer.items():
+            values.append(record.get(name))
+        if len(self._buffer['custom_id']) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer['custom_id']:
+            self._writer.write_batch(pa.record_batch(self._buffer, schema=RESPONSES_SCHEMA))
+            self.rows += len(self._buffer['custom_id'])
+            self._buffer = {name: [] for name in RESPONSES_SCHEMA.names}
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+
+def process_batch_files(batch_files, responses_path=RESPONSES_PARQUET_PATH, errors_path=ERRORS_JSONL_PATH,
+                        cache=None):
+    """
+    Lee en streaming los archivos de salida del batch. Escribe las respuestas en Parquet
+    y los errores en JSONL, y devuelve (ChunkReducer con una respuesta combinada por
+    vehículo, número de respuestas válidas, número de errores, custom_ids a reenviar).
+
+    Las respuestas se validan con el esquema de `response_schema.py`. Se reenvían los
+    trozos cuya respuesta no se pudo reparar y que no tienen otra respuesta válida (en
+    estos archivos o, con `cache`, en la caché).
+
+    Con `cache` (ResultCache), sólo se usan las respuestas del batch vigente de cada tarea
+    (el registrado en la caché): las de un batch reemplazado o de un texto o troceo anterior
+    se anotan como obsoletas en el archivo de errores, sin combinarse ni reenviarse. Las
+    respuestas vigentes se guardan en la caché, y se agregan al reductor las respuestas en
+    caché de las tareas actuales que no vinieron en `batch_files`.
+    """
+    reducer = ChunkReducer()
+    decoder = ResponseDecoder()
+    seen_ids = set()
+    failed_ids = set()
+    n_errors = n_cached = n_stale = 0
+    errors_path.parent.mkdir(parents=True, exist_ok=True)
+    writer = ResponseWriter(responses_path)
+    try:
+        with open(errors_path, 'w', encoding='utf-8') as errors_file:
+            def log_error(source, line_number, error):
+                nonlocal n_errors
+                n_errors += 1
+                custom_id = getattr(error, 'custom_id', None)
+                if custom_id:
+                    failed_ids.add(custom_id)
+                errors_file.write(json.dumps({'source_file': source, 'line': line_number, 'custom_id': custom_id,
+                                              'error': str(error)}, ensure_ascii=False) + '\n')
+
+            def log_if_stale(source, line_number, custom_id, batch_id) -> bool:
+                """Anota (sin reenviarla) la respuesta que no es del batch vigente de su tarea."""
+                nonlocal n_stale
+                if cache is None:
+                    return False
+                registered = cache.registered(custom_id)
+                if registered is not None and batch_id and registered[1] == batch_id:
+                    return False
+                n_stale += 1
+                errors_file.write(json.dumps({'source_file': source, 'line': line_number, 'custom_id': custom_id,
+                                              'error': "Respuesta obsoleta: no es del batch vigente de la tarea.",
+                                              'stale': True}, ensure_ascii=False) + '\n')
+                return True
+
+            for batch_file in batch_files:
+                print(f"🤖 Procesando el archivo de batch: {batch_file.name}")
+                batch_id = batch_id_from_filename(batch_file)
+                with open(batch_file, 'rb') as f:
+                    for i, line in enumerate(f, 1):
+                        if not line.strip():
+                            continue
+                        try:
+                            custom_id, content, ai_data, usage = parse_batch_line(line, decoder)
+                        except ResponseError as e:
+                            if not (e.custom_id and log_if_stale(batch_file.name, i, e.custom_id, batch_id)):
+                                log_error(batch_file.name, i, e)
+                            continue
+
+                        # Respuesta de un batch reemplazado o de un texto/troceo anterior: no se combina
+                        if log_if_stale(batch_file.name, i, custom_id, batch_id):
+                            continue
+                        if cache is not None:
+                            cache.store_response(custom_id, content, batch_id)
+
+                        # Acumular la respuesta del trozo junto a las demás del mismo vehículo
+                        vehicle_id, chunk = parse_custom_id(custom_id)
+                        reducer.add(custom_id, ai_data)
+                        seen_ids.add(custom_id)
+                        writer.write(source_file=batch_file.name, line=i, custom_id=custom_id,
+                                     placa=vehicle_id, chunk=chunk, content=content,
+                                     prompt_tokens=usage.get('prompt_tokens'),
+                                     completion_tokens=usage.get('completion_tokens'))
+
+            if n_stale:
+                print(f"🕰️ Se descartaron {n_stale} respuestas obsoletas (de un batch reemplazado o de un "
+                      f"texto anterior).")
+            if cache is not None:
+                cache.commit()
+                # Completar con las respuestas en caché de los trozos que no vinieron en estos archivos
+                # (las guardadas antes de validar con el esquema se validan aquí)
+                for custom_id, content in cache.current_results():
+                    if custom_id in seen_ids:
+                        continue
+                    try:
+                        reducer.add(custom_id, decoder.decode(content, custom_id))
+                    except ResponseError as e:
+                        log_error('cache', None, e)
+                        continue
+                    seen_ids.add(custom_id)
+                    n_cached += 1
+                if n_cached:
+                    print(f"🗄️ Se agregaron {n_cached} respuestas desde la caché de inferencia.")
+    finally:
+        writer.close()
+
+    if decoder.repairs:
+        detail = ', '.join(f"{kind}: {count}" for kind, count in decoder.repairs.most_common())
+        print(f"🩹 Reparaciones al validar las respuestas: {detail}.")
+    return reducer, writer.rows, n_errors, sorted(failed_ids - seen_ids)
+
+
+def add_rule_fields(ai_results: dict, texts_dir: Path = input_folder_path) -> tuple:
+    """
+    Pone los campos que resuelven las reglas por encima de las respuestas del modelo
+    ({patente: JSON combinado}). Devuelve (resultados, número de vehículos con campos de reglas).
+    """
+    today = reference_date(load_prompt_from_file(prompt_file_path))
+    results = dict(ai_results)
+    n_vehicles = 0
+    for txt_file in sorted(texts_dir.glob('*.txt')):
+        texto = read_text_file(txt_file)
+        values = extract_fields(texto, txt_file.stem, today) if texto is not None else {}
+        if values:
+            results[txt_file.stem] = apply_rules(results.get(txt_file.stem, {}), values)
+            n_vehicles += 1
+    return results, n_vehicles
+
+
+def process_and_extend_data(batch_glob=BATCH_OUTPUT_GLOB, export_csv=False):
     """
     Función principal que lee, procesa, une y guarda los datos.
     """
     print("🚀 Iniciando el proceso de enriquecimiento de datos...")
 
-    # --- 2. Cargar el CSV original ---
-    if not RAW_CSV_PATH.is_file():
-        print(f"❌ ERROR: No se encontró el archivo CSV base en: {RAW_CSV_PATH}")
+    # --- 2. Cargar los datos crudos del scraper ---
+    if not table_exists(RAW_DATA_PATH):
+        print(f"❌ ERROR: No se encontraron los datos base en: {RAW_DATA_PATH}")
         return
-    
-    print(f"📄 Leyendo datos base desde: {RAW_CSV_PATH.name}")
-    raw_df = pd.read_csv(RAW_CSV_PATH)
+
+    print(f"📄 Leyendo datos base desde: {RAW_DATA_PATH.name}")
+    raw_df = read_table(RAW_DATA_PATH)
+    # El scraper incremental agrega filas: quedarse con la última captura de cada subasta
+    raw_df = raw_df.drop_duplicates(subset='detail_url', keep='last')
     # Asegurarnos de que la columna de la placa no tenga espacios extra
     raw_df['placa'] = raw_df['placa'].str.strip()
 
-    # --- 3. Procesar el archivo de salida del Batch de OpenAI ---
-    if not BATCH_JSONL_PATH.is_file():
-        print(f"❌ ERROR: No se encontró el archivo de salida del batch en: {BATCH_JSONL_PATH}")
-        print("👉 Asegúrate de que la variable 'batch_output_file' tenga el nombre correcto.")
-        return
+    # --- 3. Procesar los archivos de salida del Batch de OpenAI ---
+    batch_files = sorted(BATCH_OUTPUT_DIR.glob(batch_glob))
+    if not batch_files:
+        # Sin salidas nuevas todavía se puede regenerar el dataset desde la caché de inferencia
+        print(f"⚠️ No se encontraron archivos de salida del batch '{batch_glob}' en: {BATCH_OUTPUT_DIR}")
 
-    print(f"🤖 Procesando el archivo de batch: {BATCH_JSONL_PATH.name}")
-    
-    new_data_rows = []
-    errors = []
-
-    with open(BATCH_JSONL_PATH, 'r', encoding='utf-8') as f:
-        for i, line in enumerate(f, 1):
-            try:
-                line_data = json.loads(line)
-
-                # Extraer la patente del 'custom_id' (ej: 'BSWT31-1' -> 'BSWT31')
-                custom_id = line_data.get('custom_id', '')
-                vehicle_id = custom_id.split('-')[0]
-
-                if not vehicle_id:
-                    errors.append(f"Línea {i}: No se pudo obtener 'custom_id'.")
-                    continue
-
-                # Navegar la estructura para obtener la respuesta de la IA
-                response_content_str = line_data.get('response', {}).get('body', {}).get('choices', [{}])[0].get('message', {}).get('content')
-                
-                if not response_content_str:
-                    errors.append(f"Línea {i} ({vehicle_id}): No se encontró contenido en la respuesta.")
-                    continue
-
-                # El contenido es un string JSON, hay que cargarlo
-                # A veces la IA devuelve el JSON dentro de un bloque de código markdown
-                json_match = re.search(r'```json\s*([\s\S]*?)\s*```', response_content_str)
-                if json_match:
-                    response_content_str = json_match.group(1)
-
-                ai_data = json.loads(response_content_str)
-                
-                # Aplanar el JSON y añadir la patente para la unión
-                flat_data = flatten_json(ai_data)
-                flat_data['placa'] = vehicle_id
-                
-                new_data_rows.append(flat_data)
-
-            except Exception as e:
-                errors.append(f"Línea {i}: Error procesando - {e}")
-
-    if not new_data_rows:
+    with ResultCache(INFERENCE_CACHE_PATH) as cache:
+        reducer, n_responses, n_errors, requeue = process_batch_files(batch_files, RESPONSES_PARQUET_PATH,
+                                                                      ERRORS_JSONL_PATH, cache)
+    REQUEUE_PATH.write_text(''.join(f"{custom_id}\n" for custom_id in requeue), encoding='utf-8')
+
+    results, n_rule_vehicles = add_rule_fields(reducer.results())
+    if not results:
         print("❌ No se pudo extraer ninguna fila de datos nuevos del archivo de batch.")
         return
+    print(f"📏 Campos resueltos por reglas en {n_rule_vehicles} vehículos (reemplazan a los del modelo).")
 
-    print(f"✅ Se extrajeron datos para {len(new_data_rows)} vehículos.")
-    if errors:
-        print(f"⚠️ Se encontraron {len(errors)} errores durante el procesamiento.")
-        # print("\n".join(errors[:5])) # Descomentar para ver los primeros 5 errores
+    # Combinar las respuestas de todos los trozos en una sola fila por vehículo,
+    # aplanando el JSON y añadiendo la patente para la unión
+    new_data_rows = []
+    for vehicle_id, ai_data in results.items():
+        flat_data = flatten_json(ai_data)
+        flat_data['placa'] = vehicle_id
+        new_data_rows.append(flat_data)
+
+    print(f"✅ Se extrajeron datos para {len(new_data_rows)} vehículos ({n_responses} respuestas).")
+    print(f"🗃️ Respuestas guardadas en: {RESPONSES_PARQUET_PATH}")
+    if n_errors:
+        print(f"⚠️ Se encontraron {n_errors} errores durante el procesamiento. Detalle en: {ERRORS_JSONL_PATH}")
+    if requeue:
+        print(f"🔁 {len(requeue)} trozos sin respuesta válida para reenviar: {REQUEUE_PATH} "
+              f"(python src/inference/online_inference.py --requeue {REQUEUE_PATH.relative_to(PROJECT_ROOT)})")
 
     # --- 4. Unir los datos ---
     print("🔗 Uniendo los datos originales con los datos extraídos por la IA...")
-    
+
     # Crear un DataFrame con los datos nuevos
     new_data_df = pd.DataFrame(new_data_rows)
-    
+
     # Unir los dos DataFrames usando la columna 'placa'
-    # 'how=left' para mantener todos los vehículos del archivo original
-    extended_df = pd.merge(raw_df, new_data_df, on='placa', how='left')
-
-    # --- 5. Guardar el resultado ---
-    # Asegurarse de que el directorio de salida exista
-    PROCESSED_CSV_PATH.parent.mkdir(parents=True, exist_ok=True)
-    
-    extended_df.to_csv(PROCESSED_CSV_PATH, index=False, encoding='utf-8-sig')
-    
+    # 'how=left' para mantener todos los vehículos del archivo original; hay a lo más
+    # una fila enriquecida por patente, así que la unión no duplica filas
+    extended_df = pd.merge(raw_df, new_data_df, on='placa', how='left', validate='many_to_one')
+
+    # --- 5. Guardar el resultado (Parquet conserva los tipos, ej. los booleanos de la IA) ---
+    write_table(extended_df, PROCESSED_DATA_PATH, export_csv=export_csv)
+
     print("\n🎉 ¡Proceso completado con éxito!")
-    print(f"💾 El archivo CSV enriquecido ha sido guardado en: {PROCESSED_CSV_PATH}")
+    print(f"💾 El dataset enriquecido ha sido guardado en: {PROCESSED_DATA_PATH}")
 
 # --- Ejecutar el script ---
 if __name__ == "__main__":
-    process_and_extend_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Procesa las salidas del batch de OpenAI.")
+    parser.add_argument('--input', default=BATCH_OUTPUT_GLOB,
+                        help="Patrón (glob) de archivos de salida dentro de data/batch_output_procesados/.")
+    parser.add_argument('--csv', action='store_true', help="Además del Parquet, exporta una copia CSV.")
+    args = parser.parse_args()
+    process_and_extend_data(args.input, export_csv=args.csv)
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+
+"""
+Decodificación tipada de las respuestas del modelo según el esquema del JSON de
+`prompts/prompt.txt`.
+
+`ResponseDecoder` valida cada respuesta y convierte sus tipos al leerla, en una sola
+pasada: el esquema (`RESPONSE_SCHEMA`) se compila una vez a una lista de
+(grupo, campo, conversor). Los defectos comunes se reparan y quedan contados por tipo:
+- Texto antes o después del objeto JSON, bloques de código markdown y comas finales.
+- Textos que significan "sin dato" ('', 'N/A', 'null', 'desconocido'...) en cualquier campo:
+  quedan nulos.
+- Booleanos como texto ('true', 'SI', 'NO') o como 0/1.
+- Números como texto, con coma decimal ('1,5') o con la unidad ('2 UTM').
+- Fechas 'DD/MM/AAAA' o 'DD-MM-AAAA' (se normalizan a 'AAAA-MM-DD'); una fecha que no existe
+  en el calendario (ej. '2026-06-31') queda nula.
+- Una observación suelta en vez de una lista.
+- Campos o grupos faltantes (quedan nulos) y campos que no están en el esquema (se descartan).
+
+Una respuesta que no se puede reparar (JSON inválido o truncado, un valor que no
+corresponde al tipo del campo) lanza `ResponseError`: `process_batch_output.py` la
+registra y deja su `custom_id` en la lista de reenvío, en vez de volver a correr el batch
+completo.
+"""
+
+import json
+import re
+from collections import Counter
+from datetime import date
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional: se usa el módulo json estándar
+    orjson = None
+
+# Tipo de cada campo, por grupo (ver prompts/prompt.txt). Todos los campos admiten null.
+RESPONSE_SCHEMA = {
+    'estado_legal_y_documentacion': {
+        'limitaciones_dominio_activas': 'bool',
+        'permiso_circulacion_vigente': 'bool',
+        'fecha_vencimiento_permiso_circulacion': 'date',
+        'revision_tecnica_vigente': 'bool',
+        'fecha_vencimiento_revision_tecnica': 'date',
+    },
+    'historial_propiedad': {
+        'numero_propietarios': 'int',
+        'meses_dueño_actual': 'int',
+    },
+    'multas_y_costos_directos': {
+        'tiene_multas_anotadas': 'bool',
+        'monto_total_multas_utm': 'float',
+    },
+    'condicion_fisica_y_riesgos': {
+        'funciona': 'bool',
+        'tiene_llaves': 'bool',
+        'observaciones_criticas': 'list',
+        'es_chatarra': 'bool',
+        'grabado_patente_vidrios': 'bool',
+    },
+}
+
+TRUE_WORDS = {'true', 'si', 'sí', 'yes', 'verdadero'}
+FALSE_WORDS = {'false', 'no', 'falso'}
+NULL_WORDS = {'', 'n/a', 'na', 'null', 'none', 'nan', '-', 'desconocido', 'desconocida', 'sin dato',
+              'sin información', 'no disponible', 'no aplica'}
+CODE_BLOCK_PATTERN = re.compile(r'```(?:json)?\s*([\s\S]*?)\s*```')
+TRAILING_COMMA_PATTERN = re.compile(r',\s*([}\]])')
+NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+COMMA_DECIMAL_PATTERN = re.compile(r'-?\d+,\d+')
+ISO_DATE_PATTERN = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+DMY_DATE_PATTERN = re.compile(r'(\d{1,2})[/-](\d{1,2})[/-](\d{4})')
+
+
+class ResponseError(ValueError):
+    """Respuesta que no se puede reparar. `custom_id` es la tarea a reenviar (si se conoce)."""
+
+    def __init__(self, message: str, custom_id: str = None):
+        super().__init__(f"({custom_id}) {message}" if custom_id else message)
+        self.custom_id = custom_id
+
+
+def _loads(text: str):
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+def extract_json(content: str, repairs: Counter) -> dict:
+    """Decodifica el objeto JSON de `content`, reparando el texto que lo rodea y las comas finales."""
+    match = CODE_BLOCK_PATTERN.search(content)
+    if match:
+        content = match.group(1)
+    try:
+        return _loads(content)
+    except ValueError:
+        pass
+    start = content.find('{')
+    if start < 0:
+        raise ResponseError("La respuesta no contiene un objeto JSON.")
+    decoder = json.JSONDecoder()
+    for repair, text in (('texto_extra', content), ('coma_final', TRAILING_COMMA_PATTERN.sub(r'\1', content))):
+        try:
+            data, _ = decoder.raw_decode(text, start)
+        except ValueError:
+            continue
+        repairs[repair] += 1
+        return data
+    raise ResponseError("JSON inválido o truncado.")
+
+
+def is_null_text(value, repairs: Counter) -> bool:
+    """True si `value` es un texto que significa "sin dato" (cuenta la reparación)."""
+    if isinstance(value, str) and value.strip().lower() in NULL_WORDS:
+        repairs['nulo_texto'] += 1
+        return True
+    return False
+
+
+def to_bool(value, repairs: Counter):
+    if value is None or is_null_text(value, repairs):
+        return None
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in TRUE_WORDS | FALSE_WORDS:
+        repairs['booleano_texto'] += 1
+        return value.strip().lower() in TRUE_WORDS
+    if isinstance(value, (int, float)) and value in (0, 1):
+        repairs['booleano_numero'] += 1
+        return bool(value)
+    raise ValueError(f"se esperaba un booleano: {value!r}")
+
+
+def to_float(value, repairs: Counter):
+    if value is None or is_null_text(value, repairs):
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"se esperaba un número: {value!r}")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        text = value.strip().upper().removesuffix('UTM').strip()
+        if not text:
+            repairs['nulo_texto'] += 1
+            return None
+        if COMMA_DECIMAL_PATTERN.fullmatch(text):
+            repairs['decimal_coma'] += 1
+            return float(text.replace(',', '.'))
+        if NUMBER_PATTERN.fullmatch(text):
+            repairs['numero_texto'] += 1
+            return float(text)
+    raise ValueError(f"se esperaba un número: {value!r}")
+
+
+def to_int(value, repairs: Counter):
+    if value is None or is_null_text(value, repairs):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        repairs['entero_decimal'] += 1
+        return int(value)
+    number = to_float(value, repairs)
+    if number is None:
+        return None
+    if not number.is_integer():
+        raise ValueError(f"se esperaba un entero: {value!r}")
+    return int(number)
+
+
+def to_date(value, repairs: Counter):
+    if value is None or is_null_text(value, repairs):
+        return None
+    if isinstance(value, str):
+        text = value.strip()
+        match = ISO_DATE_PATTERN.fullmatch(text) or DMY_DATE_PATTERN.fullmatch(text)
+        if match:
+            year, month, day = map(int, match.groups() if match.re is ISO_DATE_PATTERN else match.groups()[::-1])
+            try:
+                parsed = date(year, month, day)
+            except ValueError:
+                # Fecha con el formato correcto pero inexistente (ej. '2026-06-31'): se descarta el campo
+                repairs['fecha_inexistente'] += 1
+                return None
+            if match.re is DMY_DATE_PATTERN:
+                repairs['fecha_formato'] += 1
+            return parsed.isoformat()
+    raise ValueError(f"se esperaba una fecha AAAA-MM-DD: {value!r}")
+
+
+def to_list(value, repairs: Counter):
+    if value is None or is_null_text(value, repairs):
+        return None
+    if isinstance(value, str):
+        repairs['lista_texto'] += 1
+        value = [value]
+    if not isinstance(value, list):
+        raise ValueError(f"se esperaba una lista: {value!r}")
+    items = []
+    for item in value:
+        if isinstance(item, (dict, list)):
+            raise ValueError(f"se esperaba una lista de textos: {value!r}")
+        if item is not None and not is_null_text(str(item), repairs):
+            items.append(str(item).strip())
+    return items
+
+
+CONVERTERS = {'bool': to_bool, 'int': to_int, 'float': to_float, 'date': to_date, 'list': to_list}
+
+
+def compile_schema(schema: dict = RESPONSE_SCHEMA) -> list:
+    """[(grupo, campo, conversor), ...] en el orden del esquema."""
+    return [(group, field, CONVERTERS[kind]) for group, fields in schema.items() for field, kind in fields.items()]
+
+
+class ResponseDecoder:
+    """Decodifica y valida respuestas con un esquema compilado; cuenta las reparaciones por tipo."""
+
+    def __init__(self, schema: dict = RESPONSE_SCHEMA):
+        self.schema = schema
+        self._fields = compile_schema(schema)
+        self.repairs = Counter()
+
+    def decode(self, content: str, custom_id: str = None) -> dict:
+        """
+        Devuelve el JSON de `content` con los grupos y campos del esquema (en su orden) y los
+        tipos convertidos. Lanza ResponseError si la respuesta no se puede reparar.
+        """
+        repairs = Counter()
+        try:
+            data = extract_json(content, repairs)
+        except ResponseError as e:
+            raise ResponseError(str(e), custom_id) from None
+        if not isinstance(data, dict):
+            raise ResponseError("La respuesta no es un objeto JSON.", custom_id)
+
+        decoded = {}
+        missing_groups = set()
+        for group, fields in self.schema.items():
+            values = data.get(group)
+            if values is None:
+                repairs['grupo_faltante'] += 1
+                missing_groups.add(group)
+                values = {}
+            elif not isinstance(values, dict):
+                raise ResponseError(f"'{group}' no es un objeto JSON.", custom_id)
+            repairs['campo_extra'] += len(values.keys() - fields.keys())
+            decoded[group] = {}
+        repairs['campo_extra'] += sum(1 for group in data if group not in self.schema)
+
+        for group, field, convert in self._fields:
+            values = data.get(group) or {}
+            if field not in values:
+                repairs['campo_faltante'] += group not in missing_groups
+                decoded[group][field] = None
+                continue
+            try:
+                decoded[group][field] = convert(values[field], repairs)
+            except ValueError as e:
+                raise ResponseError(f"{group}.{field}: {e}", custom_id) from None
+
+        self.repairs.update({kind: count for kind, count in repairs.items() if count})
+        return decoded
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+"""
+Lectura y escritura de las tablas del pipeline (crudo, procesado y limpio) en Parquet.
+
+Parquet guarda los tipos de cada columna (los booleanos siguen siendo booleanos, los
+números siguen siendo números), va comprimido y permite leer sólo algunas columnas, así
+que cada etapa lee exactamente lo que necesita sin volver a interpretar todo el archivo.
+
+- `write_table` escribe el Parquet (y, opcionalmente, una copia CSV al lado para abrirla
+  en Excel o en los notebooks).
+- `append_table` agrega filas sin reescribir las anteriores: la tabla pasa a ser una
+  carpeta con el mismo nombre ('x.parquet/') con una parte Parquet por escritura, y
+  `compact_table` junta las partes en una sola cuando son muchas. Así el scraper
+  incremental escribe sólo las filas nuevas en cada ejecución.
+- `read_table` lee el Parquet (o todas las partes de la carpeta, en orden de escritura);
+  si todavía no existe pero sí el CSV con el mismo nombre (datos generados antes del
+  cambio a Parquet), lee el CSV. `iter_table` lee igual, pero por partes, para procesar
+  tablas grandes con memoria acotada.
+"""
+
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+from pandas.api.types import infer_dtype
+
+PARQUET_COMPRESSION = 'zstd'
+CSV_ENCODING = 'utf-8-sig'
+
+# Columnas de texto/objeto con valores de varios tipos (ej. 2 y '2 dueños'), que Parquet no admite
+MIXED_TYPES = {'mixed', 'mixed-integer', 'mixed-integer-float'}
+
+
+def csv_path(path) -> Path:
+    """Ruta de la copia CSV de una tabla ('x.parquet' -> 'x.csv')."""
+    return Path(path).with_suffix('.csv')
+
+
+def table_exists(path) -> bool:
+    return Path(path).is_file() or bool(table_parts(path)) or csv_path(path).is_file()
+
+
+def table_parts(path) -> list:
+    """Partes de una tabla guardada como carpeta, en orden de escritura ([] si no es una carpeta)."""
+    path = Path(path)
+    return sorted(path.glob('part-*.parquet')) if path.is_dir() else []
+
+
+def _read_parquet(path: Path, columns: list = None) -> pd.DataFrame:
+    if columns is not None:
+        available = set(pq.read_schema(path).names)
+        columns = [column for column in columns if column in available]
+    return pd.read_parquet(path, columns=columns)
+
+
+def read_table(path, columns: list = None, csv_dtype=None) -> pd.DataFrame:
+    """
+    Lee una tabla, sólo con `columns` si se indican (las que no existan se omiten).
+    Si no existe el Parquet se lee el CSV equivalente, con `csv_dtype` para `pd.read_csv`.
+    Lanza FileNotFoundError si no existe ninguno de los dos.
+    """
+    path = Path(path)
+    if path.is_file():
+        return _read_parquet(path, columns)
+    parts = table_parts(path)
+    if parts:
+        # Las partes pueden diferir en columnas o tipos (ej. una columna mixta guardada como texto)
+        return pd.concat([_read_parquet(part, columns) for part in parts], ignore_index=True)
+
+    legacy_path = csv_path(path)
+    if not legacy_path.is_file():
+        raise FileNotFoundError(f"No se encontró {path} (ni {legacy_path.name}).")
+    usecols = None
+    if columns is not None:
+        header = pd.read_csv(legacy_path, nrows=0, encoding=CSV_ENCODING).columns
+        usecols = [column for column in header if column in set(columns)]
+    return pd.read_csv(legacy_path, usecols=usecols, dtype=csv_dtype, encoding=CSV_ENCODING)
+
+
+def iter_table(path, columns: list = None, chunk_size: int = 50_000, csv_dtype=None):
+    """
+    Lee una tabla por partes de hasta `chunk_size` filas (DataFrames), sin cargarla completa.
+    Mismas reglas que `read_table` para `columns` y el CSV anterior a Parquet.
+    """
+    path = Path(path)
+    parquet_files = [path] if path.is_file() else table_parts(path)
+    if parquet_files:
+        for parquet_path in parquet_files:
+            parquet_file = pq.ParquetFile(parquet_path)
+            part_columns = columns
+            if columns is not None:
+                available = set(parquet_file.schema_arrow.names)
+                part_columns = [column for column in columns if column in available]
+            for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=part_columns):
+                yield batch.to_pandas()
+        return
+
+    legacy_path = csv_path(path)
+    if not legacy_path.is_file():
+        raise FileNotFoundError(f"No se encontró {path} (ni {legacy_path.name}).")
+    usecols = None
+    if columns is not None:
+        header = pd.read_csv(legacy_path, nrows=0, encoding=CSV_ENCODING).columns
+        usecols = [column for column in header if column in set(columns)]
+    with pd.read_csv(legacy_path, usecols=usecols, dtype=csv_dtype, encoding=CSV_ENCODING,
+                     chunksize=chunk_size) as reader:
+        yield from reader
+
+
+def _parquet_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """Convierte a texto las columnas con valores de tipos mezclados (sólo esas)."""
+    mixed = [column for column in df.columns
+             if df[column].dtype == object and infer_dtype(df[column], skipna=True) in MIXED_TYPES]
+    if not mixed:
+        return df
+    df = df.copy()
+    for column in mixed:
+        df[column] = df[column].map(str, na_action='ignore')
+    return df
+
+
+def write_table(df: pd.DataFrame, path, export_csv: bool = False) -> Path:
+    """
+    Escribe `df` en Parquet (comprimido, escritura atómica con archivo temporal + rename).
+    Con `export_csv=True` también escribe la copia CSV ('x.parquet' -> 'x.csv').
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.parquet.tmp')
+    _parquet_safe(df).to_parquet(tmp_path, index=False, compression=PARQUET_COMPRESSION)
+    if path.is_dir():
+        # Reemplaza una tabla guardada por partes (ver `append_table`)
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+    if export_csv:
+        df.to_csv(csv_path(path), index=False, encoding=CSV_ENCODING)
+    return path
+
+
+def _part_name() -> str:
+    return f"part-{datetime.now().strftime('%Y%m%d%H%M%S%f')}-{os.getpid()}.parquet"
+
+
+def append_table(df: pd.DataFrame, path, csv_dtype=None) -> Path:
+    """
+    Agrega las filas de `df` como una parte nueva de la tabla `path` (una carpeta), sin leer
+    ni reescribir las anteriores. Una tabla guardada como un solo archivo (o sólo como CSV,
+    leído con `csv_dtype`) pasa a ser la primera parte de la carpeta. Devuelve la ruta de la parte.
+    """
+    path = Path(path)
+    if path.is_file():
+        tmp_path = path.with_suffix('.parquet.migrating')
+        os.replace(path, tmp_path)
+        path.mkdir()
+        os.replace(tmp_path, path / 'part-00000000000000000000-0.parquet')
+    elif not path.is_dir() and csv_path(path).is_file():
+        legacy_df = read_table(path, csv_dtype=csv_dtype)
+        path.mkdir(parents=True)
+        _parquet_safe(legacy_df).to_parquet(path / 'part-00000000000000000000-0.parquet', index=False,
+                                            compression=PARQUET_COMPRESSION)
+    path.mkdir(parents=True, exist_ok=True)
+    part_path = path / _part_name()
+    tmp_path = part_path.with_suffix('.parquet.tmp')  # no coincide con 'part-*.parquet' mientras se escribe
+    _parquet_safe(df).to_parquet(tmp_path, index=False, compression=PARQUET_COMPRESSION)
+    os.replace(tmp_path, part_path)
+    return part_path
+
+
+def compact_table(path) -> int:
+    """
+    Junta todas las partes de la tabla `path` en una sola (mismas filas, en el mismo orden).
+    Devuelve el número de partes que había.
+    """
+    parts = table_parts(path)
+    if len(parts) <= 1:
+        return len(parts)
+    compacted = Path(path) / _part_name()
+    tmp_path = compacted.with_suffix('.parquet.tmp')
+    _parquet_safe(read_table(path)).to_parquet(tmp_path, index=False, compression=PARQUET_COMPRESSION)
+    # La parte compactada lleva un nombre posterior a todas las anteriores, que se borran después:
+    # si el proceso se corta entre medio, las filas sólo quedan repetidas (y se descartan al deduplicar)
+    os.replace(tmp_path, compacted)
+    for part in parts:
+        part.unlink()
+    return len(parts)
@@ -0,0 +1,120 @@
+"""
+Índice persistente (SQLite) de las subastas ya vistas por el scraper.
+
+Guarda por `detail_url` la patente, los validadores HTTP (ETag / Last-Modified), un hash
+del contenido de la ficha y si la subasta ya estaba cerrada. Con esto el scraper puede:
+- Saltarse las fichas de subastas cerradas que ya se capturaron.
+- Pedir las subastas abiertas con cabeceras condicionales (respuesta 304 si no cambió).
+- Agregar al dataset crudo sólo las filas nuevas o modificadas.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+INDEX_PATH = os.path.join('data', 'raw', 'auction_index.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS auctions (
+    detail_url    TEXT PRIMARY KEY,
+    placa         TEXT,
+    etag          TEXT,
+    last_modified TEXT,
+    content_hash  TEXT,
+    closed        INTEGER NOT NULL DEFAULT 0,
+    first_seen    TEXT NOT NULL,
+    last_seen     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS auctions_placa ON auctions (placa);
+"""
+
+
+def content_hash(content):
+    """Hash SHA-256 del cuerpo de una respuesta."""
+    return hashlib.sha256(content).hexdigest()
+
+
+class AuctionIndex:
+    """Índice de subastas vistas. Seguro de usar desde los hilos del crawler."""
+
+    def __init__(self, path=INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+        self._staged = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def get(self, detail_url):
+        """Devuelve la entrada de una subasta como diccionario, o None si nunca se vio."""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM auctions WHERE detail_url = ?', (detail_url,)).fetchone()
+        return dict(row) if row else None
+
+    def needs_fetch(self, detail_url):
+        """Sólo las subastas nuevas o todavía abiertas necesitan descargar su ficha."""
+        entry = self.get(detail_url)
+        return entry is None or not entry['closed']
+
+    def conditional_headers(self, detail_url):
+        """Cabeceras If-None-Match / If-Modified-Since para una subasta ya vista."""
+        entry = self.get(detail_url)
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def is_unchanged(self, detail_url, digest):
+        """True si la ficha tiene el mismo contenido que la última vez que se capturó."""
+        entry = self.get(detail_url)
+        return entry is not None and entry['content_hash'] == digest
+
+    def touch(self, detail_url):
+        """Marca una subasta como vista en esta ejecución sin cambiar su contenido."""
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE auctions SET last_seen = ? WHERE detail_url = ?', (now, detail_url))
+
+    def stage(self, detail_url, placa, digest, closed, etag=None, last_modified=None):
+        """
+        Deja pendiente el registro de una ficha capturada. Se escribe con `flush()` una vez
+        que la fila quedó guardada en el dataset, para no marcar como capturado algo perdido.
+        """
+        with self._lock:
+            self._staged.append((detail_url, placa, digest, closed, etag, last_modified))
+
+    def flush(self):
+        """Escribe en el índice todas las fichas pendientes."""
+        with self._lock:
+            staged, self._staged = self._staged, []
+        for entry in staged:
+            self.record(*entry)
+        return len(staged)
+
+    def record(self, detail_url, placa, digest, closed, etag=None, last_modified=None):
+        """Registra (o actualiza) una subasta tras capturar su ficha."""
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO auctions (detail_url, placa, etag, last_modified, content_hash, closed, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (detail_url) DO UPDATE SET
+                    placa = excluded.placa, etag = excluded.etag, last_modified = excluded.last_modified,
+                    content_hash = excluded.content_hash, closed = excluded.closed, last_seen = excluded.last_seen
+                """,
+                (detail_url, placa, etag, last_modified, digest, int(bool(closed)), now, now),
+            )
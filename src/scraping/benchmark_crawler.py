@@ -0,0 +1,56 @@
+"""
+Benchmark del crawler contra un sitio local que imita a karcal.cl (ver `karcal_stub.py`).
+
+Mide páginas descargadas por segundo (listados + fichas de detalle) con distintos
+niveles de concurrencia, sin límite de tasa, para aislar el efecto del pool de hilos.
+
+Uso:
+    python src/scraping/benchmark_crawler.py --latency 0.05 --copies 2 --workers 1 4 8 16
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+from crawler import Crawler
+from karcal_stub import CARS_PER_PAGE, build_site, serve_site
+from scraper import scrape_catalogue
+
+
+def run_benchmark(pages, base_url, workers, num_listing_pages):
+    """Recorre el sitio completo con `workers` hilos y devuelve (autos, páginas, segundos)."""
+    with Crawler(workers=workers, requests_per_second=None, retries=0) as crawler:
+        start = time.perf_counter()
+        # Silenciar los prints del scraper para no medir la consola
+        with contextlib.redirect_stdout(io.StringIO()):
+            cars = scrape_catalogue(crawler, base_url, num_listing_pages)
+        elapsed = time.perf_counter() - start
+    fetched = num_listing_pages + sum(1 for car in cars if car.get('detail_url'))
+    return len(cars), fetched, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de concurrencia del crawler de Karcal.")
+    parser.add_argument('--latency', type=float, default=0.05, help="Latencia simulada por respuesta (s).")
+    parser.add_argument('--copies', type=int, default=1, help="Veces que se replica el catálogo guardado.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    pages = build_site(copies=args.copies)
+    num_listing_pages = sum(1 for path in pages if path.startswith('/Listado/'))
+    server, base_url = serve_site(pages, latency=args.latency)
+    print(f"Sitio local en {base_url}: {len(pages)} páginas ({CARS_PER_PAGE} autos por listado), "
+          f"latencia simulada {args.latency * 1000:.0f} ms")
+
+    try:
+        print(f"\n{'workers':>8} {'autos':>7} {'páginas':>8} {'segundos':>9} {'páginas/s':>10}")
+        for workers in args.workers:
+            num_cars, fetched, elapsed = run_benchmark(pages, base_url, workers, num_listing_pages)
+            print(f"{workers:>8} {num_cars:>7} {fetched:>8} {elapsed:>9.2f} {fetched / elapsed:>10.1f}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark de throughput del parseo de páginas de karcal.cl (ver `page_parser.py`).
+
+Parsea el mismo corpus con cada backend ('bs4' y 'lxml'), por separado listados y fichas de
+detalle, y reporta páginas/s y MB/s. También cuenta las páginas en que los backends no
+devuelven exactamente los mismos diccionarios y muestra la primera diferencia: las páginas
+simuladas están bien formadas, así que la comparación que importa antes de usar 'lxml' en
+el scraper es la de páginas reales (`--archive` o `--corpus`).
+
+El corpus es el archivo de páginas del scraper (`--archive`, la última captura de cada URL),
+una carpeta de páginas guardadas (`--corpus`, archivos .html; en ambos casos las que tienen
+'caluga-card' se tratan como listados) o, por defecto, las páginas del sitio simulado
+(`karcal_stub.py`). Las páginas simuladas sólo tienen el marcado que lee el scraper; las
+reales traen además cabecera, menús, scripts y pie de página, que `--filler-kb` agrega
+a cada página simulada (varios valores = una fila por tamaño).
+
+Uso:
+    python src/scraping/benchmark_parser.py [--archive data/raw/archive | --corpus carpeta]
+                                            [--copies 2] [--filler-kb 0 50]
+"""
+
+import argparse
+import os
+import time
+
+from karcal_stub import build_site
+from page_archive import PageArchive
+from page_parser import BACKENDS, lxml_html, parse_detail_page, parse_listing_page
+
+
+def split_pages(pages):
+    """(listados, fichas de detalle) de una lista de páginas en bytes."""
+    listings, details = [], []
+    for page in pages:
+        (listings if b'caluga-card' in page else details).append(page)
+    return listings, details
+
+
+def load_corpus(directory):
+    """Páginas guardadas: (listados, fichas de detalle), cada una como bytes."""
+    pages = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(('.html', '.htm')):
+            with open(os.path.join(directory, name), 'rb') as f:
+                pages.append(f.read())
+    return split_pages(pages)
+
+
+def load_archive(directory):
+    """Última captura (200) de cada URL del archivo de páginas: (listados, fichas de detalle)."""
+    with PageArchive(directory) as archive:
+        latest = {entry['url']: entry for entry in archive.entries()}
+        return split_pages([archive.read(entry)[2] for entry in latest.values()])
+
+
+def stub_corpus(copies=1):
+    """Páginas del sitio simulado: (listados, fichas de detalle)."""
+    pages = build_site(copies=copies)
+    listings = [page for path, page in pages.items() if path.startswith('/Listado/')]
+    details = [page for path, page in pages.items() if not path.startswith('/Listado/')]
+    return listings, details
+
+
+def add_filler(page, kilobytes):
+    """
+    Agrega a una página simulada `kilobytes` KB de marcado que el scraper no lee: un menú
+    de enlaces anidados en la cabecera, un script en línea y un pie de página.
+    """
+    if not kilobytes:
+        return page
+    item = (b'<li class="menu-item"><a class="menu-link" href="/Listado/Index/1">'
+            b'<span class="icono"></span><span>Categor\xc3\xada de veh\xc3\xadculos</span></a></li>')
+    menu = item * max(1, kilobytes * 1024 // 2 // len(item))
+    script = b'<script>window.dataLayer = window.dataLayer || [];' + b'x' * (kilobytes * 1024 // 4) + b'</script>'
+    footer = b'<footer><div class="footer-col"><p>Karcal - Remates de veh\xc3\xadculos</p></div>' * (
+        kilobytes * 1024 // 4 // 80) + b'</footer>'
+    header = b'<header><nav><ul class="menu">' + menu + b'</ul></nav></header>' + script
+    return page.replace(b'<body>', b'<body>' + header, 1).replace(b'</body>', footer + b'</body>', 1)
+
+
+def throughput(parse, pages, backend):
+    """(páginas/s, MB/s, resultados) de parsear todas las `pages` con `backend`."""
+    start = time.perf_counter()
+    results = [parse(page, backend=backend) for page in pages]
+    elapsed = time.perf_counter() - start
+    return len(pages) / elapsed, sum(len(page) for page in pages) / 1e6 / elapsed, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del parseo de páginas de Karcal por backend.")
+    parser.add_argument('--corpus', default=None, help="Carpeta con páginas guardadas (.html).")
+    parser.add_argument('--archive', default=None, help="Archivo de páginas del scraper (ej. data/raw/archive).")
+    parser.add_argument('--copies', type=int, default=2, help="Sin --corpus: veces que se replica el catálogo simulado.")
+    parser.add_argument('--filler-kb', type=int, nargs='+', default=[0, 50],
+                        help="Sin --corpus: KB de marcado extra (menús, scripts) por página simulada.")
+    args = parser.parse_args()
+
+    backends = [backend for backend in BACKENDS if backend != 'lxml' or lxml_html is not None]
+    if args.archive:
+        corpora = [('archivo', load_archive(args.archive))]
+    elif args.corpus:
+        corpora = [(args.corpus, load_corpus(args.corpus))]
+    else:
+        listings, details = stub_corpus(args.copies)
+        corpora = [(f"simulado +{kilobytes} KB", ([add_filler(page, kilobytes) for page in listings],
+                                                  [add_filler(page, kilobytes) for page in details]))
+                   for kilobytes in args.filler_kb]
+
+    print(f"{'corpus':<18} {'páginas':<8} {'n':>6} {'KB/pág':>7} {'backend':>8} {'pág/s':>9} {'MB/s':>7} "
+          f"{'aceleración':>12} {'distintas':>10}")
+    first_mismatch = None
+    for name, (listings, details) in corpora:
+        for kind, parse, pages in (('listado', parse_listing_page, listings), ('detalle', parse_detail_page, details)):
+            if not pages:
+                continue
+            size_kb = sum(len(page) for page in pages) / len(pages) / 1024
+            reference = None
+            for backend in backends:
+                per_second, mb_per_second, results = throughput(parse, pages, backend)
+                if reference is None:
+                    reference = (per_second, results)
+                different = [(result, expected) for result, expected in zip(results, reference[1])
+                             if result != expected]
+                mismatches = len(different)
+                if different and first_mismatch is None:
+                    first_mismatch = (kind, backend, *different[0])
+                print(f"{name:<18} {kind:<8} {len(pages):>6} {size_kb:>7.1f} {backend:>8} {per_second:>9.0f} "
+                      f"{mb_per_second:>7.1f} {per_second / reference[0]:>11.1f}x {mismatches:>10}")
+    if first_mismatch is not None:
+        kind, backend, result, expected = first_mismatch
+        print(f"\nPrimera diferencia ({kind}, {backend} vs {backends[0]}):")
+        print(f"  {backend}: {result}\n  {backends[0]}: {expected}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Cliente HTTP concurrente para el scraper de Karcal.
+
+Reemplaza las llamadas sueltas a `requests.get` y las pausas fijas con `time.sleep`:
+- Una única `requests.Session` compartida, con pool de conexiones (keep-alive).
+- Un limitador de tasa por host con peticiones por segundo configurables.
+- Reintentos con backoff exponencial (y jitter) ante errores de red o respuestas 429/5xx.
+- Un pool acotado de hilos para descargar varias páginas a la vez.
+- Opcionalmente, un `PageArchive` (ver `page_archive.py`) donde se guarda cada respuesta.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- CONFIGURACIÓN POR DEFECTO ---
+DEFAULT_WORKERS = 8
+DEFAULT_REQUESTS_PER_SECOND = 5.0
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5  # segundos; se duplica en cada reintento
+DEFAULT_TIMEOUT = 20
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """
+    Limita las peticiones por host a `requests_per_second`, repartiendo los turnos
+    de forma uniforme entre todos los hilos. Con `None` o 0 no se limita.
+    """
+
+    def __init__(self, requests_per_second=DEFAULT_REQUESTS_PER_SECOND):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, host):
+        """Bloquea hasta que el host tenga un turno libre."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Crawler:
+    """
+    Descarga páginas con una sesión compartida, límite de tasa por host y reintentos.
+    Usar como context manager para cerrar la sesión y el pool de hilos al terminar.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, timeout=DEFAULT_TIMEOUT, archive=None):
+        self.workers = max(1, workers)
+        self.archive = archive  # PageArchive opcional: guarda cada respuesta para re-parsear sin red
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(requests_per_second)
+
+        # Una sola sesión: reutiliza las conexiones TCP/TLS entre peticiones
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def fetch(self, url, headers=None):
+        """
+        Descarga `url` respetando el límite de tasa. Reintenta errores de red y
+        respuestas 429/5xx; cualquier otro error HTTP se lanza de inmediato.
+        """
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            self.rate_limiter.wait(host)
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    if self.archive is not None:
+                        self.archive.write(url, response)
+                    return response
+                error = requests.exceptions.HTTPError(
+                    f"{response.status_code} Error para la url: {url}", response=response)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+
+            if attempt == self.retries:
+                raise error
+            # Backoff exponencial con jitter para no sincronizar los reintentos de los hilos
+            time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.0))
+
+    def map(self, fn, items):
+        """Aplica `fn` a cada elemento en el pool de hilos, conservando el orden."""
+        return list(self._executor.map(fn, items))
@@ -0,0 +1,140 @@
+"""
+Sitio local que imita a karcal.cl para benchmarks y pruebas del scraper sin tocar la red.
+
+Reconstruye las páginas de listado y las fichas de detalle (con el mismo marcado que
+lee `scraper.py`) a partir de los autos ya guardados en `data/raw/karcal_data_raw.parquet`,
+y las sirve con un `ThreadingHTTPServer` que añade una latencia artificial por respuesta.
+"""
+
+import html
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+from scraper import LISTING_PATH, read_table
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RAW_DATA_PATH = os.path.join(BASE_DIR, 'data', 'raw', 'karcal_data_raw.parquet')
+CARS_PER_PAGE = 12
+
+# Especificaciones que la ficha de detalle muestra como pares <span>clave:</span><span>valor</span>
+SPEC_LABELS = ['Año', 'Kilometraje', 'Transmisión', 'Combustible', 'Placa',
+               'Tracción', 'Cilindrada', 'Visitas', 'Mandante']
+
+
+def _text(value):
+    return '' if pd.isna(value) else html.escape(str(value))
+
+
+def _path(url):
+    """Ruta relativa (con query) de una URL absoluta de karcal.cl."""
+    parts = urlsplit(url)
+    return parts.path + (f'?{parts.query}' if parts.query else '')
+
+
+def render_listing_page(cars):
+    """Genera el HTML de una página de listado con una 'caluga-card' por auto."""
+    cards = []
+    for car in cars:
+        detail_path = _text(_path(car['detail_url']))
+        cards.append(
+            '<div class="caluga-card">'
+            f'<a href="{detail_path}"><img src="{_text(car.get("image_url"))}"></a>'
+            f'<p class="nombre-bien">{_text(car.get("marca"))}</p>'
+            f'<p class="nombre-bien">{_text(car.get("modelo"))}</p>'
+            f'<p class="nombre-bien">{_text(car.get("listado_año"))}</p>'
+            f'<p class="minimo">{_text(car.get("valor_inicial"))}</p>'
+            '</div>'
+        )
+    return f'<html><body><div class="listado">{"".join(cards)}</div></body></html>'
+
+
+def render_detail_page(car):
+    """Genera el HTML de la ficha de detalle de un auto."""
+    specs = ''.join(
+        f'<div class="especificacion"><span>{label}:</span><span>{_text(car.get(label.lower()))}</span></div>'
+        for label in SPEC_LABELS
+    )
+    winner = car.get('oferta_ganadora')
+    winner_html = f'<h2 class="monto-ganador">{_text(winner)}</h2>' if pd.notna(winner) else ''
+
+    reports = json.loads(car['informes_pdf']) if isinstance(car.get('informes_pdf'), str) else {}
+    reports_html = ''.join(
+        f'<div class="detalleBotonera"><a href="{_text(url)}"><span class="icono"></span>'
+        f'<span>{_text(name)}</span></a></div>'
+        for name, url in reports.items()
+    )
+
+    bids = json.loads(car['historial_ofertas']) if isinstance(car.get('historial_ofertas'), str) else []
+    rows_html = ''.join(
+        f'<tr><td>{_text(bid["usuario"])}</td><td>{_text(bid["cantidad_ofertas"])}</td>'
+        f'<td>{_text(bid["valor_ultima_oferta"])}</td></tr>'
+        for bid in bids
+    )
+    return (
+        '<html><body>'
+        f'<div class="especificaciones">{specs}</div>{winner_html}{reports_html}'
+        f'<div class="panel-ofertas"><table><tbody>{rows_html}</tbody></table></div>'
+        '</body></html>'
+    )
+
+
+def build_site(raw_data_path=RAW_DATA_PATH, cars_per_page=CARS_PER_PAGE, copies=1):
+    """
+    Devuelve un diccionario {ruta: html en bytes} con todas las páginas del sitio simulado.
+    `copies` replica el catálogo (con URLs de detalle distintas) para generar más carga.
+    """
+    df = read_table(raw_data_path, csv_dtype=str)
+    cars = []
+    for copy in range(copies):
+        for car in df.to_dict('records'):
+            car = dict(car)
+            if copy:
+                car['detail_url'] = f"{car['detail_url']}?copia={copy}"
+            cars.append(car)
+
+    pages = {}
+    num_pages = (len(cars) + cars_per_page - 1) // cars_per_page
+    for page_num in range(1, num_pages + 2):  # la última página queda vacía, como en el sitio real
+        page_cars = cars[(page_num - 1) * cars_per_page:page_num * cars_per_page]
+        pages[LISTING_PATH.format(page_num=page_num)] = render_listing_page(page_cars).encode('utf-8')
+    for car in cars:
+        pages[_path(car['detail_url'])] = render_detail_page(car).encode('utf-8')
+    return pages
+
+
+def serve_site(pages, latency=0.05, port=0):
+    """
+    Levanta el sitio en un hilo de fondo y devuelve (servidor, base_url).
+    Cada respuesta espera `latency` segundos para simular la red.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, para que la sesión reutilice conexiones
+
+        def do_GET(self):
+            time.sleep(latency)
+            body = pages.get(self.path)
+            if body is None:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
@@ -0,0 +1,242 @@
+"""
+Archivo comprimido de las páginas descargadas por el crawler, para volver a parsearlas sin red.
+
+El scraper descarta el HTML después de parsearlo: cambiar cómo se leen las
+especificaciones, el historial de ofertas o los informes obligaría a volver a pedir todas
+las fichas a karcal.cl. `PageArchive` guarda cada respuesta que devuelve el `Crawler`:
+- Un registro WARC 1.0 ('response') por respuesta, cada uno como un miembro gzip
+  independiente, en archivos que sólo crecen (`pages-<fecha>-<pid>.warc.gz`, uno por
+  ejecución). Se guarda el cuerpo ya decodificado (sin Content-Encoding), así que no es un
+  WARC estricto, pero se puede leer con herramientas de WARC/gzip.
+- Un índice SQLite (`index.sqlite`) con la URL, fecha de descarga, estado HTTP, archivo,
+  posición y largo de cada registro, para leer una página sin recorrer los archivos.
+  Si el índice se pierde o quedó incompleto (ej. el proceso se cortó), `rebuild_index`
+  lo reconstruye desde los archivos.
+
+`scraper.py --replay` reconstruye el catálogo desde el archivo, sin red y a velocidad de
+disco (ver `scraper.replay_catalogue`): sirve para aplicar un cambio del parser a las
+subastas archivadas. Sólo están las páginas que respondieron 200 con el archivo activo, así
+que el resultado se escribe aparte de los datos crudos.
+
+Uso:
+    python src/scraping/page_archive.py [--archive data/raw/archive] [--rebuild-index]
+"""
+
+import argparse
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import uuid
+import zlib
+from datetime import datetime
+
+from requests.structures import CaseInsensitiveDict
+
+ARCHIVE_DIR = os.path.join('data', 'raw', 'archive')
+INDEX_FILE = 'index.sqlite'
+COMMIT_EVERY = 100  # registros por transacción del índice
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    url            TEXT NOT NULL,
+    fetched_at     TEXT NOT NULL,
+    status         INTEGER NOT NULL,
+    file           TEXT NOT NULL,
+    offset         INTEGER NOT NULL,
+    length         INTEGER NOT NULL,
+    payload_digest TEXT NOT NULL,
+    UNIQUE (file, offset)
+);
+CREATE INDEX IF NOT EXISTS records_url ON records (url, fetched_at);
+"""
+
+# Cabeceras que describen la transferencia original y no el cuerpo guardado (ya decodificado)
+TRANSFER_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length'}
+
+
+def warc_record(url, fetched_at, status, reason, headers, body):
+    """Registro WARC 'response' (sin comprimir) con el estado, las cabeceras y el cuerpo."""
+    http_headers = ''.join(f'{name}: {value}\r\n' for name, value in headers.items()
+                           if name.lower() not in TRANSFER_HEADERS)
+    http_block = (f'HTTP/1.1 {status} {reason or ""}\r\n{http_headers}'
+                  f'Content-Length: {len(body)}\r\n\r\n').encode('utf-8') + body
+    warc_headers = (
+        'WARC/1.0\r\n'
+        'WARC-Type: response\r\n'
+        f'WARC-Target-URI: {url}\r\n'
+        f'WARC-Date: {fetched_at}\r\n'
+        f'WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>\r\n'
+        f'WARC-Payload-Digest: sha256:{hashlib.sha256(body).hexdigest()}\r\n'
+        'Content-Type: application/http; msgtype=response\r\n'
+        f'Content-Length: {len(http_block)}\r\n\r\n'
+    ).encode('utf-8')
+    return warc_headers + http_block + b'\r\n\r\n'
+
+
+def parse_record(record):
+    """Devuelve (cabeceras WARC, estado HTTP, cabeceras HTTP, cuerpo) de un registro sin comprimir."""
+    warc_part, _, rest = record.partition(b'\r\n\r\n')
+    warc_headers = dict(line.split(': ', 1) for line in warc_part.decode('utf-8').split('\r\n')[1:])
+    http_part, _, rest = rest.partition(b'\r\n\r\n')
+    status_line, *header_lines = http_part.decode('utf-8').split('\r\n')
+    http_headers = CaseInsensitiveDict(line.split(': ', 1) for line in header_lines)
+    body = rest[:int(http_headers['Content-Length'])]
+    return warc_headers, int(status_line.split(' ')[1]), http_headers, body
+
+
+def iter_members(path, chunk_size=1 << 16):
+    """Recorre los miembros gzip de un archivo: (posición, largo, registro sin comprimir)."""
+    with open(path, 'rb') as f:
+        data = memoryview(f.read())
+    offset = 0
+    while offset < len(data):
+        decompressor = zlib.decompressobj(wbits=31)  # 31 = formato gzip
+        parts = []
+        position = offset
+        while not decompressor.eof:
+            chunk = data[position:position + chunk_size]
+            if not chunk:
+                return  # último registro truncado (el proceso se cortó mientras escribía)
+            parts.append(decompressor.decompress(chunk))
+            position += len(chunk)
+        end = position - len(decompressor.unused_data)
+        yield offset, end - offset, b''.join(parts)
+        offset = end
+
+
+class PageArchive:
+    """Archivo de páginas descargadas. Seguro de usar desde los hilos del crawler."""
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, INDEX_FILE), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._file = None
+        self._file_name = None
+        self._pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self._conn.close()
+
+    def _commit(self):
+        # Primero el archivo: el índice nunca apunta a bytes que no llegaron al disco
+        if self._file is not None:
+            self._file.flush()
+        self._conn.commit()
+        self._pending = 0
+
+    def write(self, url, response):
+        """Archiva una respuesta de `requests` (estado, cabeceras y cuerpo)."""
+        fetched_at = datetime.now().isoformat(timespec='seconds')
+        body = response.content or b''
+        member = gzip.compress(warc_record(url, fetched_at, response.status_code, response.reason,
+                                           response.headers, body), compresslevel=6)
+        digest = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            if self._file is None:
+                stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+                self._file_name = f'pages-{stamp}-{os.getpid()}.warc.gz'
+                self._file = open(os.path.join(self.directory, self._file_name), 'ab')
+            offset = self._file.tell()
+            self._file.write(member)
+            self._conn.execute(
+                'INSERT INTO records (url, fetched_at, status, file, offset, length, payload_digest) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, fetched_at, response.status_code, self._file_name, offset, len(member), digest))
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._commit()
+
+    def entries(self, as_of=None, prefix=None):
+        """
+        Entradas del índice de todas las capturas con estado 200 (hasta `as_of`; sólo las URLs
+        que empiezan con `prefix`), de la más antigua a la más reciente.
+        """
+        query = 'SELECT url, file, offset, length, fetched_at FROM records WHERE status = 200'
+        params = []
+        if as_of is not None:
+            query += ' AND fetched_at <= ?'
+            params.append(as_of)
+        if prefix is not None:
+            query += ' AND substr(url, 1, ?) = ?'
+            params.extend([len(prefix), prefix])
+        with self._lock:
+            rows = self._conn.execute(query + ' ORDER BY fetched_at, rowid', params).fetchall()
+        return [dict(zip(('url', 'file', 'offset', 'length', 'fetched_at'), row)) for row in rows]
+
+    def lookup(self, url, as_of=None):
+        """Entrada del índice de la última captura con estado 200 de `url` (hasta `as_of`), o None."""
+        query = 'SELECT file, offset, length, fetched_at FROM records WHERE url = ? AND status = 200'
+        params = [url]
+        if as_of is not None:
+            query += ' AND fetched_at <= ?'
+            params.append(as_of)
+        with self._lock:
+            row = self._conn.execute(query + ' ORDER BY fetched_at DESC, rowid DESC LIMIT 1', params).fetchone()
+        return None if row is None else dict(zip(('file', 'offset', 'length', 'fetched_at'), row))
+
+    def read(self, entry):
+        """(estado, cabeceras, cuerpo) del registro de una entrada del índice."""
+        with open(os.path.join(self.directory, entry['file']), 'rb') as f:
+            f.seek(entry['offset'])
+            record = gzip.decompress(f.read(entry['length']))
+        _, status, headers, body = parse_record(record)
+        return status, headers, body
+
+    def rebuild_index(self):
+        """Vuelve a indexar todos los registros de los archivos .warc.gz. Devuelve cuántos hay."""
+        rows = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.warc.gz'):
+                continue
+            for offset, length, record in iter_members(os.path.join(self.directory, name)):
+                warc_headers, status, _, body = parse_record(record)
+                rows.append((warc_headers['WARC-Target-URI'], warc_headers['WARC-Date'], status, name, offset,
+                             length, hashlib.sha256(body).hexdigest()))
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM records')
+            self._conn.executemany(
+                'INSERT INTO records (url, fetched_at, status, file, offset, length, payload_digest) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def stats(self):
+        """{registros, urls, archivos, bytes} del archivo."""
+        with self._lock:
+            records, urls = self._conn.execute('SELECT COUNT(*), COUNT(DISTINCT url) FROM records').fetchone()
+        files = [name for name in os.listdir(self.directory) if name.endswith('.warc.gz')]
+        size = sum(os.path.getsize(os.path.join(self.directory, name)) for name in files)
+        return {'registros': records, 'urls': urls, 'archivos': len(files), 'bytes': size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estado del archivo de páginas descargadas.")
+    parser.add_argument('--archive', default=ARCHIVE_DIR, help="Carpeta del archivo de páginas.")
+    parser.add_argument('--rebuild-index', action='store_true',
+                        help="Reconstruye el índice recorriendo los archivos .warc.gz.")
+    args = parser.parse_args()
+    with PageArchive(args.archive) as archive:
+        if args.rebuild_index:
+            print(f"Índice reconstruido: {archive.rebuild_index()} registros.")
+        stats = archive.stats()
+    print(f"{stats['registros']} respuestas archivadas de {stats['urls']} URLs en {stats['archivos']} archivos "
+          f"({stats['bytes'] / 1e6:.1f} MB comprimidos): {args.archive}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""
+Extracción de datos de las páginas de karcal.cl (listados y fichas de detalle).
+
+Dos implementaciones:
+- 'lxml': parsea con libxml2 (en C) y ubica sólo los elementos que se leen con consultas
+  XPath (`div.especificacion`, `h2.monto-ganador`, `div.detalleBotonera`,
+  `div.panel-ofertas`, `div.caluga-card`). El árbol se arma en C y lxml sólo crea objetos
+  de Python para los elementos que devuelven las consultas, no para toda la página.
+- 'bs4':  la implementación original con BeautifulSoup y `html.parser` (Python puro), que
+  sirve de referencia y de respaldo si lxml no está instalado.
+
+Las clases se comparan como en BeautifulSoup (`class_='x'` coincide si 'x' es una de las
+clases del elemento) y los bytes se decodifican igual (UTF-8 o, si no lo son, la
+codificación que detecta BeautifulSoup), así que con marcado bien formado ambas devuelven
+los mismos diccionarios. Con marcado mal formado no: cada parser repara el árbol a su
+manera (ej. celdas `<td>` sin cerrar: 'u23$2' con bs4 y 'u2' con lxml; un `<div>` dentro
+de `p.nombre-bien`: 'KIAx' con bs4 y 'KIA' con lxml). Por eso el backend por defecto es
+'bs4' (el de los datos ya capturados); antes de usar 'lxml' (`scraper.py --parser lxml`)
+conviene comparar ambos sobre páginas reales con
+`benchmark_parser.py --archive data/raw/archive`.
+"""
+
+import json
+
+from bs4 import BeautifulSoup
+from bs4.dammit import UnicodeDammit
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # dependencia opcional: se usa BeautifulSoup
+    lxml_html = None
+
+BASE_URL = "https://www.karcal.cl"
+BACKENDS = ('bs4', 'lxml')
+# La referencia: 'lxml' es más rápido pero puede diferir en páginas mal formadas (ver arriba)
+DEFAULT_BACKEND = 'bs4'
+
+
+# --- BeautifulSoup (referencia) ---
+def _parse_detail_bs4(html, base_url):
+    soup = BeautifulSoup(html, 'html.parser')
+
+    detail_data = {}
+
+    # 1. Extraer especificaciones del auto
+    spec_elements = soup.find_all('div', class_='especificacion')
+    for spec in spec_elements:
+        spans = spec.find_all('span')
+        if len(spans) == 2:
+            # Limpia el nombre de la clave (ej. 'Kilometraje:') y lo convierte a minúsculas
+            key = spans[0].text.replace(':', '').strip().lower()
+            value = spans[1].text.strip()
+            detail_data[key] = value
+
+    # 2. Extraer oferta ganadora
+    winner_bid = soup.find('h2', class_='monto-ganador')
+    detail_data['oferta_ganadora'] = winner_bid.text.strip() if winner_bid else None
+
+    # 3. Extraer URLs de los informes PDF
+    report_links = soup.find_all('div', class_='detalleBotonera')
+    reports = {}
+    for link in report_links:
+        a_tag = link.find('a')
+        if a_tag and a_tag.get('href'):
+            report_name = a_tag.find('span', class_=False).text.strip()
+            report_url = a_tag.get('href')
+            if not report_url.startswith('http'):
+                report_url = base_url + report_url
+            reports[report_name] = report_url
+    detail_data['informes_pdf'] = json.dumps(reports, ensure_ascii=False)
+
+    # 4. Extraer historial de ofertas y guardarlo como JSON
+    history_table = soup.find('div', class_='panel-ofertas')
+    bids_history = []
+    if history_table:
+        rows = history_table.find('tbody').find_all('tr')
+        for row in rows:
+            cols = row.find_all('td')
+            if len(cols) == 3:
+                bid = {
+                    'usuario': cols[0].text.strip(),
+                    'cantidad_ofertas': cols[1].text.strip(),
+                    'valor_ultima_oferta': cols[2].text.strip()
+                }
+                bids_history.append(bid)
+    # Convertir la lista de diccionarios a un string JSON
+    detail_data['historial_ofertas'] = json.dumps(bids_history, ensure_ascii=False)
+
+    return detail_data
+
+
+def _parse_listing_bs4(html, base_url):
+    soup = BeautifulSoup(html, 'html.parser')
+    cars = []
+
+    for car in soup.find_all('div', class_='caluga-card'):
+        car_data = {}
+
+        # Info desde la página de listado
+        details = car.find_all('p', class_='nombre-bien')
+        car_data['marca'] = details[0].text.strip() if len(details) > 0 else None
+        car_data['modelo'] = details[1].text.strip() if len(details) > 1 else None
+        car_data['listado_año'] = details[2].text.strip() if len(details) > 2 else None
+
+        car_data['valor_inicial'] = car.find('p', class_='minimo').text.strip() if car.find('p', class_='minimo') else None
+
+        # URL de la imagen
+        image_tag = car.find('img')
+        car_data['image_url'] = image_tag.get('src') if image_tag else None
+
+        # URL de la ficha de detalle
+        detail_link = car.find('a')
+        if detail_link and detail_link.get('href'):
+            car_data['detail_url'] = base_url + detail_link.get('href')
+
+        cars.append(car_data)
+
+    return cars
+
+
+# --- lxml ---
+def _has_class(tag, name):
+    """XPath de los `tag` (descendientes) que tienen la clase `name`, como `class_=name` de BeautifulSoup."""
+    return f".//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {name} ')]"
+
+
+if lxml_html is not None:
+    _SPECS = etree.XPath(_has_class('div', 'especificacion'))
+    _WINNER = etree.XPath(f"({_has_class('h2', 'monto-ganador')})[1]")
+    _REPORT_BUTTONS = etree.XPath(_has_class('div', 'detalleBotonera'))
+    _BIDS_PANEL = etree.XPath(f"({_has_class('div', 'panel-ofertas')})[1]")
+    _CARDS = etree.XPath(_has_class('div', 'caluga-card'))
+    _CARD_NAMES = etree.XPath(_has_class('p', 'nombre-bien'))
+    _CARD_MINIMUM = etree.XPath(f"({_has_class('p', 'minimo')})[1]")
+
+
+def _text(element):
+    return element.text_content().strip()
+
+
+def _document(html):
+    """Árbol lxml de la página (None si está vacía), con el texto decodificado como BeautifulSoup."""
+    if isinstance(html, bytes):
+        try:
+            html = html.decode('utf-8')
+        except UnicodeDecodeError:
+            html = UnicodeDammit(html, is_html=True).unicode_markup
+    if not html.strip():
+        return None
+    return lxml_html.document_fromstring(html)
+
+
+def _parse_detail_lxml(html, base_url):
+    root = _document(html)
+    detail_data = {}
+    if root is None:
+        return {'oferta_ganadora': None, 'informes_pdf': '{}', 'historial_ofertas': '[]'}
+
+    for spec in _SPECS(root):
+        spans = spec.findall('.//span')
+        if len(spans) == 2:
+            detail_data[spans[0].text_content().replace(':', '').strip().lower()] = _text(spans[1])
+
+    winner_bid = _WINNER(root)
+    detail_data['oferta_ganadora'] = _text(winner_bid[0]) if winner_bid else None
+
+    reports = {}
+    for button in _REPORT_BUTTONS(root):
+        a_tag = button.find('.//a')
+        if a_tag is not None and a_tag.get('href'):
+            report_name = _text(a_tag.xpath('.//span[not(@class)]')[0])
+            report_url = a_tag.get('href')
+            if not report_url.startswith('http'):
+                report_url = base_url + report_url
+            reports[report_name] = report_url
+    detail_data['informes_pdf'] = json.dumps(reports, ensure_ascii=False)
+
+    bids_history = []
+    panel = _BIDS_PANEL(root)
+    if panel:
+        for row in panel[0].find('.//tbody').iterfind('.//tr'):
+            cols = row.findall('.//td')
+            if len(cols) == 3:
+                bids_history.append({'usuario': _text(cols[0]), 'cantidad_ofertas': _text(cols[1]),
+                                     'valor_ultima_oferta': _text(cols[2])})
+    detail_data['historial_ofertas'] = json.dumps(bids_history, ensure_ascii=False)
+    return detail_data
+
+
+def _parse_listing_lxml(html, base_url):
+    root = _document(html)
+    if root is None:
+        return []
+    cars = []
+    for card in _CARDS(root):
+        names = _CARD_NAMES(card)
+        minimum = _CARD_MINIMUM(card)
+        image_tag = card.find('.//img')
+        car_data = {
+            'marca': _text(names[0]) if len(names) > 0 else None,
+            'modelo': _text(names[1]) if len(names) > 1 else None,
+            'listado_año': _text(names[2]) if len(names) > 2 else None,
+            'valor_inicial': _text(minimum[0]) if minimum else None,
+            'image_url': image_tag.get('src') if image_tag is not None else None,
+        }
+        detail_link = card.find('.//a')
+        if detail_link is not None and detail_link.get('href'):
+            car_data['detail_url'] = base_url + detail_link.get('href')
+        cars.append(car_data)
+    return cars
+
+
+_PARSERS = {
+    'lxml': (_parse_detail_lxml, _parse_listing_lxml),
+    'bs4': (_parse_detail_bs4, _parse_listing_bs4),
+}
+
+
+def _parsers(backend):
+    backend = backend or DEFAULT_BACKEND
+    if backend == 'lxml' and lxml_html is None:
+        raise ImportError("El backend 'lxml' requiere instalar lxml (pip install lxml).")
+    return _PARSERS[backend]
+
+
+def parse_detail_page(html, base_url=BASE_URL, backend=None):
+    """
+    Extrae toda la información adicional desde el HTML (bytes o texto) de la página de
+    detalle de un auto: especificaciones, oferta ganadora, informes PDF e historial de ofertas.
+    """
+    return _parsers(backend)[0](html, base_url)
+
+
+def parse_listing_page(html, base_url=BASE_URL, backend=None):
+    """Extrae la información de cada tarjeta de auto ('caluga-card') de una página de listado."""
+    return _parsers(backend)[1](html, base_url)
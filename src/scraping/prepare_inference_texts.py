@@ -1,17 +1,35 @@
+import argparse
 import pandas as pd
 import requests
+import hashlib
 import json
 import os
 import re
+import shutil
+import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import fitz  # PyMuPDF
 
+import text_cache
+from crawler import Crawler
+
+# Lectura/escritura de tablas en Parquet, compartida con src/processing
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'processing'))
+from storage import read_table  # noqa: E402
+
 # --- CONFIGURACIÓN DE RUTAS ---
 # Ajusta estas rutas según la estructura de tu proyecto
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-RAW_DATA_PATH = os.path.join(BASE_DIR, 'data', 'raw', 'karcal_data_raw.csv')
+RAW_DATA_PATH = os.path.join(BASE_DIR, 'data', 'raw', 'karcal_data_raw.parquet')
 PDF_DIR = os.path.join(BASE_DIR, 'reports', 'pdf')
 TXT_DIR = os.path.join(BASE_DIR, 'reports', 'txt_prompts')
 
+# --- CONFIGURACIÓN DE CONCURRENCIA ---
+DOWNLOAD_WORKERS = 8  # Descargas simultáneas (pool de E/S)
+DOWNLOAD_REQUESTS_PER_SECOND = 5.0
+EXTRACT_WORKERS = os.cpu_count()  # Procesos para la extracción con PyMuPDF
+
 # --- FUNCIONES AUXILIARES ---
 
 def sanitize_filename(name):
@@ -20,69 +38,152 @@ def sanitize_filename(name):
     name = re.sub(r'[-\s]+', '_', name)
     return name
 
-def pdf_to_text(pdf_path):
-    """Convierte un archivo PDF a un string de texto."""
+def pdf_to_pages(pdf_path):
+    """Convierte un archivo PDF a una lista con el texto de cada página (None si falla)."""
     try:
-        doc = fitz.open(pdf_path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        doc.close()
-        return text
+        with fitz.open(pdf_path) as doc:
+            return [page.get_text() for page in doc]
     except Exception as e:
         print(f"  -> Error al convertir PDF {os.path.basename(pdf_path)}: {e}")
-        return ""
+        return None
 
-def process_vehicle_reports(row):
+def is_valid_pdf(pdf_path):
+    """Un PDF ya descargado es válido si existe, empieza con '%PDF-' y termina con '%%EOF'."""
+    try:
+        size = os.path.getsize(pdf_path)
+        with open(pdf_path, 'rb') as f:
+            header = f.read(5)
+            f.seek(max(0, size - 1024))
+            trailer = f.read()
+    except OSError:
+        return False
+    return header == b'%PDF-' and b'%%EOF' in trailer
+
+def file_sha256(path):
+    """Hash SHA-256 del contenido de un archivo."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def plan_vehicle_reports(row):
     """
-    Descarga, convierte y consolida los informes de un vehículo en un solo archivo de texto.
+    Devuelve (vehicle_id, [(nombre_informe, url, ruta_pdf), ...]) para un vehículo,
+    o None si no tiene informes válidos.
     """
     # Usar la patente como identificador único, o el índice si no hay patente
     vehicle_id = row['placa'] if pd.notna(row['placa']) else f"vehiculo_{row.name}"
-    print(f"\n--- Procesando Vehículo ID: {vehicle_id} ---")
-    
-    # Crear directorios específicos para los PDFs de este auto
-    vehicle_pdf_dir = os.path.join(PDF_DIR, vehicle_id)
-    os.makedirs(vehicle_pdf_dir, exist_ok=True)
 
     try:
         # El campo 'informes_pdf' es un string, hay que cargarlo como JSON
         report_links = json.loads(row['informes_pdf'])
     except (json.JSONDecodeError, TypeError):
         print(f"  -> No se encontraron informes o el formato es inválido para {vehicle_id}.")
-        return
+        return None
 
-    consolidated_text = ""
-    
-    # Iterar sobre cada informe (ej. "Certificado de Anotaciones", "Listado Vehículo")
-    for report_name, url in report_links.items():
-        if not url:
-            continue
-        
-        sanitized_report_name = sanitize_filename(report_name)
-        pdf_filename = f"{sanitized_report_name}.pdf"
-        pdf_path = os.path.join(vehicle_pdf_dir, pdf_filename)
-        
-        # 1. Descargar el PDF
-        try:
-            print(f"  -> Descargando '{report_name}'...")
-            response = requests.get(url, timeout=20)
-            response.raise_for_status() # Lanza un error si la descarga falla
-            with open(pdf_path, 'wb') as f:
-                f.write(response.content)
-        except requests.exceptions.RequestException as e:
-            print(f"  -> Falló la descarga de {url}: {e}")
-            continue
+    vehicle_pdf_dir = os.path.join(PDF_DIR, vehicle_id)
+    reports = [
+        (report_name, url, os.path.join(vehicle_pdf_dir, f"{sanitize_filename(report_name)}.pdf"))
+        for report_name, url in report_links.items() if url
+    ]
+    return vehicle_id, reports
 
-        # 2. Convertir PDF a Texto
-        report_text = pdf_to_text(pdf_path)
+def download_reports(plans, crawler):
+    """
+    Asegura que cada PDF planificado exista en disco. Los archivos válidos no se vuelven
+    a descargar, y cada URL se descarga una sola vez aunque la compartan muchos vehículos
+    (ej. 'Bases Generales'): el resto de las copias se hace desde el disco.
+    Devuelve el conjunto de rutas que no se pudieron obtener.
+    """
+    targets_by_url = defaultdict(list)
+    for _, reports in plans:
+        for _, url, pdf_path in reports:
+            targets_by_url[url].append(pdf_path)
+
+    pending = {}
+    for url, targets in targets_by_url.items():
+        missing = [path for path in targets if not is_valid_pdf(path)]
+        if missing:
+            pending[url] = (targets, missing)
+
+    def fetch(url):
+        targets, missing = pending[url]
+        source = next((path for path in targets if path not in missing), None)
+        if source is None:
+            # 1. Descargar el PDF (una sola vez por URL)
+            try:
+                print(f"  -> Descargando '{url}'...")
+                response = crawler.fetch(url)
+            except requests.exceptions.RequestException as e:
+                print(f"  -> Falló la descarga de {url}: {e}")
+                return missing
+            source = missing.pop(0)
+            os.makedirs(os.path.dirname(source), exist_ok=True)
+            with open(source, 'wb') as f:
+                f.write(response.content)
+        for path in missing:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copyfile(source, path)
+        return []
+
+    failed = set()
+    print(f"Descargando {len(pending)} URLs nuevas o inválidas ({len(targets_by_url)} URLs en total)...")
+    for missing in crawler.map(fetch, list(pending)):
+        failed.update(missing)
+    return failed
+
+def extract_texts(pdf_paths, workers=EXTRACT_WORKERS):
+    """
+    Obtiene el texto de cada PDF. Primero se busca en la caché por hash de contenido
+    (ver `text_cache.py`); sólo los PDFs únicos que no estén en caché se parsean, en un
+    pool de procesos. Devuelve {ruta_pdf: texto}.
+    """
+    paths_by_hash = defaultdict(list)
+    for path in pdf_paths:
+        paths_by_hash[file_sha256(path)].append(path)
+
+    pages_by_hash = {sha: text_cache.load_pages(sha) for sha in paths_by_hash}
+    misses = [sha for sha, pages in pages_by_hash.items() if pages is None]
+    print(f"Extrayendo texto de {len(misses)} PDFs únicos "
+          f"({len(paths_by_hash) - len(misses)} ya en caché, {len(pdf_paths)} archivos)...")
+    if misses:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            representatives = [paths_by_hash[sha][0] for sha in misses]
+            for sha, pages in zip(misses, executor.map(pdf_to_pages, representatives)):
+                if pages is not None:
+                    text_cache.save_pages(sha, pages)
+                pages_by_hash[sha] = pages or []
+
+    return {path: "".join(pages_by_hash[sha]) for sha, paths in paths_by_hash.items() for path in paths}
+
+def needs_text_rebuild(vehicle_id, reports, failed):
+    """El texto consolidado se regenera si falta o si algún PDF es más nuevo que él."""
+    output_txt_path = os.path.join(TXT_DIR, f"{vehicle_id}.txt")
+    if not os.path.isfile(output_txt_path):
+        return True
+    if any(pdf_path in failed for _, _, pdf_path in reports):
+        return True
+    txt_mtime = os.path.getmtime(output_txt_path)
+    return any(os.path.getmtime(pdf_path) > txt_mtime for _, _, pdf_path in reports)
+
+def write_consolidated_text(vehicle_id, reports, texts):
+    """
+    Consolida los informes de un vehículo en un solo archivo de texto.
+    """
+    sections = []
 
-        # 3. Añadir al texto consolidado con separadores claros
-        consolidated_text += f"--- INICIO {report_name.upper()} ---\n"
-        consolidated_text += report_text
-        consolidated_text += f"\n--- FIN {report_name.upper()} ---\n\n"
+    # Iterar sobre cada informe (ej. "Certificado de Anotaciones", "Listado Vehículo")
+    for report_name, _, pdf_path in reports:
+        if pdf_path not in texts:
+            continue
+        # Añadir al texto consolidado con separadores claros
+        sections.append(f"--- INICIO {report_name.upper()} ---\n"
+                        f"{texts[pdf_path]}"
+                        f"\n--- FIN {report_name.upper()} ---\n\n")
+    consolidated_text = "".join(sections)
 
-    # 4. Guardar el archivo de texto final consolidado
+    # Guardar el archivo de texto final consolidado
     if consolidated_text:
         output_txt_path = os.path.join(TXT_DIR, f"{vehicle_id}.txt")
         with open(output_txt_path, 'w', encoding='utf-8') as f:
@@ -93,24 +194,47 @@ def process_vehicle_reports(row):
 
 def main():
     """Función principal que orquesta el proceso."""
+    parser = argparse.ArgumentParser(description="Descarga los informes PDF y genera los textos para inferencia.")
+    parser.add_argument('--rebuild-texts', action='store_true',
+                        help="Regenera todos los textos consolidados (desde la caché de texto, sin reabrir PDFs).")
+    args = parser.parse_args()
+
     # Crear los directorios de salida si no existen
     os.makedirs(PDF_DIR, exist_ok=True)
     os.makedirs(TXT_DIR, exist_ok=True)
 
     # Cargar los datos
     try:
-        df_raw = pd.read_csv(RAW_DATA_PATH)
+        df_raw = read_table(RAW_DATA_PATH)
+        # El scraper incremental agrega filas: quedarse con la última captura de cada subasta
+        df_raw = df_raw.drop_duplicates(subset='detail_url', keep='last')
     except FileNotFoundError:
         print(f"Error: No se encontró el archivo de datos en {RAW_DATA_PATH}")
         return
 
-    # Procesar cada fila (vehículo) en el DataFrame
+    # Planificar los informes de cada fila (vehículo) del DataFrame
     # Para una prueba rápida, puedes usar df_raw.head(5) en lugar de df_raw
-    for index, row in df_raw.iterrows():
-        process_vehicle_reports(row)
+    plans = [plan for plan in (plan_vehicle_reports(row) for _, row in df_raw.iterrows()) if plan]
+
+    # 1. Descargar sólo los PDFs que faltan, en un pool de E/S
+    with Crawler(workers=DOWNLOAD_WORKERS, requests_per_second=DOWNLOAD_REQUESTS_PER_SECOND) as crawler:
+        failed = download_reports(plans, crawler)
+
+    # 2. Convertir a texto sólo los vehículos cuyo texto consolidado falta o está desactualizado
+    stale = [(vehicle_id, [r for r in reports if r[2] not in failed])
+             for vehicle_id, reports in plans
+             if args.rebuild_texts or needs_text_rebuild(vehicle_id, reports, failed)]
+    print(f"{len(plans) - len(stale)} vehículos ya tienen su texto al día; {len(stale)} por regenerar.")
+    if stale:
+        pdf_paths = sorted({pdf_path for _, reports in stale for _, _, pdf_path in reports})
+        texts = extract_texts(pdf_paths)
+
+        # 3. Consolidar el texto de cada vehículo
+        for vehicle_id, reports in stale:
+            write_consolidated_text(vehicle_id, reports, texts)
 
     print("\nProceso completado.")
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
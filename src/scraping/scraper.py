@@ -1,153 +1,256 @@
-import requests
-from bs4 import BeautifulSoup
+import argparse
 import pandas as pd
-import time
+import requests
 import os
-import json # Para  el historial de pujas
+import sys
+
+from auction_index import AuctionIndex, INDEX_PATH, content_hash
+from crawler import Crawler, DEFAULT_WORKERS, DEFAULT_REQUESTS_PER_SECOND
+from page_archive import ARCHIVE_DIR, PageArchive
+from page_parser import BACKENDS, BASE_URL, DEFAULT_BACKEND, parse_detail_page, parse_listing_page
+
+# Lectura/escritura de tablas en Parquet, compartida con src/processing
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'processing'))
+from storage import append_table, compact_table, read_table, table_parts, write_table  # noqa: E402
 
 # --- CONFIGURACIÓN ---
-# Directorio de salida para el CSV
+# Directorio de salida para los datos crudos
 OUTPUT_DIR = os.path.join('data', 'raw')
-OUTPUT_FILE = os.path.join(OUTPUT_DIR, 'karcal_data_raw.csv')
-BASE_URL = "https://www.karcal.cl"
+OUTPUT_FILE = os.path.join(OUTPUT_DIR, 'karcal_data_raw.parquet')
+# El re-parseo del archivo se escribe aparte: no reemplaza a los datos crudos
+REPLAY_FILE = os.path.join(OUTPUT_DIR, 'karcal_data_replay.parquet')
+LISTING_PATH = "/Listado/Index/30199?NumPag={page_num}"
 NUM_PAGES_TO_SCRAPE = 20
+# Con el scraping incremental cada ejecución agrega una parte a la tabla de datos crudos;
+# al llegar a este número de partes se juntan en una sola
+COMPACT_PARTS = 50
 
 
 # --- FUNCIÓN PARA EXTRAER DATOS DE LA PÁGINA DE DETALLE ---
-def scrape_detail_page(detail_url):
+# (el parseo de las páginas está en page_parser.py)
+def scrape_detail_page(detail_url, crawler, base_url=BASE_URL, backend=None):
     """
     Visita la página de detalle de un auto y extrae toda la información adicional.
     """
     try:
-        response = requests.get(detail_url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        detail_data = {}
-
-        # 1. Extraer especificaciones del auto
-        spec_elements = soup.find_all('div', class_='especificacion')
-        for spec in spec_elements:
-            spans = spec.find_all('span')
-            if len(spans) == 2:
-                # Limpia el nombre de la clave (ej. 'Kilometraje:') y lo convierte a minúsculas
-                key = spans[0].text.replace(':', '').strip().lower()
-                value = spans[1].text.strip()
-                detail_data[key] = value
-
-        # 2. Extraer oferta ganadora
-        winner_bid = soup.find('h2', class_='monto-ganador')
-        detail_data['oferta_ganadora'] = winner_bid.text.strip() if winner_bid else None
-
-        # 3. Extraer URLs de los informes PDF
-        report_links = soup.find_all('div', class_='detalleBotonera')
-        reports = {}
-        for link in report_links:
-            a_tag = link.find('a')
-            if a_tag and a_tag.get('href'):
-                report_name = a_tag.find('span', class_=False).text.strip()
-                report_url = a_tag.get('href')
-                if not report_url.startswith('http'):
-                    report_url = BASE_URL + report_url
-                reports[report_name] = report_url
-        detail_data['informes_pdf'] = json.dumps(reports, ensure_ascii=False)
-
-        # 4. Extraer historial de ofertas y guardarlo como JSON
-        history_table = soup.find('div', class_='panel-ofertas')
-        bids_history = []
-        if history_table:
-            rows = history_table.find('tbody').find_all('tr')
-            for row in rows:
-                cols = row.find_all('td')
-                if len(cols) == 3:
-                    bid = {
-                        'usuario': cols[0].text.strip(),
-                        'cantidad_ofertas': cols[1].text.strip(),
-                        'valor_ultima_oferta': cols[2].text.strip()
-                    }
-                    bids_history.append(bid)
-        # Convertir la lista de diccionarios a un string JSON
-        detail_data['historial_ofertas'] = json.dumps(bids_history, ensure_ascii=False)
-
-        return detail_data
-
+        response = crawler.fetch(detail_url)
+        return parse_detail_page(response.content, base_url, backend)
     except requests.exceptions.RequestException as e:
         print(f"  -> Error al procesar detalle {detail_url}: {e}")
         return None
 
-# --- SCRIPT PRINCIPAL ---
-all_cars_data = []
-
-print("Iniciando el scraping...")
 
-for page_num in range(1, NUM_PAGES_TO_SCRAPE + 1):
-    list_url = f"{BASE_URL}/Listado/Index/30199?NumPag={page_num}"
+# --- FUNCIONES PARA LA PÁGINA DE LISTADO ---
+def scrape_listing_page(page_num, crawler, base_url=BASE_URL, backend=None):
+    """Descarga y parsea una página de listado. Devuelve None si la descarga falla."""
+    list_url = base_url + LISTING_PATH.format(page_num=page_num)
     print(f"Scrapeando página de listado: {page_num}")
-
     try:
-        response = requests.get(list_url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        car_containers = soup.find_all('div', class_='caluga-card')
-        if not car_containers:
+        response = crawler.fetch(list_url)
+        return parse_listing_page(response.content, base_url, backend)
+    except requests.exceptions.RequestException as e:
+        print(f"Error al acceder a la página de listado {page_num}: {e}")
+        return None
+
+
+def scrape_catalogue(crawler, base_url=BASE_URL, num_pages=NUM_PAGES_TO_SCRAPE, index=None, backend=None):
+    """
+    Recorre las páginas de listado y las fichas de detalle usando el pool del crawler.
+    Las páginas de listado se piden en paralelo y se conservan hasta la primera vacía;
+    luego se descargan en paralelo todas las fichas de detalle.
+
+    Con un `index` (AuctionIndex) el recorrido es incremental: no se piden las fichas de
+    subastas cerradas ya capturadas, y las fichas que no cambiaron desde la última vez
+    (304 o mismo hash de contenido) no se devuelven. Las fichas capturadas quedan
+    pendientes en el índice hasta llamar a `index.flush()`. `backend` es el parser de
+    `page_parser.py` (por defecto, DEFAULT_BACKEND).
+    """
+    listing_pages = crawler.map(lambda page_num: scrape_listing_page(page_num, crawler, base_url, backend),
+                                range(1, num_pages + 1))
+
+    all_cars_data = []
+    for cars in listing_pages:
+        if cars is None:
+            continue
+        if not cars:
             print("No se encontraron más autos. Terminando.")
             break
+        all_cars_data.extend(cars)
 
-        for car in car_containers:
-            car_data = {}
-            
-            # Info desde la página de listado
-            details = car.find_all('p', class_='nombre-bien')
-            car_data['marca'] = details[0].text.strip() if len(details) > 0 else None
-            car_data['modelo'] = details[1].text.strip() if len(details) > 1 else None
-            car_data['listado_año'] = details[2].text.strip() if len(details) > 2 else None
-
-            car_data['valor_inicial'] = car.find('p', class_='minimo').text.strip() if car.find('p', class_='minimo') else None
-            
-            # URL de la imagen
-            image_tag = car.find('img')
-            car_data['image_url'] = image_tag.get('src') if image_tag else None
-
-            # URL de la ficha de detalle
-            detail_link = car.find('a')
-            if detail_link and detail_link.get('href'):
-                detail_url = BASE_URL + detail_link.get('href')
-                car_data['detail_url'] = detail_url
-                
-                print(f"  -> Obteniendo detalles de: {car_data.get('marca')} {car_data.get('modelo')}")
-                # Obtener datos de la página de detalle
-                detail_info = scrape_detail_page(detail_url)
-                if detail_info:
-                    # Unir la información del listado con la del detalle
-                    car_data.update(detail_info)
-            
-            all_cars_data.append(car_data)
-            time.sleep(0.1) # Pequeña pausa entre autos
+    if index is not None:
+        pending_cars = [car for car in all_cars_data
+                        if not car.get('detail_url') or index.needs_fetch(car['detail_url'])]
+        print(f"Índice incremental: {len(all_cars_data) - len(pending_cars)} subastas cerradas ya capturadas, "
+              f"{len(pending_cars)} por revisar.")
+        all_cars_data = pending_cars
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error al acceder a la página de listado {page_num}: {e}")
-        continue
+    def add_details(car_data):
+        detail_url = car_data.get('detail_url')
+        if not detail_url:
+            return car_data
+        if index is None:
+            print(f"  -> Obteniendo detalles de: {car_data.get('marca')} {car_data.get('modelo')}")
+            # Obtener datos de la página de detalle
+            detail_info = scrape_detail_page(detail_url, crawler, base_url, backend)
+            if detail_info:
+                # Unir la información del listado con la del detalle
+                car_data.update(detail_info)
+            return car_data
+
+        try:
+            response = crawler.fetch(detail_url, headers=index.conditional_headers(detail_url))
+        except requests.exceptions.RequestException as e:
+            # Sin fila: una fila sólo con el listado reemplazaría (al quedarse con la última
+            # captura de cada detail_url) a la ficha completa ya guardada. El índice no se
+            # toca, así que la ficha se vuelve a pedir en la próxima ejecución.
+            print(f"  -> Error al procesar detalle {detail_url}: {e}")
+            return None
+        digest = content_hash(response.content)
+        if response.status_code == 304 or index.is_unchanged(detail_url, digest):
+            index.touch(detail_url)
+            return None
 
-    time.sleep(0.2) # Pausa respetuosa entre páginas
+        print(f"  -> Obteniendo detalles de: {car_data.get('marca')} {car_data.get('modelo')}")
+        detail_info = parse_detail_page(response.content, base_url, backend)
+        car_data.update(detail_info)
+        index.stage(detail_url, detail_info.get('placa'), digest,
+                    closed=detail_info.get('oferta_ganadora') is not None,
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified'))
+        return car_data
+
+    return [car for car in crawler.map(add_details, all_cars_data) if car is not None]
+
+
+def replay_catalogue(archive, base_url=BASE_URL, as_of=None, backend=None):
+    """
+    Reconstruye el catálogo desde un `PageArchive`, sin red. Se recorren todas las páginas
+    de listado archivadas (hasta `as_of`), de la más antigua a la más reciente, quedándose
+    con la última tarjeta de cada auto, y se parsea la última ficha de detalle archivada de
+    cada uno. Así se incluyen también las subastas que ya no aparecen en el listado actual.
+
+    Sólo se cubren las páginas descargadas con un 200 mientras el archivo estaba activo: las
+    subastas cerradas que el scraping incremental ya no vuelve a pedir y las fichas que
+    respondieron 304 no quedan en el archivo, así que el resultado puede tener menos subastas
+    que los datos crudos. Las tarjetas sin enlace a su ficha o sin ficha archivada se omiten
+    (una fila sólo con el listado reemplazaría a la ficha completa guardada).
+    """
+    cars = {}
+    for entry in archive.entries(as_of, prefix=base_url + LISTING_PATH.split('{')[0]):
+        _, _, body = archive.read(entry)
+        for car in parse_listing_page(body, base_url, backend):
+            if car.get('detail_url'):
+                cars[car['detail_url']] = car
+
+    all_cars_data = []
+    for detail_url, car_data in cars.items():
+        entry = archive.lookup(detail_url, as_of)
+        if entry is None:
+            continue
+        _, _, body = archive.read(entry)
+        car_data.update(parse_detail_page(body, base_url, backend))
+        all_cars_data.append(car_data)
+    skipped = len(cars) - len(all_cars_data)
+    if skipped:
+        print(f"Se omitieron {skipped} autos sin ficha de detalle archivada.")
+    return all_cars_data
 
-print(f"\nScraping finalizado. Se recolectaron datos de {len(all_cars_data)} autos.")
 
 # --- GUARDAR DATOS ---
-if all_cars_data:
-    # Asegurarse de que el directorio de salida exista
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    
+def save_cars_data(all_cars_data, output_file=OUTPUT_FILE, append=False, export_csv=False):
+    """
+    Guarda los autos recolectados en la tabla de datos crudos (Parquet). Con `append=True`
+    las filas se agregan a las ya guardadas como una parte nueva de la tabla (ver
+    `storage.append_table`), sin leer ni reescribir el historial; quien lea el dataset debe
+    quedarse con la última fila de cada `detail_url`. Con `export_csv=True` también se
+    escribe una copia CSV (de la tabla completa).
+    """
+    if not all_cars_data:
+        print("No se recolectaron datos para guardar.")
+        return
+
     df = pd.DataFrame(all_cars_data)
-    
+
     # Reordenar columnas para mejor legibilidad (opcional)
-    column_order = ['marca', 'modelo', 'año', 'oferta_ganadora', 'kilometraje', 'transmisión', 'combustible', 
+    column_order = ['marca', 'modelo', 'año', 'oferta_ganadora', 'kilometraje', 'transmisión', 'combustible',
                     'placa', 'valor_inicial', 'detail_url', 'image_url', 'historial_ofertas', 'informes_pdf']
     # Filtrar para que solo existan columnas que de verdad se encontraron
-    df = df.reindex(columns=[col for col in column_order if col in df.columns] + 
+    df = df.reindex(columns=[col for col in column_order if col in df.columns] +
                            [col for col in df.columns if col not in column_order])
 
-    df.to_csv(OUTPUT_FILE, index=False, encoding='utf-8-sig')
-    print(f"Datos guardados exitosamente en: {OUTPUT_FILE}")
-else:
-    print("No se recolectaron datos para guardar.")
\ No newline at end of file
+    if append:
+        part_path = append_table(df, output_file, csv_dtype=str)
+        print(f"Se agregaron {len(df)} filas en la parte {os.path.basename(part_path)}.")
+        n_parts = len(table_parts(output_file))
+        if n_parts >= COMPACT_PARTS:
+            print(f"Compactando las {compact_table(output_file)} partes de los datos crudos en una.")
+        if export_csv:
+            read_table(output_file).to_csv(os.path.splitext(output_file)[0] + '.csv', index=False,
+                                           encoding='utf-8-sig')
+    else:
+        write_table(df, output_file, export_csv=export_csv)
+    print(f"Datos guardados exitosamente en: {output_file}")
+
+
+# --- SCRIPT PRINCIPAL ---
+def main():
+    parser = argparse.ArgumentParser(description="Scraper de subastas de Karcal.")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="Número de descargas simultáneas.")
+    parser.add_argument('--rps', type=float, default=DEFAULT_REQUESTS_PER_SECOND,
+                        help="Máximo de peticiones por segundo hacia karcal.cl (0 = sin límite).")
+    parser.add_argument('--pages', type=int, default=NUM_PAGES_TO_SCRAPE,
+                        help="Número de páginas de listado a recorrer.")
+    parser.add_argument('--base-url', default=BASE_URL, help="URL base del sitio a scrapear.")
+    parser.add_argument('--index', default=INDEX_PATH,
+                        help="Índice SQLite de subastas ya vistas (scraping incremental).")
+    parser.add_argument('--full', action='store_true',
+                        help="Ignora el índice, descarga todo y reescribe los datos crudos.")
+    parser.add_argument('--csv', action='store_true',
+                        help="Además del Parquet, exporta una copia CSV de los datos crudos.")
+    parser.add_argument('--archive', default=ARCHIVE_DIR,
+                        help="Archivo de páginas donde se guarda cada respuesta descargada.")
+    parser.add_argument('--no-archive', action='store_true', help="No guarda las páginas descargadas.")
+    parser.add_argument('--replay', action='store_true',
+                        help="Sin red: vuelve a parsear las páginas del archivo (por defecto en "
+                             f"{REPLAY_FILE}; ver replay_catalogue).")
+    parser.add_argument('--as-of', default=None,
+                        help="Con --replay, usa las capturas hasta esa fecha ISO (por defecto, las últimas).")
+    parser.add_argument('--parser', choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="Parser de las páginas: 'lxml' es más rápido, pero puede diferir de 'bs4' en "
+                             "páginas mal formadas (compáralos con benchmark_parser.py --archive).")
+    parser.add_argument('--output', default=None,
+                        help=f"Tabla de datos crudos a escribir (por defecto {OUTPUT_FILE}, o {REPLAY_FILE} con --replay).")
+    args = parser.parse_args()
+
+    if args.replay:
+        # Re-parseo completo desde el archivo: sin índice incremental y reescribiendo la salida,
+        # que por defecto no es la tabla de datos crudos (el archivo puede no cubrirla entera)
+        print(f"Re-parseando las páginas archivadas en {args.archive}...")
+        with PageArchive(args.archive) as archive:
+            all_cars_data = replay_catalogue(archive, args.base_url, as_of=args.as_of, backend=args.parser)
+        print(f"\nRe-parseo finalizado. Se recolectaron datos de {len(all_cars_data)} autos.")
+        save_cars_data(all_cars_data, output_file=args.output or REPLAY_FILE, export_csv=args.csv)
+        return
+
+    print("Iniciando el scraping...")
+    index = None if args.full else AuctionIndex(args.index)
+    archive = None if args.no_archive else PageArchive(args.archive)
+    try:
+        with Crawler(workers=args.workers, requests_per_second=args.rps, archive=archive) as crawler:
+            all_cars_data = scrape_catalogue(crawler, args.base_url, args.pages, index=index, backend=args.parser)
+
+        print(f"\nScraping finalizado. Se recolectaron datos de {len(all_cars_data)} autos nuevos o modificados.")
+        save_cars_data(all_cars_data, output_file=args.output or OUTPUT_FILE, append=index is not None,
+                       export_csv=args.csv)
+        if index is not None:
+            print(f"Índice actualizado con {index.flush()} fichas en: {args.index}")
+    finally:
+        if index is not None:
+            index.close()
+        if archive is not None:
+            archive.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Caché del texto extraído de cada PDF, por página.
+
+La clave es el hash SHA-256 del PDF más la versión del extractor (`EXTRACTOR_VERSION`),
+de modo que un mismo documento compartido por muchos vehículos se extrae una sola vez,
+y cambiar el formato de los textos consolidados en `reports/txt_prompts` no obliga a
+volver a abrir ningún PDF. Si cambia la forma de extraer el texto (ej. otras opciones de
+`page.get_text`), hay que incrementar `EXTRACTOR_VERSION` para invalidar la caché.
+"""
+
+import json
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+TEXT_CACHE_DIR = os.path.join(BASE_DIR, 'reports', 'text_cache')
+EXTRACTOR_VERSION = 1
+
+
+def cache_path(sha256, cache_dir=TEXT_CACHE_DIR, version=EXTRACTOR_VERSION):
+    """Ruta del archivo de caché para un PDF (se reparte en subcarpetas por prefijo del hash)."""
+    return os.path.join(cache_dir, sha256[:2], f"{sha256}-v{version}.json")
+
+
+def load_pages(sha256, cache_dir=TEXT_CACHE_DIR, version=EXTRACTOR_VERSION):
+    """Devuelve la lista de textos por página de un PDF, o None si no está en caché."""
+    try:
+        with open(cache_path(sha256, cache_dir, version), 'r', encoding='utf-8') as f:
+            return json.load(f)['pages']
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return None
+
+
+def save_pages(sha256, pages, cache_dir=TEXT_CACHE_DIR, version=EXTRACTOR_VERSION):
+    """Guarda el texto por página de un PDF. La escritura es atómica (archivo temporal + rename)."""
+    path = cache_path(sha256, cache_dir, version)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'sha256': sha256, 'extractor_version': version, 'pages': pages}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)